@@ -0,0 +1,81 @@
+"""
+Benchmark de inicialização (cold start) do server.py por modo.
+
+Cada cenário roda em um processo novo com `python -X importtime` e mede o tempo de
+import (soma dos módulos de primeiro nível do relatório do importtime), o tempo de
+parede e o RSS máximo do processo:
+  - api: INPI_MODO=api, só `import server` (sem scraper nem scheduler)
+  - completo: o que o lifespan carrega no modo padrão (INPIScraper e scheduler)
+  - scraping: completo + o que o primeiro scraping importa (pepi_scraper com
+    Playwright, PyPDF2 e capmonster, BeautifulSoup, requests) — equivale ao custo
+    que toda réplica pagava no import antes dos imports tardios
+
+Uso: python -m benchmark.benchmark_inicializacao --repeticoes 5
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parents[1]
+
+CENARIOS = {
+    'api': ('api', "import server"),
+    'completo': ('completo', "import server, scrapers.inpi_scraper, scrapers.scheduler"),
+    'scraping': ('completo', "import server, scrapers.inpi_scraper, scrapers.scheduler, "
+                             "scrapers.pepi_scraper, bs4, requests"),
+}
+
+MEDICAO = (
+    "import resource, sys, time\n"
+    "inicio = time.perf_counter()\n"
+    "{imports}\n"
+    "print('PAREDE', time.perf_counter() - inicio)\n"
+    "print('RSS_KB', resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)\n"
+)
+
+LINHA_IMPORTTIME = re.compile(r'^import time:\s+\d+ \|\s+(\d+) \| (\s*)(\S+)')
+
+
+def medir(modo: str, imports: str) -> dict:
+    env = dict(os.environ, INPI_MODO=modo)
+    # server.py exige a configuração do MongoDB (nenhuma conexão é aberta no import)
+    env.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+    env.setdefault('DB_NAME', 'inpi_benchmark')
+    resultado = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', MEDICAO.format(imports=imports)],
+        cwd=BACKEND, env=env, capture_output=True, text=True, check=True
+    )
+    total_us = 0
+    modulos = 0
+    for linha in resultado.stderr.splitlines():
+        correspondencia = LINHA_IMPORTTIME.match(linha)
+        if correspondencia:
+            modulos += 1
+            if not correspondencia.group(2):
+                total_us += int(correspondencia.group(1))
+    saida = dict(linha.split(' ', 1) for linha in resultado.stdout.splitlines() if linha[:1].isupper())
+    return {
+        'import_ms': total_us / 1000,
+        'parede_ms': float(saida['PAREDE']) * 1000,
+        'rss_mb': int(saida['RSS_KB']) / 1024,
+        'modulos': modulos
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Tempo de import e RSS do server.py por modo')
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    for nome, (modo, imports) in CENARIOS.items():
+        medicoes = [medir(modo, imports) for _ in range(args.repeticoes)]
+        print(
+            f"{nome:10s} import {statistics.median(m['import_ms'] for m in medicoes):7.0f}ms  "
+            f"parede {statistics.median(m['parede_ms'] for m in medicoes):7.0f}ms  "
+            f"RSS {statistics.median(m['rss_mb'] for m in medicoes):6.1f} MB  "
+            f"{medicoes[0]['modulos']} módulos"
+        )
@@ -0,0 +1,76 @@
+"""
+Benchmark da memória dos candidatos da revista (do parse até a priorização).
+
+Com o XML sintético do servidor_mock, mede com tracemalloc a memória retida pelos
+candidatos (sem procurador e não figurativos) de N processos:
+  - dict por processo: o documento completo do MongoDB montado já no parse (id,
+    data de extração por processo, execucao_id/semana/ano, chaves de similaridade),
+    como era antes de xml_parser.ProcessoXML
+  - ProcessoXML: registro com __slots__, documento só na gravação
+e o tempo do parse até a lista de candidatos em cada caso (medido sem tracemalloc).
+
+Uso: python -m benchmark.benchmark_memoria_processos --processos 100000
+"""
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmark.servidor_mock import gerar_xml_revista
+from scrapers.xml_parser import iterar_processos_xml, eh_figurativa_xml
+
+
+def candidatos_dict(xml_content: bytes) -> list:
+    execucao_id = str(uuid.uuid4())
+    return [
+        documento for documento in (
+            processo.documento(execucao_id, 42, 2026, datetime.now(timezone.utc).isoformat())
+            for processo in iterar_processos_xml(xml_content)
+        )
+        if not documento['tem_procurador'] and not eh_figurativa_xml(documento)
+    ]
+
+
+def candidatos_registro(xml_content: bytes) -> list:
+    return [
+        processo for processo in iterar_processos_xml(xml_content)
+        if not processo.tem_procurador and not eh_figurativa_xml(processo)
+    ]
+
+
+def medir(funcao, xml_content: bytes):
+    # Tempo sem o tracemalloc (que deixa cada alocação bem mais lenta)
+    inicio = time.perf_counter()
+    funcao(xml_content)
+    duracao = time.perf_counter() - inicio
+    gc.collect()
+    tracemalloc.start()
+    candidatos = funcao(xml_content)
+    gc.collect()
+    retida, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(candidatos), retida, pico, duracao
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark da memória dos candidatos da revista')
+    parser.add_argument('--processos', type=int, default=100_000)
+    args = parser.parse_args()
+
+    xml_content = gerar_xml_revista(args.processos).encode('utf-8')
+    print(f"{args.processos:,} processos de indeferimento ({len(xml_content) / 2**20:.1f} MiB de XML)")
+    referencia = None
+    for nome, funcao in (('dict por processo', candidatos_dict), ('ProcessoXML', candidatos_registro)):
+        total, retida, pico, duracao = medir(funcao, xml_content)
+        referencia = referencia or retida
+        print(
+            f"{nome:20s} {total:,} candidatos  retida {retida / 2**20:7.1f} MiB "
+            f"({retida / total:6.0f} B/processo, {referencia / retida:4.1f}x)  "
+            f"pico {pico / 2**20:7.1f} MiB  {duracao:6.2f}s"
+        )
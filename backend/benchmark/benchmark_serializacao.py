@@ -0,0 +1,99 @@
+"""
+Benchmark da serialização da rota de detalhes da execução com N processos.
+
+Compara, com os mesmos documentos (como gravados pelo scraping):
+  - rota anterior: conversão de data_extracao para datetime, ExecucaoResponse por
+    response_model e o encoder JSON padrão
+  - modelo + model_dump_json (validação Pydantic completa, serialização em Rust)
+  - validado na escrita + orjson (scrapers/esquema.py, caminho atual da rota)
+
+Uso: python -m benchmark.benchmark_serializacao --processos 10000 --repeticoes 20
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+# server.py exige a configuração do MongoDB (nenhuma conexão é aberta aqui)
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'inpi_benchmark')
+
+import orjson
+
+from scrapers.esquema import validar_processos, projecao_resposta
+from server import Execucao, ExecucaoResponse, serializar_processo
+
+
+def gerar_documentos(total: int):
+    agora = datetime.now(timezone.utc).isoformat()
+    execucao_id = str(uuid.uuid4())
+    execucao = {
+        'id': execucao_id, 'data_execucao': agora, 'status': 'concluido', 'xml_url': None,
+        'total_processos': total, 'semana': 42, 'ano': 2026, 'mensagem_erro': None
+    }
+    processos = [{
+        'id': str(uuid.uuid4()), 'execucao_id': execucao_id, 'numero_processo': str(920000000 + i),
+        'marca': f'MARCA {i}', 'titular': f'EMPRESA {i} LTDA', 'email': f'contato{i}@empresa.com.br' if i % 3 else None,
+        'data_extracao': agora, 'semana': 42, 'ano': 2026
+    } for i in range(total)]
+    validar_processos(processos)
+    campos = set(projecao_resposta()) - {'_id'}
+    # Só os campos projetados pela rota (a rota anterior lia o documento inteiro,
+    # o que favorece a medição dela aqui)
+    return execucao, [{k: v for k, v in p.items() if k in campos} for p in processos]
+
+
+def rota_anterior(execucao: dict, processos: list) -> bytes:
+    execucao = dict(execucao)
+    processos = [{k: v for k, v in p.items() if k != 'versao_esquema'} for p in processos]
+    execucao['data_execucao'] = datetime.fromisoformat(execucao['data_execucao'])
+    for proc in processos:
+        if isinstance(proc.get('data_extracao'), str):
+            proc['data_extracao'] = datetime.fromisoformat(proc['data_extracao'])
+    # O que o FastAPI faz com response_model (validate + serialize) e JSONResponse
+    conteudo = ExecucaoResponse.model_validate({"execucao": execucao, "processos": processos}).model_dump(mode='json')
+    return json.dumps(conteudo, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def modelo_dump_json(execucao: dict, processos: list) -> bytes:
+    return ExecucaoResponse.model_validate({"execucao": execucao, "processos": processos}).model_dump_json().encode()
+
+
+def validado_orjson(execucao: dict, processos: list) -> bytes:
+    return orjson.dumps({
+        "execucao": Execucao.model_validate(execucao).model_dump(mode='json'),
+        "processos": [serializar_processo(dict(proc)) for proc in processos]
+    })
+
+
+def medir(funcao, execucao, processos, repeticoes: int):
+    duracoes = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        corpo = funcao(execucao, processos)
+        duracoes.append(time.perf_counter() - inicio)
+    return statistics.median(duracoes), len(corpo)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark da serialização da rota de detalhes')
+    parser.add_argument('--processos', type=int, default=10_000)
+    parser.add_argument('--repeticoes', type=int, default=20)
+    args = parser.parse_args()
+
+    execucao, processos = gerar_documentos(args.processos)
+    referencia = None
+    for nome, funcao in (
+        ('rota anterior (response_model + json)', rota_anterior),
+        ('modelo + model_dump_json', modelo_dump_json),
+        ('validado na escrita + orjson', validado_orjson),
+    ):
+        mediana, tamanho = medir(funcao, execucao, processos, args.repeticoes)
+        referencia = referencia or mediana
+        print(f"{nome:40s} mediana {mediana * 1000:8.1f}ms  {referencia / mediana:5.1f}x  ({tamanho / 1024:,.0f} KiB)")
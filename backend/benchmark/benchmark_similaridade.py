@@ -0,0 +1,161 @@
+"""
+Benchmark da busca de similares (scrapers/similaridade.py) com N marcas sintéticas.
+
+Gera marcas a partir de sílabas, indexa pelas chaves de bloqueio e mede:
+  - tempo para calcular as chaves de todas as marcas
+  - tamanho dos blocos (médio, p99, máximo)
+  - latência por busca (candidatos do bloco + pontuação) com marcas com erros de digitação
+  - recall contra força bruta: as --consultas-recall primeiras buscas comparadas
+    com as primeiras --amostra-recall marcas
+
+Com --mongo, grava os documentos em um banco temporário e mede buscar_similares de
+ponta a ponta (requer MongoDB em MONGO_URL, padrão mongodb://localhost:27017).
+
+Uso: python -m benchmark.benchmark_similaridade --marcas 1000000 --buscas 200
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from scrapers.indice_processos import normalizar_texto
+from scrapers.similaridade import chaves_texto, chaves_busca, pontuar, buscar_similares, LIMIAR_PADRAO
+
+SILABAS = [c + v for c in 'bcdfgjklmnprstvxz' for v in 'aeiou'] + ['in', 'hands', 'tec', 'bra', 'tri', 'str']
+SUFIXOS = ['', '', '', ' ltda', ' me', ' comercio', ' tecnologia', ' brasil', ' store']
+
+
+def gerar_marcas(total: int, semente: int = 42) -> list:
+    aleatorio = random.Random(semente)
+    return [
+        ''.join(aleatorio.choice(SILABAS) for _ in range(aleatorio.randint(2, 4))) + aleatorio.choice(SUFIXOS)
+        for _ in range(total)
+    ]
+
+
+def com_erro(marca: str, aleatorio: random.Random) -> str:
+    """Variação com um erro de digitação (troca, remoção ou espaço a mais)"""
+    i = aleatorio.randrange(1, len(marca))
+    tipo = aleatorio.choice(('troca', 'remocao', 'espaco'))
+    if tipo == 'troca':
+        return marca[:i] + aleatorio.choice('aeioulnrst') + marca[i + 1:]
+    if tipo == 'remocao':
+        return marca[:i] + marca[i + 1:]
+    return marca[:i] + ' ' + marca[i:]
+
+
+def _percentil(valores: list, p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+def benchmark_memoria(marcas: list, buscas: int, amostra_recall: int, consultas_recall: int, limiar: float):
+    inicio = time.perf_counter()
+    normalizadas = [normalizar_texto(m) for m in marcas]
+    blocos = defaultdict(list)
+    for i, marca_norm in enumerate(normalizadas):
+        for chave in chaves_texto(marca_norm):
+            blocos[chave].append(i)
+    duracao_chaves = time.perf_counter() - inicio
+
+    tamanhos = [len(ids) for ids in blocos.values()]
+    total_chaves = sum(tamanhos)
+    print(f"Chaves calculadas para {len(marcas)} marcas em {duracao_chaves:.1f}s "
+          f"({len(marcas) / duracao_chaves:,.0f} marcas/s), {len(blocos):,} blocos, "
+          f"{total_chaves / len(marcas):.1f} chaves por marca")
+    print(f"Tamanho dos blocos: média {statistics.mean(tamanhos):.1f}, "
+          f"p99 {_percentil(tamanhos, 0.99)}, máximo {max(tamanhos)}")
+
+    aleatorio = random.Random(7)
+    consultas = [com_erro(marcas[aleatorio.randrange(len(marcas))], aleatorio) for _ in range(buscas)]
+
+    latencias, candidatos_por_busca, resultados = [], [], []
+    for consulta in consultas:
+        inicio = time.perf_counter()
+        consulta_norm = normalizar_texto(consulta)
+        candidatos = set()
+        for chave in chaves_busca(consulta_norm):
+            candidatos.update(blocos.get(chave, ()))
+        encontrados = {i for i in candidatos if pontuar(consulta_norm, normalizadas[i]) >= limiar}
+        latencias.append(time.perf_counter() - inicio)
+        candidatos_por_busca.append(len(candidatos))
+        resultados.append(encontrados)
+
+    print(f"Busca com bloqueio ({buscas} consultas): mediana {statistics.median(latencias) * 1000:.1f}ms, "
+          f"p99 {_percentil(latencias, 0.99) * 1000:.1f}ms, "
+          f"candidatos médios {statistics.mean(candidatos_por_busca):,.0f} de {len(marcas):,}")
+
+    # Recall: força bruta restrita às primeiras amostra_recall marcas
+    amostra = range(min(amostra_recall, len(marcas)))
+    esperados = total_recuperados = 0
+    inicio = time.perf_counter()
+    amostra_consultas = list(zip(consultas, resultados))[:consultas_recall]
+    for consulta, encontrados in amostra_consultas:
+        consulta_norm = normalizar_texto(consulta)
+        verdadeiros = {i for i in amostra if pontuar(consulta_norm, normalizadas[i]) >= limiar}
+        esperados += len(verdadeiros)
+        total_recuperados += len(verdadeiros & encontrados)
+    duracao_bruta = (time.perf_counter() - inicio) / len(amostra_consultas)
+    recall = total_recuperados / esperados if esperados else 1.0
+    print(f"Força bruta em {len(amostra):,} marcas: {duracao_bruta * 1000:.0f}ms por consulta; "
+          f"recall do bloqueio em {len(amostra_consultas)} consultas {recall:.1%} ({total_recuperados}/{esperados})")
+    return consultas
+
+
+async def benchmark_mongo(marcas: list, consultas: list, limiar: float):
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from scrapers.indice_processos import campos_normalizados, garantir_indices
+    from scrapers.similaridade import campos_similaridade
+    import os
+
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    db = client['inpi_benchmark_similaridade']
+    await client.drop_database(db.name)
+    try:
+        await garantir_indices(db)
+        inicio = time.perf_counter()
+        lote = []
+        for i, marca in enumerate(marcas):
+            processo = {'numero_processo': str(900000000 + i), 'execucao_id': 'benchmark', 'marca': marca}
+            processo.update(campos_normalizados(processo))
+            processo.update(campos_similaridade(processo))
+            lote.append(processo)
+            if len(lote) >= 10000:
+                await db.processos_indeferimento.insert_many(lote, ordered=False)
+                lote = []
+        if lote:
+            await db.processos_indeferimento.insert_many(lote, ordered=False)
+        print(f"MongoDB: {len(marcas):,} processos gravados em {time.perf_counter() - inicio:.1f}s")
+
+        latencias = []
+        for consulta in consultas:
+            inicio = time.perf_counter()
+            await buscar_similares(db, consulta, 'marca', limiar)
+            latencias.append(time.perf_counter() - inicio)
+        print(f"MongoDB buscar_similares: mediana {statistics.median(latencias) * 1000:.1f}ms, "
+              f"p99 {_percentil(latencias, 0.99) * 1000:.1f}ms")
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark da busca de marcas parecidas')
+    parser.add_argument('--marcas', type=int, default=1_000_000)
+    parser.add_argument('--buscas', type=int, default=200)
+    parser.add_argument('--amostra-recall', type=int, default=50_000, help='marcas comparadas por força bruta')
+    parser.add_argument('--consultas-recall', type=int, default=100, help='buscas conferidas por força bruta')
+    parser.add_argument('--limiar', type=float, default=LIMIAR_PADRAO)
+    parser.add_argument('--mongo', action='store_true', help='mede também buscar_similares no MongoDB')
+    args = parser.parse_args()
+
+    marcas = gerar_marcas(args.marcas)
+    consultas = benchmark_memoria(marcas, args.buscas, args.amostra_recall, args.consultas_recall, args.limiar)
+    if args.mongo:
+        asyncio.run(benchmark_mongo(marcas, consultas, args.limiar))
@@ -0,0 +1,236 @@
+"""
+Benchmark ponta a ponta do INPIScraper contra o servidor mock local.
+
+Para cada perfil de navegador (enxuto/completo) e nível de concorrência (PEPI_WORKERS)
+executa executar_scraping completo (revista → ZIP → XML → MongoDB → pePI → CAPTCHA → PDF)
+e reporta:
+  - throughput (processos/min)
+  - latência e bytes médios por etapa (metricas_etapas gravadas na execução)
+  - pico de RSS do processo Python e dos processos do navegador (Chromium e
+    driver do Playwright, somados)
+
+Cada rodada roda num subprocesso próprio (--rodada): o pico de RSS
+(ru_maxrss) é da rodada e não o maior desde o início, e circuit breaker,
+pool de contas e demais estados globais dos scrapers começam do zero. O
+Chromium é neto do processo (via driver do Playwright) e não entra em
+RUSAGE_CHILDREN: a árvore de processos é amostrada em /proc durante a rodada.
+O servidor mock roda no processo principal e atende todas as rodadas.
+
+Requer MongoDB (MONGO_URL, padrão mongodb://localhost:27017) e o Chromium do Playwright
+(CHROMIUM_EXECUTABLE_PATH).
+
+Uso: python -m benchmark.executar_benchmark --processos 20 --concorrencias 1,2,4 --perfis enxuto,completo
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmark.servidor_mock import ServidorMock
+
+logger = logging.getLogger(__name__)
+
+
+def _configurar_ambiente(url_mock: str):
+    """Aponta o pipeline para o mock (antes de importar os scrapers)"""
+    os.environ['INPI_REVISTAS_URL'] = f"{url_mock}/rpi/"
+    os.environ['PEPI_BASE_URL'] = f"{url_mock}/pePI/"
+    os.environ['CAPTCHA_SOLVER_URL'] = f"{url_mock}/captcha"
+    os.environ['NOTIFICACOES_EMAIL_ATIVAS'] = '0'
+    os.environ['PEPI_MEDIR_TRAFEGO'] = '1'
+    # O mock aceita qualquer login; a concorrência da conta não limita as rodadas
+    os.environ.setdefault('PEPI_CONTAS', 'benchmark:benchmark:16')
+
+
+# Linha do subprocesso da rodada com o resultado em JSON
+PREFIXO_RESULTADO = 'RESULTADO_RODADA '
+
+
+def _descendentes(pid: int) -> list:
+    """PIDs de todos os descendentes de pid (lidos de /proc)"""
+    filhos = {}
+    for entrada in os.listdir('/proc'):
+        if not entrada.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entrada}/stat') as f:
+                # O nome do processo pode ter espaços: o ppid vem depois do último ')'
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        filhos.setdefault(ppid, []).append(int(entrada))
+    descendentes = []
+    pendentes = [pid]
+    while pendentes:
+        for filho in filhos.get(pendentes.pop(), []):
+            descendentes.append(filho)
+            pendentes.append(filho)
+    return descendentes
+
+
+def _rss_mb(pid: int) -> float:
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, IndexError, ValueError):
+        # Processo terminou entre a listagem e a leitura
+        return 0.0
+
+
+class AmostradorRSS(threading.Thread):
+    """Pico da soma de RSS dos descendentes deste processo (navegadores)"""
+
+    def __init__(self, intervalo: float = 0.25):
+        super().__init__(daemon=True)
+        self.intervalo = intervalo
+        self.pico_descendentes_mb = 0.0
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.is_set():
+            total = sum(_rss_mb(pid) for pid in _descendentes(os.getpid()))
+            self.pico_descendentes_mb = max(self.pico_descendentes_mb, total)
+            self._parar.wait(self.intervalo)
+
+    def parar(self):
+        self._parar.set()
+        self.join()
+
+
+async def _executar_rodada(db, perfil: str, concorrencia: int, total_processos: int, intervalo: float) -> dict:
+    from scrapers.inpi_scraper import INPIScraper
+    from scrapers import navegador
+
+    navegador.PERFIL_ENXUTO = perfil == 'enxuto'
+    scraper = INPIScraper(db)
+    scraper.pepi_workers = concorrencia
+    scraper.limite_processos = total_processos
+    scraper.pepi_intervalo = intervalo
+
+    inicio = time.perf_counter()
+    await scraper.executar_scraping()
+    duracao = time.perf_counter() - inicio
+
+    execucao = await db.execucoes.find_one({}, {"_id": 0}, sort=[("data_execucao", -1)])
+    processados = execucao.get('total_processos', 0)
+    return {
+        'perfil': perfil,
+        'concorrencia': concorrencia,
+        'status': execucao.get('status'),
+        'processos': processados,
+        'duracao_s': duracao,
+        'processos_min': processados / duracao * 60 if duracao else 0,
+        'etapas': execucao.get('metricas_etapas') or {},
+    }
+
+
+def _imprimir_relatorio(resultados: list, contadores: dict):
+    print(f"\n{'='*80}")
+    print("📊 BENCHMARK OFFLINE")
+    print(f"{'='*80}")
+    print(f"{'perfil':>9} {'workers':>8} {'status':>10} {'processos':>10} {'duração (s)':>12} {'proc/min':>10} {'RSS py (MB)':>12} {'RSS nav. (MB)':>15}")
+    for r in resultados:
+        print(f"{r['perfil']:>9} {r['concorrencia']:>8} {r['status']:>10} {r['processos']:>10} {r['duracao_s']:>12.1f} "
+              f"{r['processos_min']:>10.1f} {r['rss_proprio_mb']:>12.0f} {r['rss_filhos_mb']:>15.0f}")
+
+    for r in resultados:
+        print(f"\nLatência por etapa - perfil {r['perfil']}, {r['concorrencia']} worker(s):")
+        print(f"  {'etapa':<16} {'qtd':>5} {'média (s)':>10} {'máx (s)':>10} {'total (s)':>10} {'média KB':>10}")
+        for etapa, m in sorted(r['etapas'].items(), key=lambda item: -item[1]['total_s']):
+            kb = f"{m['media_bytes'] / 1024:.1f}" if 'media_bytes' in m else '-'
+            print(f"  {etapa:<16} {m['quantidade']:>5} {m['media_s']:>10.3f} {m['max_s']:>10.3f} {m['total_s']:>10.1f} {kb:>10}")
+
+    print(f"\nRequisições servidas pelo mock: {contadores}")
+
+
+async def _rodada_isolada(args, url_mock: str, perfil: str, concorrencia: int) -> dict:
+    """Executa uma rodada em um subprocesso novo e lê o resultado dele"""
+    comando = [
+        sys.executable, '-m', 'benchmark.executar_benchmark', '--rodada', perfil, str(concorrencia),
+        '--url-mock', url_mock, '--processos', str(args.processos), '--intervalo', str(args.intervalo)
+    ]
+    if args.manter_bancos:
+        comando.append('--manter-bancos')
+    processo = await asyncio.create_subprocess_exec(
+        *comando, cwd=str(Path(__file__).resolve().parents[1]), stdout=asyncio.subprocess.PIPE
+    )
+    saida, _ = await processo.communicate()
+    for linha in saida.decode().splitlines():
+        if linha.startswith(PREFIXO_RESULTADO):
+            return json.loads(linha[len(PREFIXO_RESULTADO):])
+    raise RuntimeError(f"Rodada {perfil}/{concorrencia} terminou sem resultado (código {processo.returncode})")
+
+
+async def executar_rodada_subprocesso(args):
+    """Corpo do subprocesso de uma rodada (--rodada perfil concorrencia)"""
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    perfil, concorrencia = args.rodada[0], int(args.rodada[1])
+    _configurar_ambiente(args.url_mock)
+    client = AsyncIOMotorClient(os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017'))
+    amostrador = AmostradorRSS()
+    try:
+        # Banco limpo por rodada
+        db = client[f"inpi_benchmark_{perfil}_{concorrencia}"]
+        await client.drop_database(db.name)
+        # contas_pepi (empréstimos e pausas das contas) no banco da rodada
+        os.environ['DB_NAME'] = db.name
+
+        amostrador.start()
+        resultado = await _executar_rodada(db, perfil, concorrencia, args.processos, args.intervalo)
+        amostrador.parar()
+        resultado['rss_proprio_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        resultado['rss_filhos_mb'] = amostrador.pico_descendentes_mb
+
+        if not args.manter_bancos:
+            await client.drop_database(db.name)
+    finally:
+        client.close()
+    print(PREFIXO_RESULTADO + json.dumps(resultado), flush=True)
+
+
+async def main(args):
+    servidor = ServidorMock(args.porta, max(args.processos * 2, 200), args.latencia_captcha, args.latencia_pagina)
+    servidor.iniciar()
+
+    resultados = []
+    try:
+        for perfil in args.perfis.split(','):
+            for concorrencia in [int(c) for c in args.concorrencias.split(',')]:
+                logger.info(f"▶️  Rodada perfil {perfil} com {concorrencia} worker(s)")
+                resultados.append(await _rodada_isolada(args, servidor.url, perfil, concorrencia))
+    finally:
+        servidor.parar()
+
+    _imprimir_relatorio(resultados, servidor.contadores)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark offline do pipeline INPI')
+    parser.add_argument('--processos', type=int, default=20, help='processos enviados ao pePI por rodada')
+    parser.add_argument('--concorrencias', default='1,2,4', help='valores de PEPI_WORKERS separados por vírgula')
+    parser.add_argument('--perfis', default='enxuto', help='perfis de navegador: enxuto,completo')
+    parser.add_argument('--porta', type=int, default=8765)
+    parser.add_argument('--latencia-captcha', type=float, default=2.0, help='segundos por CAPTCHA resolvido')
+    parser.add_argument('--latencia-pagina', type=float, default=0.0, help='segundos extras por página do pePI')
+    parser.add_argument('--intervalo', type=float, default=0.0, help='pausa entre processos por worker')
+    parser.add_argument('--manter-bancos', action='store_true')
+    # Uso interno: uma rodada no subprocesso, contra o mock já iniciado
+    parser.add_argument('--rodada', nargs=2, metavar=('PERFIL', 'CONCORRENCIA'), help=argparse.SUPPRESS)
+    parser.add_argument('--url-mock', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.WARNING,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    logger.setLevel(logging.INFO)
+    asyncio.run(executar_rodada_subprocesso(args) if args.rodada else main(args))
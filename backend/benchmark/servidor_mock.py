@@ -0,0 +1,329 @@
+"""
+Servidor local que substitui revistas.inpi.gov.br, busca.inpi.gov.br e o CapMonster
+para benchmarks offline do pipeline.
+
+Rotas:
+  GET  /rpi/                              listagem de revistas (total_revistas edições)
+  GET  /txt/RM{numero}.zip                ZIP sintético com o XML da seção de marcas
+  GET  /pePI/                             página de login
+  POST /pePI/servlet/LoginController      login (devolve a página de pesquisa)
+  GET  /pePI/jsp/marcas/Pesquisa_num_processo.jsp
+  POST /pePI/servlet/MarcasServletController   resultado da pesquisa
+  GET  /pePI/servlet/MarcasServletController?Action=detail      detalhes + petições
+  GET  /pePI/servlet/MarcasServletController?Action=modalSolicitacaoAmploAcesso
+  GET  /pePI/servlet/DownloadPdf?processo=...  PDF gerado com marca e email
+  POST /captcha                           resolvedor falso (latência configurável)
+
+Uso: python -m benchmark.servidor_mock --porta 8765 --processos 500
+"""
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from pathlib import Path
+import argparse
+import io
+import json
+import re
+import threading
+import time
+import zipfile
+import logging
+
+logger = logging.getLogger(__name__)
+
+REPO_DIR = Path(__file__).resolve().parents[2]
+
+# Número e código do processo das páginas capturadas
+NUMERO_CAPTURADO = '907206638'
+COD_PEDIDO_CAPTURADO = '2976374'
+
+NUMERO_REVISTA = '2860'
+PRIMEIRO_PROCESSO = 930000000
+
+PAGINA_LOGIN = """<html><head><title>INPI</title></head><body>
+<form method="POST" action="/pePI/servlet/LoginController">
+Login: <input type="text" name="T_Login"> Senha: <input type="password" name="T_Senha">
+<input type="submit" value="Continuar">
+</form></body></html>"""
+
+PAGINA_FINALIDADE = """<html><head><title>INPI</title></head><body>
+<form onsubmit="window.close(); return false;">
+<select name="finalidade"><option>Selecione</option>
+<option>Pesquisa para Fins Profissionais ou Acadêmicos</option></select>
+<input type="checkbox" name="aceite"> Declaro que li os termos
+<input type="submit" value="Enviar">
+</form></body></html>"""
+
+# Substitui o captcha.js do pePI: clique no pdf.gif abre o modal, envio do
+# formulário navega para o download do PDF
+CAPTCHA_JS = """
+document.addEventListener('click', function (ev) {
+    var img = ev.target.closest('img[src*="pdf.gif"]');
+    if (!img) return;
+    var el = document.getElementById('captchaForm');
+    while (el && el !== document.body) {
+        el.style.display = 'block';
+        el.style.visibility = 'visible';
+        el = el.parentElement;
+    }
+});
+document.addEventListener('submit', function (ev) {
+    if (ev.target.id !== 'captchaForm') return;
+    ev.preventDefault();
+    var campo = document.getElementById('numeroProcesso');
+    window.location.href = '/pePI/servlet/DownloadPdf?processo=' + (campo ? campo.value : '');
+});
+"""
+
+
+def _ler_captura(nome: str) -> str:
+    return (REPO_DIR / nome).read_text(encoding='utf-8', errors='replace')
+
+
+def _remover_recursos_externos(html: str) -> str:
+    """Remove scripts e iframes de terceiros (Google, barra do governo) das páginas capturadas"""
+    html = re.sub(r'<script[^>]*src="(?:https?:)?//[^"]*"[^>]*>\s*</script>', '', html)
+    html = re.sub(r'<iframe[^>]*>.*?</iframe>', '', html, flags=re.DOTALL)
+    return html
+
+
+def _preparar_detalhe(html: str) -> str:
+    """Garante um ícone pdf.gif na linha do serviço 389 e aponta o captcha.js para o stub"""
+    html = _remover_recursos_externos(html)
+    html = html.replace('../jsp/funcoes/captcha.js', '/pePI/mock/captcha.js')
+
+    # Célula do código de serviço 389 (link com showMe('389'))
+    match = re.search(r"<a[^>]*showMe\('389'\)[^>]*>\s*389\s*</a>\s*</font>", html)
+    if match:
+        icone = '<img src="../jsp/imagens/pdf.gif" class="salvaDocumento" width="16" height="16">'
+        html = html[:match.end()] + icone + html[match.end():]
+    return html
+
+
+def gerar_xml_revista(total_processos: int) -> str:
+    """XML sintético no formato da seção V (marcas) da RPI"""
+    linhas = ['<?xml version="1.0" encoding="UTF-8"?>',
+              f'<revista numero="{NUMERO_REVISTA}" data="01/01/2026">']
+    apresentacoes = ['Nominativa', 'Mista', 'Figurativa', 'Nominativa']
+
+    for i in range(total_processos):
+        numero = PRIMEIRO_PROCESSO + i
+        procurador = f'<procurador>ESCRITORIO {i}</procurador>' if i % 4 == 3 else ''
+        linhas.append(
+            f'<processo numero="{numero}" data-deposito="01/01/2025">'
+            f'<despachos><despacho codigo="IPAS024" nome="Indeferimento do pedido"/></despachos>'
+            f'<titulares><titular nome-razao-social="EMPRESA {i % (total_processos // 2 or 1)} LTDA" pais="BR" uf="SP"/></titulares>'
+            f'<marca apresentacao="{apresentacoes[i % 4]}" natureza="De Produto"><nome>MARCA {i}</nome></marca>'
+            f'{procurador}</processo>'
+        )
+        # Ruído: processos com outros despachos
+        linhas.append(
+            f'<processo numero="{numero + 500000}">'
+            f'<despachos><despacho codigo="IPAS009" nome="Publicação de pedido"/></despachos>'
+            f'</processo>'
+        )
+
+    linhas.append('</revista>')
+    return '\n'.join(linhas)
+
+
+def gerar_zip_revista(total_processos: int) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        zip_file.writestr(f'RM{NUMERO_REVISTA}.xml', gerar_xml_revista(total_processos))
+    return buffer.getvalue()
+
+
+def _escapar_pdf(texto: str) -> str:
+    return texto.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def gerar_pdf(numero_processo: str) -> bytes:
+    """PDF mínimo (uma página, Helvetica) com as seções lidas por extrair_dados_de_pdf"""
+    linhas = [
+        'Dados Gerais',
+        f'Processo: {numero_processo}',
+        f'E-mail: contato{numero_processo}@empresa.com.br',
+        'Dados da Marca',
+        'Natureza:',
+        f'MARCA {numero_processo} Elemento Nominativo:',
+    ]
+    comandos = ['BT', '/F1 11 Tf', '14 TL', '50 780 Td']
+    for linha in linhas:
+        comandos.append(f'({_escapar_pdf(linha)}) Tj T*')
+    comandos.append('ET')
+    conteudo = '\n'.join(comandos).encode('latin-1')
+
+    objetos = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+        b'/Resources << /Font << /F1 5 0 R >> >> /Contents 4 0 R >>',
+        b'<< /Length ' + str(len(conteudo)).encode() + b' >>\nstream\n' + conteudo + b'\nendstream',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+    ]
+
+    saida = io.BytesIO()
+    saida.write(b'%PDF-1.4\n')
+    offsets = []
+    for i, objeto in enumerate(objetos, 1):
+        offsets.append(saida.tell())
+        saida.write(f'{i} 0 obj\n'.encode() + objeto + b'\nendobj\n')
+    inicio_xref = saida.tell()
+    saida.write(f'xref\n0 {len(objetos) + 1}\n0000000000 65535 f \n'.encode())
+    for offset in offsets:
+        saida.write(f'{offset:010d} 00000 n \n'.encode())
+    saida.write(f'trailer\n<< /Size {len(objetos) + 1} /Root 1 0 R >>\nstartxref\n{inicio_xref}\n%%EOF\n'.encode())
+    return saida.getvalue()
+
+
+class ServidorMock:
+    """Sobe o servidor mock em uma thread"""
+
+    def __init__(self, porta: int = 8765, total_processos: int = 500,
+                 latencia_captcha: float = 0.0, latencia_pagina: float = 0.0,
+                 total_revistas: int = 1):
+        self.porta = porta
+        self.total_processos = total_processos
+        self.total_revistas = total_revistas
+        self.latencia_captcha = latencia_captcha
+        self.latencia_pagina = latencia_pagina
+        self.contadores = {'paginas': 0, 'captchas': 0, 'pdfs': 0, 'zips': 0}
+        self._lock = threading.Lock()
+
+        self.pagina_pesquisa = _remover_recursos_externos(_ler_captura('page_html.html'))
+        self.pagina_resultado = _remover_recursos_externos(_ler_captura('results_html.html'))
+        self.pagina_detalhe = _preparar_detalhe(_ler_captura('peticoes_html.html'))
+        self.zip_revista = gerar_zip_revista(total_processos)
+
+        self._servidor = ThreadingHTTPServer(('127.0.0.1', porta), self._criar_handler())
+        self._servidor.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.porta}"
+
+    def contar(self, chave: str):
+        with self._lock:
+            self.contadores[chave] += 1
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._servidor.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"Servidor mock em {self.url}")
+
+    def parar(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+    def _criar_handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _responder(self, corpo, tipo='text/html; charset=utf-8', status=200, headers=None):
+                if isinstance(corpo, str):
+                    corpo = corpo.encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', tipo)
+                self.send_header('Content-Length', str(len(corpo)))
+                for chave, valor in (headers or {}).items():
+                    self.send_header(chave, valor)
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def _ler_corpo(self) -> str:
+                tamanho = int(self.headers.get('Content-Length', 0))
+                return self.rfile.read(tamanho).decode('utf-8') if tamanho else ''
+
+            def _pagina(self, html):
+                mock.contar('paginas')
+                if mock.latencia_pagina:
+                    time.sleep(mock.latencia_pagina)
+                self._responder(html)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+
+                if url.path == '/rpi/':
+                    linhas = ''.join(
+                        f'<tr><td>{numero}</td><td>01/01/2026</td><td></td><td></td><td></td><td></td>'
+                        f'<td><a href="/txt/RM{numero}.zip">XML</a></td></tr>'
+                        for numero in range(int(NUMERO_REVISTA), int(NUMERO_REVISTA) - mock.total_revistas, -1)
+                    )
+                    self._pagina(f'<html><body><table><tr><th>Nº</th></tr>{linhas}</table></body></html>')
+                elif url.path.startswith('/txt/') and url.path.endswith('.zip'):
+                    mock.contar('zips')
+                    self._responder(mock.zip_revista, tipo='application/zip')
+                elif url.path in ('/pePI/', '/pePI/index.jsp'):
+                    self._pagina(PAGINA_LOGIN)
+                elif url.path == '/pePI/jsp/marcas/Pesquisa_num_processo.jsp':
+                    self._pagina(mock.pagina_pesquisa)
+                elif url.path == '/pePI/servlet/MarcasServletController':
+                    acao = params.get('Action')
+                    if acao == 'detail':
+                        numero = params.get('CodPedido', NUMERO_CAPTURADO)
+                        self._pagina(mock.pagina_detalhe.replace(NUMERO_CAPTURADO, numero))
+                    elif acao == 'modalSolicitacaoAmploAcesso':
+                        self._pagina(PAGINA_FINALIDADE)
+                    else:
+                        self._responder('Ação desconhecida', status=404)
+                elif url.path == '/pePI/mock/captcha.js':
+                    self._responder(CAPTCHA_JS, tipo='application/javascript')
+                elif url.path == '/pePI/servlet/DownloadPdf':
+                    mock.contar('pdfs')
+                    numero = params.get('processo', '0')
+                    self._responder(
+                        gerar_pdf(numero),
+                        tipo='application/pdf',
+                        headers={'Content-Disposition': f'attachment; filename="{numero}.pdf"'}
+                    )
+                else:
+                    self._responder('', status=404)
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                corpo = self._ler_corpo()
+
+                if url.path == '/pePI/servlet/LoginController':
+                    self._pagina(mock.pagina_pesquisa)
+                elif url.path == '/pePI/servlet/MarcasServletController':
+                    params = {k: v[0] for k, v in parse_qs(corpo).items()}
+                    numero = params.get('NumPedido', NUMERO_CAPTURADO)
+                    html = mock.pagina_resultado.replace(NUMERO_CAPTURADO, numero)
+                    html = html.replace(f'CodPedido={COD_PEDIDO_CAPTURADO}', f'CodPedido={numero}')
+                    self._pagina(html)
+                elif url.path == '/captcha':
+                    mock.contar('captchas')
+                    if mock.latencia_captcha:
+                        time.sleep(mock.latencia_captcha)
+                    self._responder(
+                        json.dumps({'gRecaptchaResponse': 'token-mock'}),
+                        tipo='application/json'
+                    )
+                else:
+                    self._responder('', status=404)
+
+        return Handler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Servidor mock do INPI/pePI/CapMonster')
+    parser.add_argument('--porta', type=int, default=8765)
+    parser.add_argument('--processos', type=int, default=500)
+    parser.add_argument('--latencia-captcha', type=float, default=0.0)
+    parser.add_argument('--latencia-pagina', type=float, default=0.0)
+    parser.add_argument('--revistas', type=int, default=1)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    servidor = ServidorMock(args.porta, args.processos, args.latencia_captcha, args.latencia_pagina, args.revistas)
+    servidor.iniciar()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        servidor.parar()
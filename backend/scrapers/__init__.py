@@ -0,0 +1,13 @@
+"""
+Scraping da revista do INPI, enriquecimento no pePI e serviços em volta.
+
+Os módulos do pacote leem a configuração do ambiente na importação (constantes no
+topo de cada módulo). O .env do backend é carregado aqui, antes de qualquer um
+deles, para valer no server.py e nos CLIs (python -m scrapers.<módulo>); variáveis
+já definidas no ambiente não são sobrescritas.
+"""
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).resolve().parents[1] / '.env')
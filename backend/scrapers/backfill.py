@@ -0,0 +1,182 @@
+"""
+Backfill histórico: processa várias edições da RPI em paralelo.
+
+Cada edição vira uma execução (tipo 'backfill') com os mesmos documentos de
+processos_indeferimento da execução semanal (processos sem procurador), mas sem
+enriquecimento no pePI: por isso não conta como revista processada para o monitor
+(monitor_revista.py), e a execução semanal da mesma edição ainda roda. O estado
+de cada edição fica em backfill_revistas, então o backfill pode ser interrompido
+e retomado: edições concluídas são puladas e as incompletas são refeitas do zero.
+
+Uso: python -m scrapers.backfill --revistas 104 --concorrencia 4
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+import argparse
+import asyncio
+import logging
+import os
+import uuid
+
+from .inpi_scraper import INPIScraper, baixar_xml_zip
+from .xml_parser import parsear_xml_revista
+from .cache import invalidar as invalidar_cache
+from .esquema import validar_processos
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_LOTE_INSERT = int(os.environ.get('BACKFILL_TAMANHO_LOTE', '1000'))
+
+TIPO_BACKFILL = 'backfill'
+
+
+def _semana_ano(data_publicacao: str) -> tuple:
+    """Semana ISO e ano da data de publicação (dd/mm/aaaa); sem data, usa hoje"""
+    try:
+        data = datetime.strptime(data_publicacao, '%d/%m/%Y')
+    except (TypeError, ValueError):
+        data = datetime.now(timezone.utc)
+    return data.isocalendar()[1], data.year
+
+
+class Backfill:
+    def __init__(self, db, concorrencia: int = 4, processos_parse: int = None):
+        self.db = db
+        self.scraper = INPIScraper(db)
+        self.concorrencia = concorrencia
+        self.processos_parse = processos_parse or os.cpu_count()
+
+    async def _atualizar_status(self, numero_revista: str, **campos):
+        campos['atualizado_em'] = datetime.now(timezone.utc).isoformat()
+        await self.db.backfill_revistas.update_one(
+            {"numero_revista": numero_revista},
+            {"$set": campos},
+            upsert=True
+        )
+
+    async def _inserir_em_lotes(self, processos: list):
+        for inicio in range(0, len(processos), TAMANHO_LOTE_INSERT):
+            lote = processos[inicio:inicio + TAMANHO_LOTE_INSERT]
+            await self.db.processos_indeferimento.insert_many(lote, ordered=False)
+
+    async def _processar_revista(self, revista: dict, pool: ProcessPoolExecutor):
+        numero_revista = revista['numero_revista']
+        loop = asyncio.get_event_loop()
+
+        estado = await self.db.backfill_revistas.find_one({"numero_revista": numero_revista})
+        if estado and estado.get('status') == 'concluido':
+            logger.info(f"⏭️  Revista {numero_revista} já processada")
+            return
+
+        # Execução anterior interrompida: descartar o que ficou pela metade
+        if estado and estado.get('execucao_id'):
+            await self.db.processos_indeferimento.delete_many({"execucao_id": estado['execucao_id']})
+            await self.db.execucoes.delete_one({"id": estado['execucao_id']})
+            await invalidar_cache(self.db, estado['execucao_id'])
+
+        execucao_id = str(uuid.uuid4())
+        semana, ano = _semana_ano(revista.get('data_publicacao'))
+        await self._atualizar_status(
+            numero_revista, status='baixando', execucao_id=execucao_id,
+            xml_url=revista['xml_url'], mensagem_erro=None
+        )
+        await self.db.execucoes.insert_one({
+            "id": execucao_id,
+            "data_execucao": datetime.now(timezone.utc).isoformat(),
+            "status": "processando",
+            "tipo": TIPO_BACKFILL,
+            "numero_revista": numero_revista,
+            "xml_url": revista['xml_url'],
+            "total_processos": 0,
+            "semana": semana,
+            "ano": ano,
+            "mensagem_erro": None
+        })
+        await invalidar_cache(self.db, execucao_id)
+
+        try:
+            xml_content = await loop.run_in_executor(None, baixar_xml_zip, revista['xml_url'])
+            if not xml_content:
+                raise Exception("Falha ao baixar/extrair XML")
+
+            await self._atualizar_status(numero_revista, status='processando')
+            processos = await loop.run_in_executor(
+                pool, parsear_xml_revista, xml_content, execucao_id, semana, ano
+            )
+            del xml_content
+
+            processos_sem_procurador = [p for p in processos if not p.get('tem_procurador', False)]
+            total_com_procurador = len(processos) - len(processos_sem_procurador)
+            validar_processos(processos_sem_procurador)
+            await self._inserir_em_lotes(processos_sem_procurador)
+
+            await self.db.execucoes.update_one(
+                {"id": execucao_id},
+                {"$set": {
+                    "status": "concluido",
+                    "total_processos": len(processos_sem_procurador),
+                    "total_com_procurador": total_com_procurador,
+                    "total_sem_procurador": len(processos_sem_procurador)
+                }}
+            )
+            await invalidar_cache(self.db, execucao_id)
+            await self._atualizar_status(
+                numero_revista, status='concluido', total_processos=len(processos_sem_procurador)
+            )
+            logger.info(f"✅ Revista {numero_revista}: {len(processos_sem_procurador)} processos salvos")
+
+        except Exception as e:
+            logger.error(f"❌ Revista {numero_revista}: {str(e)}")
+            await self.db.execucoes.update_one(
+                {"id": execucao_id},
+                {"$set": {"status": "erro", "mensagem_erro": str(e)}}
+            )
+            await invalidar_cache(self.db, execucao_id)
+            await self._atualizar_status(numero_revista, status='erro', mensagem_erro=str(e))
+
+    async def executar(self, limite_revistas: int = 104) -> dict:
+        """Processa as limite_revistas edições mais recentes (104 ≈ dois anos)"""
+        await self.db.backfill_revistas.create_index("numero_revista", unique=True)
+        revistas = (await self.scraper.listar_revistas())[:limite_revistas]
+        logger.info(f"📚 Backfill de {len(revistas)} revistas com {self.concorrencia} em paralelo")
+
+        semaforo = asyncio.Semaphore(self.concorrencia)
+
+        async def processar(revista):
+            async with semaforo:
+                await self._processar_revista(revista, pool)
+
+        with ProcessPoolExecutor(max_workers=self.processos_parse) as pool:
+            await asyncio.gather(*(processar(r) for r in revistas))
+
+        numeros = [r['numero_revista'] for r in revistas]
+        resumo = {}
+        async for estado in self.db.backfill_revistas.find({"numero_revista": {"$in": numeros}}):
+            resumo[estado['status']] = resumo.get(estado['status'], 0) + 1
+        logger.info(f"📊 Backfill finalizado: {resumo}")
+        return resumo
+
+
+async def _main(args):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        backfill = Backfill(client[os.environ['DB_NAME']], args.concorrencia, args.processos_parse)
+        await backfill.executar(args.revistas)
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Backfill histórico das revistas INPI (seção de marcas)')
+    parser.add_argument('--revistas', type=int, default=104, help='quantidade de edições mais recentes')
+    parser.add_argument('--concorrencia', type=int, default=4, help='edições baixadas/processadas em paralelo')
+    parser.add_argument('--processos-parse', type=int, default=None, help='processos do pool de parsing')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    asyncio.run(_main(args))
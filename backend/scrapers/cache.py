@@ -0,0 +1,218 @@
+"""
+Cache das rotas de leitura da API (execuções, detalhes e status).
+
+Respostas já serializadas (bytes + ETag) ficam em um LRU com TTL em memória. Cada
+entrada é marcada com etiquetas e é invalidada quando o scraping grava:
+  - TAG_EXECUCOES: lista de execuções e status (execuções criadas/alteradas,
+    processos inseridos)
+  - etiqueta_execucao(id): detalhes de uma execução (execução ou processos dela)
+
+invalidar() é chamado por quem escreve em execucoes/processos_indeferimento. Com
+CACHE_COMPARTILHADO=1 a invalidação também incrementa a geração da etiqueta em
+cache_invalidacoes no MongoDB; cada processo da API confere as gerações a cada
+CACHE_VERIFICACAO_S e descarta as entradas invalidadas por outros processos
+(backfill, workers).
+"""
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from prometheus_client import Counter, Histogram
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+CACHE_ATIVO = os.environ.get('CACHE_ATIVO', '1') == '1'
+CACHE_TTL_S = float(os.environ.get('CACHE_TTL_S', '30'))
+CACHE_MAX_ITENS = int(os.environ.get('CACHE_MAX_ITENS', '256'))
+CACHE_COMPARTILHADO = os.environ.get('CACHE_COMPARTILHADO', '0') == '1'
+CACHE_VERIFICACAO_S = float(os.environ.get('CACHE_VERIFICACAO_S', '2'))
+
+TAG_EXECUCOES = 'execucoes'
+
+CONSULTAS_CACHE = Counter(
+    'inpi_cache_consultas_total',
+    'Consultas ao cache de respostas da API',
+    ['rota', 'resultado']
+)
+
+DURACAO_ROTA = Histogram(
+    'inpi_api_rota_duracao_segundos',
+    'Duração das rotas de leitura com cache',
+    ['rota', 'resultado'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+
+# Resultados: acerto, falha (carregado do MongoDB) e nao_modificado (304)
+RESULTADO_ACERTO = 'acerto'
+RESULTADO_FALHA = 'falha'
+RESULTADO_NAO_MODIFICADO = 'nao_modificado'
+
+
+def etiqueta_execucao(execucao_id: str) -> str:
+    return f"execucao:{execucao_id}"
+
+
+def calcular_etag(corpo: bytes) -> str:
+    return '"' + hashlib.sha1(corpo).hexdigest() + '"'
+
+
+class CacheRespostas:
+    """LRU com TTL seguro entre threads (o scheduler invalida de outra thread)"""
+
+    def __init__(self, max_itens: int = CACHE_MAX_ITENS, ttl_s: float = CACHE_TTL_S, relogio=None):
+        self.max_itens = max_itens
+        self.ttl_s = ttl_s
+        self._relogio = relogio or time.monotonic
+        self._lock = threading.Lock()
+        self._itens = OrderedDict()
+        # Geração local por etiqueta: carga iniciada antes de uma invalidação não é gravada
+        self._geracoes = {}
+        self.acertos = 0
+        self.falhas = 0
+        self.invalidacoes = 0
+
+    def geracao(self, tags) -> tuple:
+        with self._lock:
+            return tuple(self._geracoes.get(tag, 0) for tag in tags)
+
+    def obter(self, chave: str):
+        """(corpo, etag) ou None se ausente/expirado"""
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None or item['expira'] <= self._relogio():
+                if item is not None:
+                    del self._itens[chave]
+                self.falhas += 1
+                return None
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+            return item['corpo'], item['etag']
+
+    def gravar(self, chave: str, tags, corpo: bytes, geracao: tuple = None) -> str:
+        etag = calcular_etag(corpo)
+        with self._lock:
+            if geracao is not None and geracao != tuple(self._geracoes.get(tag, 0) for tag in tags):
+                # Invalidada durante a carga: a resposta já pode estar desatualizada
+                return etag
+            self._itens[chave] = {
+                'corpo': corpo, 'etag': etag, 'tags': tuple(tags),
+                'expira': self._relogio() + self.ttl_s
+            }
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+        return etag
+
+    def invalidar(self, *tags):
+        tags = set(tags)
+        with self._lock:
+            for tag in tags:
+                self._geracoes[tag] = self._geracoes.get(tag, 0) + 1
+            removidas = [chave for chave, item in self._itens.items() if tags & set(item['tags'])]
+            for chave in removidas:
+                del self._itens[chave]
+            self.invalidacoes += 1
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            consultas = self.acertos + self.falhas
+            return {
+                'itens': len(self._itens),
+                'max_itens': self.max_itens,
+                'ttl_s': self.ttl_s,
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'taxa_acerto': round(self.acertos / consultas, 4) if consultas else None,
+                'invalidacoes': self.invalidacoes,
+                'compartilhado': CACHE_COMPARTILHADO
+            }
+
+
+class InvalidacaoCompartilhada:
+    """Gerações das etiquetas no MongoDB (cache_invalidacoes) para invalidar entre processos"""
+
+    def __init__(self, cache: CacheRespostas, verificacao_s: float = CACHE_VERIFICACAO_S):
+        self.cache = cache
+        self.verificacao_s = verificacao_s
+        self._conhecidas = {}
+        self._ultima_verificacao = 0.0
+        self._desde = datetime.now(timezone.utc)
+
+    async def publicar(self, db, tags):
+        agora = datetime.now(timezone.utc)
+        for tag in tags:
+            documento = await db.cache_invalidacoes.find_one_and_update(
+                {"_id": tag},
+                {"$inc": {"geracao": 1}, "$set": {"atualizado_em": agora}},
+                upsert=True, projection={"geracao": 1}, return_document=ReturnDocument.AFTER
+            )
+            # Invalidação deste processo já aplicada localmente
+            self._conhecidas[tag] = documento['geracao']
+
+    async def verificar(self, db):
+        """Aplica invalidações de outros processos (no máximo a cada verificacao_s)"""
+        if time.monotonic() - self._ultima_verificacao < self.verificacao_s:
+            return
+        self._ultima_verificacao = time.monotonic()
+        # Margem para diferenças de relógio entre os processos que escrevem
+        desde = self._desde - timedelta(seconds=self.verificacao_s + 5)
+        self._desde = datetime.now(timezone.utc)
+        alteradas = []
+        async for documento in db.cache_invalidacoes.find({"atualizado_em": {"$gte": desde}}):
+            if self._conhecidas.get(documento['_id']) != documento['geracao']:
+                self._conhecidas[documento['_id']] = documento['geracao']
+                alteradas.append(documento['_id'])
+        if alteradas:
+            self.cache.invalidar(*alteradas)
+
+
+cache_respostas = CacheRespostas()
+invalidacao_compartilhada = InvalidacaoCompartilhada(cache_respostas)
+
+
+async def invalidar(db, execucao_id: str = None, lista: bool = True):
+    """Invalida as respostas afetadas por uma escrita em execucoes/processos_indeferimento
+
+    lista=False quando só processos de uma execução mudaram (lista e status intactos).
+    """
+    tags = ([TAG_EXECUCOES] if lista else []) + ([etiqueta_execucao(execucao_id)] if execucao_id else [])
+    if not tags:
+        return
+    cache_respostas.invalidar(*tags)
+    if CACHE_COMPARTILHADO:
+        try:
+            await invalidacao_compartilhada.publicar(db, tags)
+        except Exception as e:
+            logger.warning(f"Falha ao publicar invalidação do cache: {str(e)}")
+
+
+def registrar_consulta(rota: str, resultado: str, duracao: float):
+    CONSULTAS_CACHE.labels(rota, resultado).inc()
+    DURACAO_ROTA.labels(rota, resultado).observe(duracao)
+
+
+async def resposta_em_cache(db, rota: str, chave: str, tags, carregar):
+    """(corpo, etag, resultado) do cache ou de `carregar()` (corrotina que retorna bytes)"""
+    if not CACHE_ATIVO:
+        corpo = await carregar()
+        return corpo, calcular_etag(corpo), RESULTADO_FALHA
+
+    if CACHE_COMPARTILHADO:
+        await invalidacao_compartilhada.verificar(db)
+    item = cache_respostas.obter(chave)
+    if item is not None:
+        return item[0], item[1], RESULTADO_ACERTO
+
+    geracao = cache_respostas.geracao(tags)
+    corpo = await carregar()
+    etag = cache_respostas.gravar(chave, tags, corpo, geracao)
+    return corpo, etag, RESULTADO_FALHA
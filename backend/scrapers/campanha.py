@@ -0,0 +1,288 @@
+"""
+Campanhas de email para os leads de uma execução.
+
+criar_campanha() gera um envio (campanha_envios) por email distinto da execução,
+já descontando a lista de supressão. EnviadorCampanha envia com CAMPANHA_CONEXOES
+conexões SMTP reaproveitadas, respeitando um limite global (provedor) e um limite
+por domínio de destino. Cada envio é reservado atomicamente (pendente → enviando),
+então uma campanha interrompida é retomada só com o que faltou; reservas antigas
+(processo que morreu no meio do envio) voltam a ser elegíveis.
+
+Estados de um envio: pendente, enviando, enviado, falha (erro temporário esgotado),
+devolvido (destinatário recusado com 5xx no SMTP ou bounce registrado depois).
+
+Uso (retomar): python -m scrapers.campanha --campanha <id>
+"""
+from datetime import datetime, timedelta, timezone
+from string import Template
+import argparse
+import asyncio
+import logging
+import os
+import time
+import uuid
+
+import aiosmtplib
+from pymongo import ASCENDING, ReturnDocument
+
+from .email_notifier import NotificadorEmail, montar_mensagem, SMTP_FROM, destinatario_recusado
+from .indice_processos import normalizar_email
+from .supressao import carregar_suprimidos, suprimir_contato, MOTIVO_CONTATADO, MOTIVO_DEVOLVIDO
+
+logger = logging.getLogger(__name__)
+
+CONEXOES = int(os.environ.get('CAMPANHA_CONEXOES', '4'))
+LIMITE_POR_MINUTO = float(os.environ.get('CAMPANHA_LIMITE_POR_MINUTO', '1200'))
+LIMITE_DOMINIO_POR_MINUTO = float(os.environ.get('CAMPANHA_LIMITE_DOMINIO_POR_MINUTO', '120'))
+MAX_TENTATIVAS = int(os.environ.get('CAMPANHA_MAX_TENTATIVAS', '3'))
+# Reserva de envio abandonada (processo caiu) volta a ser elegível depois desse tempo
+RESERVA_EXPIRA_S = int(os.environ.get('CAMPANHA_RESERVA_EXPIRA_S', '300'))
+
+ENVIO_PENDENTE = 'pendente'
+ENVIO_ENVIANDO = 'enviando'
+ENVIO_ENVIADO = 'enviado'
+ENVIO_FALHA = 'falha'
+ENVIO_DEVOLVIDO = 'devolvido'
+
+CAMPANHA_PRONTA = 'pronta'
+CAMPANHA_ENVIANDO = 'enviando'
+CAMPANHA_CONCLUIDA = 'concluida'
+
+# Variáveis disponíveis nos templates ($marca, ${numero_processo} ...)
+VARIAVEIS_TEMPLATE = ('marca', 'numero_processo', 'titular', 'email')
+
+
+def renderizar(template: str, envio: dict) -> str:
+    return Template(template).substitute({v: envio.get(v) or '' for v in VARIAVEIS_TEMPLATE})
+
+
+def validar_template(template: str):
+    """Levanta ValueError para variáveis desconhecidas ou '$' solto"""
+    try:
+        renderizar(template, {})
+    except (KeyError, ValueError) as e:
+        raise ValueError(f"Template inválido ({e}). Variáveis: {', '.join('$' + v for v in VARIAVEIS_TEMPLATE)}")
+
+
+def dominio(email: str) -> str:
+    return email.rsplit('@', 1)[-1].lower()
+
+
+class LimiteTaxa:
+    """Espaça as chamadas de aguardar() para no máximo por_minuto por minuto"""
+
+    def __init__(self, por_minuto: float):
+        self.intervalo = 60 / por_minuto if por_minuto > 0 else 0
+        self._proximo = 0.0
+
+    async def aguardar(self):
+        if not self.intervalo:
+            return
+        agora = time.monotonic()
+        horario = max(agora, self._proximo)
+        self._proximo = horario + self.intervalo
+        if horario > agora:
+            await asyncio.sleep(horario - agora)
+
+
+async def garantir_indices_campanha(db):
+    await db.campanhas.create_index([("id", ASCENDING)], unique=True)
+    await db.campanha_envios.create_index([("campanha_id", ASCENDING), ("email_norm", ASCENDING)], unique=True)
+    await db.campanha_envios.create_index([("campanha_id", ASCENDING), ("status", ASCENDING)])
+
+
+async def criar_campanha(db, execucao_id: str, assunto: str, corpo: str) -> dict:
+    """Cria a campanha com um envio por email distinto (sem suprimidos) da execução"""
+    validar_template(assunto)
+    validar_template(corpo)
+
+    processos = await db.processos_indeferimento.find(
+        {"execucao_id": execucao_id, "email": {"$ne": None}, "suprimido_motivo": {"$exists": False}},
+        {"_id": 0, "numero_processo": 1, "marca": 1, "titular": 1, "email": 1}
+    ).to_list(None)
+
+    suprimidos = await carregar_suprimidos(db, [normalizar_email(p['email']) for p in processos], [])
+    campanha_id = str(uuid.uuid4())
+    agora = datetime.now(timezone.utc).isoformat()
+
+    envios = {}
+    for processo in processos:
+        email_norm = normalizar_email(processo['email'])
+        if email_norm in suprimidos['emails'] or email_norm in envios:
+            continue
+        envios[email_norm] = {
+            "id": str(uuid.uuid4()),
+            "campanha_id": campanha_id,
+            "execucao_id": execucao_id,
+            "numero_processo": processo['numero_processo'],
+            "marca": processo.get('marca'),
+            "titular": processo.get('titular'),
+            "email": processo['email'],
+            "email_norm": email_norm,
+            "dominio": dominio(email_norm),
+            "status": ENVIO_PENDENTE,
+            "tentativas": 0,
+            "erro": None,
+            "reservado_em": None,
+            "enviado_em": None,
+        }
+
+    campanha = {
+        "id": campanha_id,
+        "execucao_id": execucao_id,
+        "assunto": assunto,
+        "corpo": corpo,
+        "status": CAMPANHA_PRONTA,
+        "criada_em": agora,
+        "total_envios": len(envios),
+        "total_suprimidos": len(processos) - len(envios),
+    }
+    await db.campanhas.insert_one(dict(campanha))
+    if envios:
+        await db.campanha_envios.insert_many(list(envios.values()), ordered=False)
+
+    logger.info(f"📣 Campanha {campanha_id}: {len(envios)} envios ({campanha['total_suprimidos']} suprimidos/repetidos)")
+    return campanha
+
+
+async def resumo_campanha(db, campanha_id: str) -> dict:
+    campanha = await db.campanhas.find_one({"id": campanha_id}, {"_id": 0})
+    if not campanha:
+        return None
+    por_status = {}
+    async for grupo in db.campanha_envios.aggregate([
+        {"$match": {"campanha_id": campanha_id}},
+        {"$group": {"_id": "$status", "total": {"$sum": 1}}}
+    ]):
+        por_status[grupo['_id']] = grupo['total']
+    campanha['envios'] = por_status
+    return campanha
+
+
+async def registrar_devolucao(db, campanha_id: str, email: str, motivo: str = None) -> bool:
+    """Bounce recebido depois do envio (ex.: DSN do provedor): marca e suprime o email"""
+    email_norm = normalizar_email(email)
+    resultado = await db.campanha_envios.update_one(
+        {"campanha_id": campanha_id, "email_norm": email_norm},
+        {"$set": {"status": ENVIO_DEVOLVIDO, "erro": motivo or 'bounce'}}
+    )
+    await suprimir_contato(db, email=email_norm, motivo=MOTIVO_DEVOLVIDO, origem=f"campanha:{campanha_id}")
+    return resultado.matched_count > 0
+
+
+class EnviadorCampanha:
+    def __init__(self, db, campanha_id: str, conexoes: int = CONEXOES,
+                 limite_por_minuto: float = LIMITE_POR_MINUTO,
+                 limite_dominio_por_minuto: float = LIMITE_DOMINIO_POR_MINUTO,
+                 criar_conexao=NotificadorEmail):
+        self.db = db
+        self.campanha_id = campanha_id
+        self.conexoes = max(1, conexoes)
+        self.limite_global = LimiteTaxa(limite_por_minuto)
+        self.limite_dominio_por_minuto = limite_dominio_por_minuto
+        self._limites_dominio = {}
+        self._criar_conexao = criar_conexao
+        self.estatisticas = {'enviados': 0, 'falhas': 0, 'devolvidos': 0}
+
+    def _limite_do_dominio(self, nome: str) -> LimiteTaxa:
+        if nome not in self._limites_dominio:
+            self._limites_dominio[nome] = LimiteTaxa(self.limite_dominio_por_minuto)
+        return self._limites_dominio[nome]
+
+    async def _reservar(self):
+        """Reserva atomicamente o próximo envio pendente (ou com reserva expirada)"""
+        agora = datetime.now(timezone.utc)
+        expiracao = (agora - timedelta(seconds=RESERVA_EXPIRA_S)).isoformat()
+        return await self.db.campanha_envios.find_one_and_update(
+            {"campanha_id": self.campanha_id, "$or": [
+                {"status": ENVIO_PENDENTE},
+                {"status": ENVIO_ENVIANDO, "reservado_em": {"$lt": expiracao}},
+            ]},
+            {"$set": {"status": ENVIO_ENVIANDO, "reservado_em": agora.isoformat()}, "$inc": {"tentativas": 1}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _atualizar(self, envio: dict, **campos):
+        await self.db.campanha_envios.update_one({"id": envio['id']}, {"$set": campos})
+
+    async def _worker(self, campanha: dict):
+        conexao = self._criar_conexao()
+        try:
+            while True:
+                envio = await self._reservar()
+                if envio is None:
+                    return
+
+                await self.limite_global.aguardar()
+                await self._limite_do_dominio(envio['dominio']).aguardar()
+
+                msg = montar_mensagem(envio['email'], renderizar(campanha['assunto'], envio), renderizar(campanha['corpo'], envio))
+                msg['List-Unsubscribe'] = f"<mailto:{SMTP_FROM}?subject=descadastrar%20{envio['numero_processo']}>"
+
+                try:
+                    await conexao.enviar(msg)
+                except (aiosmtplib.SMTPException, OSError) as e:
+                    if destinatario_recusado(e):
+                        self.estatisticas['devolvidos'] += 1
+                        await self._atualizar(envio, status=ENVIO_DEVOLVIDO, erro=str(e))
+                        await suprimir_contato(self.db, email=envio['email'], motivo=MOTIVO_DEVOLVIDO, origem=f"campanha:{self.campanha_id}")
+                    elif envio['tentativas'] >= MAX_TENTATIVAS:
+                        self.estatisticas['falhas'] += 1
+                        await self._atualizar(envio, status=ENVIO_FALHA, erro=str(e))
+                    else:
+                        # Erro temporário (inclusive 4xx no RCPT): volta para a fila
+                        await self._atualizar(envio, status=ENVIO_PENDENTE, erro=str(e))
+                else:
+                    self.estatisticas['enviados'] += 1
+                    await self._atualizar(envio, status=ENVIO_ENVIADO, erro=None, enviado_em=datetime.now(timezone.utc).isoformat())
+                    await suprimir_contato(self.db, email=envio['email'], motivo=MOTIVO_CONTATADO, origem=f"campanha:{self.campanha_id}")
+        finally:
+            await conexao.fechar()
+
+    async def executar(self) -> dict:
+        campanha = await self.db.campanhas.find_one({"id": self.campanha_id}, {"_id": 0})
+        if not campanha:
+            raise ValueError(f"Campanha não encontrada: {self.campanha_id}")
+
+        await self.db.campanhas.update_one({"id": self.campanha_id}, {"$set": {"status": CAMPANHA_ENVIANDO}})
+        inicio = time.perf_counter()
+        await asyncio.gather(*(self._worker(campanha) for _ in range(self.conexoes)))
+        duracao = time.perf_counter() - inicio
+
+        resumo = await resumo_campanha(self.db, self.campanha_id)
+        # Sobrou envio pendente ou reservado por outro processo: a campanha pode ser retomada
+        restantes = resumo['envios'].get(ENVIO_PENDENTE, 0) + resumo['envios'].get(ENVIO_ENVIANDO, 0)
+        status = CAMPANHA_PRONTA if restantes else CAMPANHA_CONCLUIDA
+        resumo['status'] = status
+        await self.db.campanhas.update_one(
+            {"id": self.campanha_id},
+            {"$set": {"status": status, "atualizada_em": datetime.now(timezone.utc).isoformat()}}
+        )
+        logger.info(f"📣 Campanha {self.campanha_id} em {duracao:.1f}s: {self.estatisticas} - {resumo['envios']}")
+        return resumo
+
+
+async def _main(args):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        db = client[os.environ['DB_NAME']]
+        await garantir_indices_campanha(db)
+        await EnviadorCampanha(db, args.campanha, args.conexoes).executar()
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Envia (ou retoma) uma campanha de email')
+    parser.add_argument('--campanha', required=True, help='id da campanha')
+    parser.add_argument('--conexoes', type=int, default=CONEXOES, help='conexões SMTP simultâneas')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    asyncio.run(_main(args))
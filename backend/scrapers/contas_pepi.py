@@ -0,0 +1,397 @@
+"""
+Pool de contas do pePI.
+
+Cada consulta ao pePI faz login com uma conta emprestada deste pool (antes era uma
+única conta fixa no código). As contas vêm da configuração, sem padrão: sem
+nenhuma conta o pool não é criado (ValueError na inicialização do scraper/worker;
+a réplica INPI_MODO=api não cria o pool e lê o estado direto da coleção, estado_contas):
+  - PEPI_CONTAS: "usuario:senha[:concorrencia],usuario2:senha2" ou
+    PEPI_CONTAS_ARQUIVO com um JSON [{"usuario", "senha", "concorrencia"}]
+  - PEPI_CONTA_CONCORRENCIA: consultas simultâneas por conta sem valor próprio
+
+O estado das contas é compartilhado por todos os processos (réplicas da API e
+workers da fila_enriquecimento) na coleção contas_pepi, um documento por conta
+({_id: usuario, concorrencia, emprestimos: [{id, instancia, expira_em}],
+pausada_ate, falhas_seguidas, logins_recusados, estatisticas}); as senhas ficam
+só na configuração:
+  - emprestar() escolhe a conta livre menos ocupada/usada e reserva a vaga com
+    find_one_and_update atômico (menos de `concorrencia` empréstimos e
+    pausada_ate vencida, como fila_taxa em aguardar_vez_global). Sem conta livre
+    a thread espera (até PEPI_CONTA_ESPERA_S, depois a consulta falha como
+    'login', que é transitória e volta para a fila com backoff)
+  - cada empréstimo vence em PEPI_CONTA_EMPRESTIMO_S e é renovado em segundo
+    plano enquanto a consulta roda: a vaga de um processo que morreu volta sozinha
+  - falha de login pausa a conta por PEPI_CONTA_PAUSA_S, dobrando a cada falha
+    seguida (até PEPI_CONTA_PAUSA_MAXIMA_S); PEPI_CONTA_FALHAS_PAUSA falhas
+    transitórias seguidas também pausam
+  - com PEPI_REUSAR_SESSAO=1 os cookies do login (storage_state do Playwright)
+    ficam na conta, neste processo, por PEPI_SESSAO_TTL_S e o próximo navegador
+    que pegar a mesma conta vai direto para a pesquisa, sem login. Desligado por
+    padrão: o fluxo atual depende de contexto novo para o link de petições aparecer
+
+As consultas rodam em threads (Playwright síncrono): o pool usa o driver síncrono
+do pymongo. O pool do processo é criado no primeiro uso (obter_pool), depois do
+.env carregado. A capacidade total (soma das concorrências) é o padrão de
+PEPI_WORKERS: mais contas, mais consultas em paralelo. Uso por conta em estado()
+e nas métricas inpi_pepi_conta_*.
+"""
+from datetime import datetime, timedelta, timezone
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+
+from prometheus_client import Counter
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+
+from .resiliencia import eh_transitoria, FALHA_LOGIN
+
+logger = logging.getLogger(__name__)
+
+CONTA_CONCORRENCIA = int(os.environ.get('PEPI_CONTA_CONCORRENCIA', '1'))
+CONTA_ESPERA_S = float(os.environ.get('PEPI_CONTA_ESPERA_S', '600'))
+CONTA_PAUSA_S = float(os.environ.get('PEPI_CONTA_PAUSA_S', '300'))
+CONTA_PAUSA_MAXIMA_S = float(os.environ.get('PEPI_CONTA_PAUSA_MAXIMA_S', '3600'))
+CONTA_FALHAS_PAUSA = int(os.environ.get('PEPI_CONTA_FALHAS_PAUSA', '3'))
+# Validade de um empréstimo sem renovação (renovado a cada terço enquanto a consulta roda)
+CONTA_EMPRESTIMO_S = float(os.environ.get('PEPI_CONTA_EMPRESTIMO_S', '300'))
+# Intervalo entre tentativas de quem espera conta (vagas liberadas em outros processos)
+CONTA_ESPERA_INTERVALO_S = float(os.environ.get('PEPI_CONTA_ESPERA_INTERVALO_S', '2'))
+REUSAR_SESSAO = os.environ.get('PEPI_REUSAR_SESSAO', '0') == '1'
+SESSAO_TTL_S = float(os.environ.get('PEPI_SESSAO_TTL_S', '900'))
+
+RESULTADO_SUCESSO = 'sucesso'
+ESTATISTICAS = ('consultas', 'falhas', 'logins', 'sessoes_reaproveitadas', 'pausas')
+# pausada_ate inicial: conta nunca pausada
+NUNCA = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+CONSULTAS_CONTA = Counter(
+    'inpi_pepi_conta_consultas_total',
+    'Consultas ao pePI por conta e resultado (sucesso ou tipo de falha)',
+    ['conta', 'resultado']
+)
+LOGINS_CONTA = Counter(
+    'inpi_pepi_conta_logins_total',
+    'Logins no pePI por conta (novo ou sessão reaproveitada)',
+    ['conta', 'sessao']
+)
+
+
+def _agora():
+    return datetime.now(timezone.utc)
+
+
+def _utc(momento: datetime) -> datetime:
+    # pymongo devolve datetimes sem fuso (sempre UTC)
+    return momento.replace(tzinfo=timezone.utc) if momento.tzinfo is None else momento
+
+
+class Conta:
+    """Credenciais e sessão local de uma conta (o estado compartilhado fica em contas_pepi)"""
+
+    def __init__(self, usuario: str, senha: str, concorrencia: int = CONTA_CONCORRENCIA):
+        self.usuario = usuario
+        self.senha = senha
+        self.concorrencia = max(1, concorrencia)
+        self._sessao = None
+        self._sessao_expira = 0.0
+
+    def __repr__(self):
+        return f"Conta({self.usuario!r})"
+
+    def sessao_valida(self):
+        """storage_state do último login, se ainda dentro do TTL"""
+        if self._sessao is not None and time.monotonic() < self._sessao_expira:
+            return self._sessao
+        return None
+
+    def guardar_sessao(self, estado: dict, ttl_s: float = SESSAO_TTL_S):
+        self._sessao = estado
+        self._sessao_expira = time.monotonic() + ttl_s
+
+    def descartar_sessao(self):
+        self._sessao = None
+
+
+def carregar_contas() -> list:
+    """Contas de PEPI_CONTAS_ARQUIVO (JSON) ou PEPI_CONTAS ("usuario:senha[:concorrencia],...")"""
+    arquivo = os.environ.get('PEPI_CONTAS_ARQUIVO')
+    if arquivo:
+        with open(arquivo) as f:
+            return [
+                Conta(item['usuario'], item['senha'], int(item.get('concorrencia', CONTA_CONCORRENCIA)))
+                for item in json.load(f)
+            ]
+    contas = []
+    for entrada in os.environ.get('PEPI_CONTAS', '').split(','):
+        if not entrada.strip():
+            continue
+        partes = entrada.strip().split(':')
+        if len(partes) not in (2, 3):
+            raise ValueError(f"Conta do pePI inválida em PEPI_CONTAS: '{partes[0]}' (use usuario:senha[:concorrencia])")
+        concorrencia = int(partes[2]) if len(partes) == 3 else CONTA_CONCORRENCIA
+        contas.append(Conta(partes[0], partes[1], concorrencia))
+    return contas
+
+
+def colecao_contas():
+    """contas_pepi pelo driver síncrono (as consultas ao pePI rodam em threads)"""
+    from pymongo import MongoClient
+    return MongoClient(os.environ['MONGO_URL'])[os.environ['DB_NAME']].contas_pepi
+
+
+class SemContaDisponivel(Exception):
+    pass
+
+
+class PoolContas:
+    """Empréstimo de contas entre threads e processos (estado em contas_pepi)"""
+
+    def __init__(self, contas: list, colecao=None, pausa_s: float = CONTA_PAUSA_S,
+                 pausa_maxima_s: float = CONTA_PAUSA_MAXIMA_S, falhas_pausa: int = CONTA_FALHAS_PAUSA,
+                 emprestimo_s: float = CONTA_EMPRESTIMO_S, intervalo_s: float = CONTA_ESPERA_INTERVALO_S):
+        if not contas:
+            raise ValueError(
+                "Nenhuma conta do pePI configurada: defina PEPI_CONTAS (usuario:senha[:concorrencia],...) "
+                "ou PEPI_CONTAS_ARQUIVO"
+            )
+        self.contas = contas
+        self.pausa_s = pausa_s
+        self.pausa_maxima_s = pausa_maxima_s
+        self.falhas_pausa = falhas_pausa
+        self.emprestimo_s = emprestimo_s
+        self.intervalo_s = intervalo_s
+        self.instancia = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._colecao = colecao
+        self._condicao = threading.Condition()
+        # Empréstimos deste processo por conta (ids em contas_pepi), renovados em segundo plano
+        self._emprestimos = {}
+        self._registradas = False
+        self._renovador = None
+
+    @property
+    def capacidade(self) -> int:
+        return sum(conta.concorrencia for conta in self.contas)
+
+    @property
+    def colecao(self):
+        if self._colecao is None:
+            self._colecao = colecao_contas()
+        return self._colecao
+
+    def _registrar(self):
+        """Documento de cada conta configurada (uma vez por processo)"""
+        if self._registradas:
+            return
+        for conta in self.contas:
+            self.colecao.update_one(
+                {"_id": conta.usuario},
+                {"$set": {"concorrencia": conta.concorrencia},
+                 "$setOnInsert": {
+                     "emprestimos": [],
+                     "pausada_ate": NUNCA,
+                     "falhas_seguidas": 0,
+                     "logins_recusados": 0,
+                     "estatisticas": {chave: 0 for chave in ESTATISTICAS}
+                 }},
+                upsert=True
+            )
+        self._registradas = True
+
+    def _documentos(self, contas: list) -> dict:
+        agora = _agora()
+        usuarios = [conta.usuario for conta in contas]
+        # Empréstimos vencidos são de processos que morreram sem devolver
+        self.colecao.update_many(
+            {"_id": {"$in": usuarios}, "emprestimos.expira_em": {"$lt": agora}},
+            {"$pull": {"emprestimos": {"expira_em": {"$lt": agora}}}}
+        )
+        return {documento['_id']: documento for documento in self.colecao.find({"_id": {"$in": usuarios}})}
+
+    def _tentar_emprestar(self, candidatas: list):
+        self._registrar()
+        documentos = self._documentos(candidatas)
+        agora = _agora()
+
+        def ocupacao(conta):
+            documento = documentos.get(conta.usuario, {})
+            return (len(documento.get('emprestimos', [])) / conta.concorrencia,
+                    documento.get('estatisticas', {}).get('consultas', 0))
+
+        for conta in sorted(candidatas, key=ocupacao):
+            documento = documentos.get(conta.usuario, {})
+            if len(documento.get('emprestimos', [])) >= conta.concorrencia or \
+                    _utc(documento.get('pausada_ate', NUNCA)) > agora:
+                continue
+            emprestimo = uuid.uuid4().hex
+            # Reserva atômica: a posição `concorrencia - 1` vazia = menos de `concorrencia` empréstimos
+            reservada = self.colecao.find_one_and_update(
+                {"_id": conta.usuario,
+                 f"emprestimos.{conta.concorrencia - 1}": {"$exists": False},
+                 "pausada_ate": {"$lte": agora}},
+                {"$push": {"emprestimos": {
+                    "id": emprestimo,
+                    "instancia": self.instancia,
+                    "expira_em": agora + timedelta(seconds=self.emprestimo_s)
+                }}},
+                projection={"_id": 1}
+            )
+            if reservada is not None:
+                with self._condicao:
+                    self._emprestimos.setdefault(conta.usuario, []).append(emprestimo)
+                self._iniciar_renovador()
+                return conta
+        return None
+
+    def emprestar(self, espera_s: float = CONTA_ESPERA_S, usuario: str = None) -> Conta:
+        """Conta livre menos ocupada; bloqueia até haver uma (SemContaDisponivel após espera_s)
+
+        Com `usuario` só essa conta serve (ex.: descadastro, feito pela conta que se
+        habilitou no processo).
+        """
+        candidatas = [conta for conta in self.contas if usuario is None or conta.usuario == usuario]
+        if not candidatas:
+            raise SemContaDisponivel(f"Conta do pePI '{usuario}' não está configurada")
+        prazo = time.monotonic() + espera_s
+        while True:
+            try:
+                conta = self._tentar_emprestar(candidatas)
+                if conta is not None:
+                    return conta
+            except PyMongoError as e:
+                logger.warning(f"Falha ao reservar conta do pePI: {str(e)}")
+            agora = time.monotonic()
+            if agora >= prazo:
+                raise SemContaDisponivel(f"Nenhuma conta do pePI livre em {espera_s:.0f}s")
+            # Acorda numa devolução deste processo ou para ver as vagas dos demais
+            with self._condicao:
+                self._condicao.wait(min(self.intervalo_s, prazo - agora))
+
+    def _pausar(self, conta: Conta, logins_recusados: int, motivo: str):
+        # Falhas de login seguidas dobram a pausa
+        duracao = min(self.pausa_maxima_s, self.pausa_s * (2 ** max(0, logins_recusados - 1)))
+        self.colecao.update_one(
+            {"_id": conta.usuario},
+            {"$max": {"pausada_ate": _agora() + timedelta(seconds=duracao)},
+             "$inc": {"estatisticas.pausas": 1}}
+        )
+        logger.warning(f"⏸️  Conta {conta.usuario} pausada por {duracao:.0f}s ({motivo})")
+
+    def devolver(self, conta: Conta, falha: str = None):
+        with self._condicao:
+            emprestimos = self._emprestimos.get(conta.usuario)
+            emprestimo = emprestimos.pop() if emprestimos else None
+        CONSULTAS_CONTA.labels(conta.usuario, falha or RESULTADO_SUCESSO).inc()
+        incrementos = {"estatisticas.consultas": 1}
+        atualizacao = {"$pull": {"emprestimos": {"id": emprestimo}}, "$inc": incrementos}
+        if falha == FALHA_LOGIN:
+            incrementos.update({"estatisticas.falhas": 1, "logins_recusados": 1})
+            conta.descartar_sessao()
+        elif falha and eh_transitoria(falha):
+            incrementos.update({"estatisticas.falhas": 1, "falhas_seguidas": 1})
+        else:
+            # Sucesso ou falha do processo (não encontrado): a conta está saudável
+            atualizacao["$set"] = {"falhas_seguidas": 0, "logins_recusados": 0}
+        try:
+            documento = self.colecao.find_one_and_update(
+                {"_id": conta.usuario}, atualizacao, return_document=ReturnDocument.AFTER
+            )
+            if falha == FALHA_LOGIN:
+                self._pausar(conta, documento['logins_recusados'], "login recusado")
+            elif falha and eh_transitoria(falha) and documento['falhas_seguidas'] >= self.falhas_pausa:
+                # Só quem zera o contador pausa (devoluções simultâneas em outros processos)
+                zerado = self.colecao.update_one(
+                    {"_id": conta.usuario, "falhas_seguidas": {"$gte": self.falhas_pausa}},
+                    {"$set": {"falhas_seguidas": 0}}
+                )
+                if zerado.modified_count:
+                    self._pausar(conta, documento['logins_recusados'], f"{self.falhas_pausa} falhas seguidas")
+        except PyMongoError as e:
+            # O empréstimo vence sozinho em emprestimo_s
+            logger.warning(f"Falha ao devolver a conta {conta.usuario}: {str(e)}")
+        with self._condicao:
+            self._condicao.notify_all()
+
+    def renovar(self) -> int:
+        """Estende os empréstimos deste processo; retorna quantos foram renovados"""
+        with self._condicao:
+            emprestimos = [(usuario, emprestimo) for usuario, ids in self._emprestimos.items() for emprestimo in ids]
+        expira_em = _agora() + timedelta(seconds=self.emprestimo_s)
+        renovados = 0
+        for usuario, emprestimo in emprestimos:
+            resultado = self.colecao.update_one(
+                {"_id": usuario, "emprestimos.id": emprestimo},
+                {"$set": {"emprestimos.$.expira_em": expira_em}}
+            )
+            renovados += resultado.modified_count
+        return renovados
+
+    def _iniciar_renovador(self):
+        with self._condicao:
+            if self._renovador is not None:
+                return
+            self._renovador = threading.Thread(target=self._renovar_sempre, name='renovador-contas-pepi', daemon=True)
+        self._renovador.start()
+
+    def _renovar_sempre(self):
+        while True:
+            time.sleep(self.emprestimo_s / 3)
+            try:
+                self.renovar()
+            except PyMongoError as e:
+                logger.warning(f"Falha ao renovar empréstimos de contas do pePI: {str(e)}")
+
+    def registrar_login(self, conta: Conta, reaproveitada: bool):
+        chave = 'sessoes_reaproveitadas' if reaproveitada else 'logins'
+        try:
+            self.colecao.update_one({"_id": conta.usuario}, {"$inc": {f"estatisticas.{chave}": 1}})
+        except PyMongoError as e:
+            logger.warning(f"Falha ao registrar login da conta {conta.usuario}: {str(e)}")
+        LOGINS_CONTA.labels(conta.usuario, 'reaproveitada' if reaproveitada else 'nova').inc()
+
+    def estado(self) -> list:
+        """Uso, pausas e estatísticas de todas as instâncias (sem as senhas)"""
+        self._registrar()
+        documentos = self._documentos(self.contas)
+        agora = _agora()
+        return [
+            {**_estado_conta({"_id": conta.usuario, **documentos.get(conta.usuario, {}),
+                              "concorrencia": conta.concorrencia}, agora),
+             "sessao_ativa": conta.sessao_valida() is not None}
+            for conta in self.contas
+        ]
+
+
+def _estado_conta(documento: dict, agora: datetime) -> dict:
+    pausada_ate = _utc(documento.get('pausada_ate', NUNCA))
+    return {
+        "usuario": documento['_id'],
+        "concorrencia": documento.get('concorrencia', CONTA_CONCORRENCIA),
+        "em_uso": len([e for e in documento.get('emprestimos', []) if _utc(e['expira_em']) >= agora]),
+        "pausada_por_s": round(max(0.0, (pausada_ate - agora).total_seconds())),
+        **{chave: documento.get('estatisticas', {}).get(chave, 0) for chave in ESTATISTICAS}
+    }
+
+
+async def estado_contas(db) -> list:
+    """estado() só pela coleção (Motor), sem o pool: réplicas que não consultam o pePI não têm as contas"""
+    agora = _agora()
+    return [_estado_conta(documento, agora) async for documento in db.contas_pepi.find({}).sort("_id", 1)]
+
+
+# Um pool por processo, criado no primeiro uso: pausas e estatísticas valem para
+# todas as execuções (e, via contas_pepi, para todos os processos)
+_pool = None
+_lock_pool = threading.Lock()
+
+
+def obter_pool() -> PoolContas:
+    global _pool
+    with _lock_pool:
+        if _pool is None:
+            _pool = PoolContas(carregar_contas())
+        return _pool
@@ -0,0 +1,265 @@
+"""
+Descadastro de terceiro interessado como etapa separada, em lote.
+
+Baixar a petição de um processo no pePI habilita a conta como terceiro
+interessado. Antes o descadastro rodava no fim de cada consulta, com o navegador
+do worker ocupado (popup da listagem, espera e clique em DesativarAmploAcesso), e
+a falha só deixava um HTML em /tmp. Agora a consulta apenas devolve a conta
+habilitada e o enriquecimento registra o pendente em descadastros:
+{_id: '<conta>:<numero_processo>', numero_processo, conta, execucao_id, status,
+tentativas, proxima_tentativa_em, ultimo_erro}.
+
+descadastrar_pendentes() processa os pendentes vencidos fora do caminho do
+enriquecimento:
+  - agrupados por conta (o descadastro tem de ser feito pela conta habilitada),
+    até DESCADASTRO_LOTE processos por sessão: um navegador e um login por lote;
+    contas diferentes rodam em paralelo
+  - cada lote é reservado antes da sessão (update_many nos _ids escolhidos que
+    ainda estão pendentes: status em_andamento, reserva e reservado_ate), então
+    duas execuções simultâneas (scheduler, fim do scraping, linha de comando)
+    nunca descadastram o mesmo processo; o resultado só é gravado com a reserva.
+    Reserva vencida em DESCADASTRO_RESERVA_S (processo morreu) conta a
+    tentativa como qualquer falha (pendente com backoff, ou falha no limite), e
+    registrar_pendente não reabre entrada em andamento
+  - cada processo tem seu resultado gravado: concluido, ou nova tentativa com
+    backoff até DESCADASTRO_MAX_TENTATIVAS e então status falha (visível em
+    estado_descadastros() e GET /api/inpi/descadastros)
+  - roda ao fim de cada scraping, a cada DESCADASTRO_INTERVALO_MINUTOS no
+    scheduler e por linha de comando: python -m scrapers.descadastro
+"""
+from datetime import datetime, timedelta, timezone
+from itertools import groupby
+import argparse
+import asyncio
+import logging
+import os
+import uuid
+
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+
+from .resiliencia import calcular_backoff
+
+logger = logging.getLogger(__name__)
+
+DESCADASTRO_LOTE = int(os.environ.get('DESCADASTRO_LOTE', '25'))
+DESCADASTRO_MAX_TENTATIVAS = int(os.environ.get('DESCADASTRO_MAX_TENTATIVAS', '5'))
+DESCADASTRO_INTERVALO_MINUTOS = int(os.environ.get('DESCADASTRO_INTERVALO_MINUTOS', '30'))
+# Validade da reserva de um lote (uma sessão do pePI)
+DESCADASTRO_RESERVA_S = float(os.environ.get('DESCADASTRO_RESERVA_S', '3600'))
+
+STATUS_PENDENTE = 'pendente'
+STATUS_EM_ANDAMENTO = 'em_andamento'
+STATUS_CONCLUIDO = 'concluido'
+STATUS_FALHA = 'falha'
+
+# Motivos de falha além dos tipos de scrapers.resiliencia
+DESCADASTRO_SEM_LINK = 'sem_link'
+DESCADASTRO_SEM_DESATIVACAO = 'sem_desativacao'
+DESCADASTRO_RESERVA_VENCIDA = 'reserva_vencida'
+
+
+def _agora():
+    return datetime.now(timezone.utc)
+
+
+async def garantir_indices_descadastro(db):
+    await db.descadastros.create_index([("status", ASCENDING), ("proxima_tentativa_em", ASCENDING)])
+
+
+async def registrar_pendente(db, numero_processo: str, conta: str, execucao_id: str):
+    """Registra (ou reabre) o descadastro do processo pela conta habilitada
+
+    Entrada reservada por um lote (em_andamento) não é reaberta: o lote já vai
+    descadastrar o processo, e reabrir deixaria outra execução reservá-la de novo.
+    """
+    agora = _agora()
+    try:
+        await db.descadastros.update_one(
+            {"_id": f"{conta}:{numero_processo}", "status": {"$ne": STATUS_EM_ANDAMENTO}},
+            {"$set": {
+                "numero_processo": numero_processo,
+                "conta": conta,
+                "execucao_id": execucao_id,
+                "status": STATUS_PENDENTE,
+                "tentativas": 0,
+                "proxima_tentativa_em": agora,
+                "ultimo_erro": None
+            },
+             "$setOnInsert": {"criado_em": agora}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # O filtro não casou e o upsert tentou inserir o mesmo _id: está em andamento
+        logger.debug(f"Descadastro de {numero_processo} ({conta}) já em andamento")
+
+
+async def _reservar(db, pendentes: list, reserva: str) -> list:
+    """Reserva os que ainda estão pendentes (update_many atômico por documento); devolve os reservados"""
+    agora = _agora()
+    await db.descadastros.update_many(
+        {"_id": {"$in": [p['_id'] for p in pendentes]}, "status": STATUS_PENDENTE,
+         "proxima_tentativa_em": {"$lte": agora}},
+        {"$set": {
+            "status": STATUS_EM_ANDAMENTO,
+            "reserva": reserva,
+            "reservado_ate": agora + timedelta(seconds=DESCADASTRO_RESERVA_S)
+        }}
+    )
+    return await db.descadastros.find(
+        {"reserva": reserva, "status": STATUS_EM_ANDAMENTO}
+    ).sort("proxima_tentativa_em", ASCENDING).to_list(None)
+
+
+def _espera_nova_tentativa(tentativas: int) -> timedelta:
+    return timedelta(seconds=calcular_backoff(tentativas, base=60, maximo=6 * 3600))
+
+
+async def _liberar_vencidas(db) -> int:
+    """Reservas vencidas contam a tentativa, com a mesma regra de _gravar_resultado
+
+    Na DESCADASTRO_MAX_TENTATIVAS a entrada vai para falha (um lote que sempre
+    derruba o processo não é repetido para sempre); as demais voltam para
+    pendente com o backoff da tentativa.
+    """
+    agora = _agora()
+    vencidas = {"status": STATUS_EM_ANDAMENTO, "reservado_ate": {"$lt": agora}}
+    liberar = {"$unset": {"reserva": "", "reservado_ate": ""}, "$inc": {"tentativas": 1}}
+    falhas = await db.descadastros.update_many(
+        {**vencidas, "tentativas": {"$gte": DESCADASTRO_MAX_TENTATIVAS - 1}},
+        {**liberar, "$set": {"status": STATUS_FALHA, "ultimo_erro": DESCADASTRO_RESERVA_VENCIDA}}
+    )
+    if falhas.modified_count:
+        logger.error(
+            f"❌ {falhas.modified_count} descadastros com reserva vencida na {DESCADASTRO_MAX_TENTATIVAS}ª tentativa: falha"
+        )
+    # Uma atualização por número de tentativas: o backoff depende dele
+    devolvidas = 0
+    for tentativas in range(DESCADASTRO_MAX_TENTATIVAS - 1):
+        resultado = await db.descadastros.update_many(
+            {**vencidas, "tentativas": tentativas},
+            {**liberar, "$set": {
+                "status": STATUS_PENDENTE,
+                "ultimo_erro": DESCADASTRO_RESERVA_VENCIDA,
+                "proxima_tentativa_em": agora + _espera_nova_tentativa(tentativas + 1)
+            }}
+        )
+        devolvidas += resultado.modified_count
+    if devolvidas:
+        logger.warning(f"{devolvidas} descadastros com reserva vencida voltaram para pendente")
+    return falhas.modified_count + devolvidas
+
+
+async def _gravar_resultado(db, pendente: dict, motivo: str = None):
+    # Só com a reserva: se ela venceu e outro processo reservou, o resultado é dele
+    reservado = {"_id": pendente['_id'], "reserva": pendente['reserva']}
+    if motivo is None:
+        await db.descadastros.update_one(
+            reservado,
+            {"$set": {"status": STATUS_CONCLUIDO, "descadastrado_em": _agora(), "ultimo_erro": None},
+             "$unset": {"reserva": "", "reservado_ate": ""},
+             "$inc": {"tentativas": 1}}
+        )
+        return STATUS_CONCLUIDO
+    tentativas = pendente.get('tentativas', 0) + 1
+    if tentativas >= DESCADASTRO_MAX_TENTATIVAS:
+        status = STATUS_FALHA
+        logger.error(f"❌ Descadastro de {pendente['numero_processo']} ({pendente['conta']}) falhou {tentativas} vezes: {motivo}")
+    else:
+        status = STATUS_PENDENTE
+    await db.descadastros.update_one(
+        reservado,
+        {"$set": {
+            "status": status,
+            "tentativas": tentativas,
+            "ultimo_erro": motivo,
+            "proxima_tentativa_em": _agora() + _espera_nova_tentativa(tentativas)
+        },
+         "$unset": {"reserva": "", "reservado_ate": ""}}
+    )
+    return status
+
+
+async def _descadastrar_conta(db, conta: str, pendentes: list, lote: int, pepi_scraper) -> dict:
+    loop = asyncio.get_running_loop()
+    totais = {STATUS_CONCLUIDO: 0, STATUS_PENDENTE: 0, STATUS_FALHA: 0}
+    for inicio in range(0, len(pendentes), lote):
+        parte = await _reservar(db, pendentes[inicio:inicio + lote], uuid.uuid4().hex)
+        if not parte:
+            # Todos reservados por outra execução
+            continue
+        logger.info(f"📋 Descadastrando {len(parte)} processos com a conta {conta}")
+        resultados = await loop.run_in_executor(
+            None, pepi_scraper.descadastrar_lote, conta, [p['numero_processo'] for p in parte]
+        )
+        for pendente in parte:
+            status = await _gravar_resultado(db, pendente, resultados.get(pendente['numero_processo']))
+            totais[status] += 1
+    return totais
+
+
+async def descadastrar_pendentes(db, lote: int = DESCADASTRO_LOTE, pepi_scraper=None) -> dict:
+    """Processa os descadastros vencidos; retorna quantos concluíram, voltaram a pendente ou falharam"""
+    await _liberar_vencidas(db)
+    pendentes = await db.descadastros.find(
+        {"status": STATUS_PENDENTE, "proxima_tentativa_em": {"$lte": _agora()}}
+    ).sort([("conta", ASCENDING), ("proxima_tentativa_em", ASCENDING)]).to_list(None)
+    totais = {STATUS_CONCLUIDO: 0, STATUS_PENDENTE: 0, STATUS_FALHA: 0}
+    if not pendentes:
+        return totais
+
+    if pepi_scraper is None:
+        from .pepi_scraper import PepiScraper
+        pepi_scraper = PepiScraper()
+    por_conta = [
+        _descadastrar_conta(db, conta, list(grupo), lote, pepi_scraper)
+        for conta, grupo in groupby(pendentes, key=lambda p: p['conta'])
+    ]
+    for parcial in await asyncio.gather(*por_conta):
+        for status, total in parcial.items():
+            totais[status] += total
+    logger.info(
+        f"📋 Descadastros: {totais[STATUS_CONCLUIDO]} concluídos, {totais[STATUS_PENDENTE]} para nova tentativa, "
+        f"{totais[STATUS_FALHA]} com falha definitiva"
+    )
+    return totais
+
+
+async def estado_descadastros(db) -> dict:
+    por_status = await db.descadastros.aggregate([
+        {"$group": {"_id": "$status", "total": {"$sum": 1}}}
+    ]).to_list(None)
+    falhas = await db.descadastros.find(
+        {"status": STATUS_FALHA}, {"_id": 0, "numero_processo": 1, "conta": 1, "ultimo_erro": 1, "tentativas": 1}
+    ).limit(100).to_list(None)
+    return {"por_status": {item['_id']: item['total'] for item in por_status}, "falhas": falhas}
+
+
+async def _main(args):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        db = client[os.environ['DB_NAME']]
+        if args.reabrir_falhas:
+            resultado = await db.descadastros.update_many(
+                {"status": STATUS_FALHA},
+                {"$set": {"status": STATUS_PENDENTE, "tentativas": 0, "proxima_tentativa_em": _agora()}}
+            )
+            logger.info(f"{resultado.modified_count} descadastros com falha reabertos")
+        await descadastrar_pendentes(db, args.lote)
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Processa os descadastros de terceiro interessado pendentes')
+    parser.add_argument('--lote', type=int, default=DESCADASTRO_LOTE, help='processos por sessão do pePI')
+    parser.add_argument('--reabrir-falhas', action='store_true', help='volta as falhas definitivas para pendente')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    asyncio.run(_main(args))
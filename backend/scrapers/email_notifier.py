@@ -1,39 +1,219 @@
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from email.message import EmailMessage
+from email.utils import formataddr
+import asyncio
 import logging
+import os
+import weakref
+
+import aiosmtplib
 
 logger = logging.getLogger(__name__)
 
 # Configurações SMTP
-SMTP_HOST = 'smtp.gmail.com'
-SMTP_PORT = 587
-SMTP_USER = 'camilla@inhandscomvc.com.br'
-SMTP_PASS = 'gmmw hevq znlc fxww'
-SMTP_FROM = 'camilla@inhandscomvc.com.br'
+SMTP_HOST = os.environ.get('SMTP_HOST', 'smtp.gmail.com')
+SMTP_PORT = int(os.environ.get('SMTP_PORT', '587'))
+SMTP_USER = os.environ.get('SMTP_USER', 'camilla@inhandscomvc.com.br')
+SMTP_PASS = os.environ.get('SMTP_PASS', 'gmmw hevq znlc fxww')
+SMTP_FROM = os.environ.get('SMTP_FROM', 'camilla@inhandscomvc.com.br')
 SMTP_FROM_NAME = 'InHands'
-DEST_EMAIL = 'thais@inhands.com.br'
+DEST_EMAIL = os.environ.get('NOTIFICACAO_DESTINO', 'thais@inhands.com.br')
+# STARTTLS na porta de submissão (587); desligar para servidores locais sem TLS
+SMTP_STARTTLS = os.environ.get('SMTP_STARTTLS', '1') == '1'
+# Conexão ociosa é encerrada depois desse tempo (o Gmail derruba conexões paradas)
+SMTP_OCIOSO_S = float(os.environ.get('SMTP_OCIOSO_S', '30'))
+SMTP_TENTATIVAS = int(os.environ.get('SMTP_TENTATIVAS', '3'))
+# Permite desligar as notificações (ex.: benchmark offline)
+NOTIFICACOES_ATIVAS = os.environ.get('NOTIFICACOES_EMAIL_ATIVAS', '1') == '1'
 
-def enviar_email_notificacao(assunto: str, corpo: str) -> bool:
-    """Envia email de notificação"""
-    try:
-        # Criar mensagem
-        msg = MIMEMultipart()
-        msg['From'] = f"{SMTP_FROM_NAME} <{SMTP_FROM}>"
-        msg['To'] = DEST_EMAIL
-        msg['Subject'] = assunto
-        
-        msg.attach(MIMEText(corpo, 'plain', 'utf-8'))
-        
-        # Conectar e enviar
-        with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SMTP_USER, SMTP_PASS)
-            server.send_message(msg)
-        
-        logger.info(f"Email enviado com sucesso para {DEST_EMAIL}")
+
+
+def destinatario_recusado(erro: Exception) -> bool:
+    """Recusa definitiva do destinatário (5xx no RCPT): não adianta repetir
+
+    4xx no RCPT (caixa cheia, greylisting) é temporário e segue como as demais falhas.
+    """
+    if isinstance(erro, aiosmtplib.SMTPRecipientsRefused):
+        return bool(erro.recipients) and all(destinatario_recusado(r) for r in erro.recipients)
+    return isinstance(erro, aiosmtplib.SMTPRecipientRefused) and erro.code >= 500
+
+
+def montar_mensagem(destinatario: str, assunto: str, corpo: str, remetente: str = SMTP_FROM) -> EmailMessage:
+    msg = EmailMessage()
+    msg['From'] = formataddr((SMTP_FROM_NAME, remetente))
+    msg['To'] = destinatario
+    msg['Subject'] = assunto
+    msg.set_content(corpo, charset='utf-8')
+    return msg
+
+
+class NotificadorEmail:
+    """Caixa de saída assíncrona com uma única conexão SMTP autenticada reaproveitada
+
+    enfileirar() só coloca a mensagem na fila (não bloqueia o scraping); uma tarefa
+    consome a fila usando a mesma conexão enquanto houver mensagens e a encerra
+    depois de SMTP_OCIOSO_S sem envios. Linhas de resumo (adicionar_ao_resumo) são
+    agrupadas em um único email por assunto, enviado em enviar_resumos()/esvaziar().
+    """
+
+    def __init__(self, host: str = SMTP_HOST, port: int = SMTP_PORT, usuario: str = SMTP_USER,
+                 senha: str = SMTP_PASS, starttls: bool = SMTP_STARTTLS, ocioso_s: float = SMTP_OCIOSO_S):
+        self.host = host
+        self.port = port
+        self.usuario = usuario
+        self.senha = senha
+        self.starttls = starttls
+        self.ocioso_s = ocioso_s
+        self._fila = asyncio.Queue()
+        self._conexao = None
+        self._tarefa = None
+        self._resumos = {}
+        self.enviados = 0
+        self.falhas = 0
+        self.conexoes_abertas = 0
+
+    def enfileirar(self, destinatario: str, assunto: str, corpo: str):
+        """Agenda o envio sem esperar pelo SMTP"""
+        self._fila.put_nowait(montar_mensagem(destinatario, assunto, corpo))
+        if self._tarefa is None or self._tarefa.done():
+            self._tarefa = asyncio.get_running_loop().create_task(self._consumir())
+
+    def adicionar_ao_resumo(self, assunto: str, linha: str, destinatario: str = DEST_EMAIL):
+        self._resumos.setdefault((destinatario, assunto), []).append(linha)
+
+    def enviar_resumos(self):
+        """Enfileira um email por resumo acumulado"""
+        resumos, self._resumos = self._resumos, {}
+        for (destinatario, assunto), linhas in resumos.items():
+            self.enfileirar(destinatario, f"{assunto} ({len(linhas)})", '\n'.join(linhas))
+
+    async def esvaziar(self, timeout: float = 120):
+        """Envia resumos pendentes e espera a caixa de saída esvaziar"""
+        self.enviar_resumos()
+        try:
+            await asyncio.wait_for(self._fila.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Caixa de saída não esvaziou em {timeout:.0f}s ({self._fila.qsize()} emails pendentes)")
+
+    async def fechar(self):
+        await self.esvaziar()
+        if self._tarefa:
+            self._tarefa.cancel()
+            await asyncio.gather(self._tarefa, return_exceptions=True)
+        await self._desconectar()
+
+    async def _conectar(self):
+        if self._conexao is not None and self._conexao.is_connected:
+            return self._conexao
+        conexao = aiosmtplib.SMTP(
+            hostname=self.host, port=self.port, start_tls=self.starttls, timeout=30
+        )
+        await conexao.connect()
+        if self.usuario and self.senha:
+            await conexao.login(self.usuario, self.senha)
+        self._conexao = conexao
+        self.conexoes_abertas += 1
+        logger.info(f"Conexão SMTP aberta com {self.host}:{self.port}")
+        return conexao
+
+    async def _desconectar(self):
+        conexao, self._conexao = self._conexao, None
+        if conexao is not None and conexao.is_connected:
+            try:
+                await conexao.quit()
+            except aiosmtplib.SMTPException:
+                conexao.close()
+
+    async def enviar(self, msg: EmailMessage):
+        """Envia direto pela conexão reaproveitada, reconectando se ela caiu
+
+        Destinatário recusado (destinatario_recusado) não é repetido; as demais
+        falhas são tentadas SMTP_TENTATIVAS vezes e a última exceção é levantada.
+        """
+        for tentativa in range(1, SMTP_TENTATIVAS + 1):
+            try:
+                conexao = await self._conectar()
+                await conexao.send_message(msg)
+                return
+            except (aiosmtplib.SMTPException, OSError) as e:
+                if destinatario_recusado(e):
+                    raise
+                # Conexão caiu ou foi recusada: reconecta na próxima tentativa
+                logger.warning(f"Falha SMTP (tentativa {tentativa}/{SMTP_TENTATIVAS}): {str(e)}")
+                await self._desconectar()
+                if tentativa == SMTP_TENTATIVAS:
+                    raise
+                await asyncio.sleep(min(2 ** tentativa, 10))
+
+    async def _enviar(self, msg: EmailMessage) -> bool:
+        try:
+            await self.enviar(msg)
+        except (aiosmtplib.SMTPException, OSError):
+            self.falhas += 1
+            logger.error(f"Erro ao enviar email '{msg['Subject']}' para {msg['To']}")
+            return False
+        self.enviados += 1
+        logger.info(f"Email '{msg['Subject']}' enviado para {msg['To']}")
         return True
-        
-    except Exception as e:
-        logger.error(f"Erro ao enviar email: {str(e)}")
-        return False
\ No newline at end of file
+
+    async def _consumir(self):
+        while True:
+            try:
+                msg = await asyncio.wait_for(self._fila.get(), self.ocioso_s)
+            except asyncio.TimeoutError:
+                await self._desconectar()
+                msg = await self._fila.get()
+            try:
+                await self._enviar(msg)
+            finally:
+                self._fila.task_done()
+
+
+# Um notificador por event loop: o scheduler roda execuções em loops próprios
+_notificadores = weakref.WeakKeyDictionary()
+
+
+def obter_notificador() -> NotificadorEmail:
+    loop = asyncio.get_running_loop()
+    if loop not in _notificadores:
+        _notificadores[loop] = NotificadorEmail()
+    return _notificadores[loop]
+
+
+async def enviar_emails_pendentes(timeout: float = 120):
+    """Espera a caixa de saída do loop atual (chamar antes de o loop terminar)"""
+    loop = asyncio.get_running_loop()
+    if loop in _notificadores:
+        await _notificadores[loop].esvaziar(timeout)
+
+
+def enviar_email_notificacao(assunto: str, corpo: str, destinatario: str = DEST_EMAIL) -> bool:
+    """Envia email de notificação
+
+    Dentro de um event loop apenas enfileira (retorna na hora); fora de um loop
+    envia e espera o resultado.
+    """
+    if not NOTIFICACOES_ATIVAS:
+        logger.info(f"Notificações desativadas - email '{assunto}' não enviado")
+        return False
+
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(_enviar_agora(destinatario, assunto, corpo))
+
+    obter_notificador().enfileirar(destinatario, assunto, corpo)
+    return True
+
+
+def adicionar_ao_resumo(assunto: str, linha: str, destinatario: str = DEST_EMAIL):
+    """Acumula uma linha no email de resumo (enviado em enviar_emails_pendentes)"""
+    if NOTIFICACOES_ATIVAS:
+        obter_notificador().adicionar_ao_resumo(assunto, linha, destinatario)
+
+
+async def _enviar_agora(destinatario: str, assunto: str, corpo: str) -> bool:
+    notificador = NotificadorEmail()
+    try:
+        return await notificador._enviar(montar_mensagem(destinatario, assunto, corpo))
+    finally:
+        await notificador._desconectar()
@@ -0,0 +1,81 @@
+"""
+Validação na escrita dos processos gravados pelo scraping.
+
+Os processos do XML são conferidos antes do insert e recebem 'versao_esquema'. Na
+leitura (rota de detalhes da execução), documentos com a versão atual são
+serializados direto, sem construir um modelo Pydantic por linha; documentos sem a
+marca (gravados antes desta validação) continuam passando pelo modelo.
+
+As atualizações do enriquecimento só gravam strings (marca, email e derivados),
+então não mudam a conformidade do documento.
+
+data_extracao é gravada com isoformat() (sufixo +00:00) e o modelo a serializa com
+'Z': o caminho direto passa por formatar_data_utc para as duas saídas serem iguais.
+"""
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+VERSAO_ESQUEMA = 1
+
+# Campos da resposta da API (ProcessoIndeferimento em server.py) e seus tipos
+CAMPOS_OBRIGATORIOS = {
+    'id': str,
+    'execucao_id': str,
+    'numero_processo': str,
+    'marca': str,
+    'data_extracao': str,
+    'semana': int,
+    'ano': int,
+}
+CAMPOS_OPCIONAIS = {
+    'email': str,
+    'titular': str,
+}
+
+
+def validar_processo(processo: dict) -> dict:
+    """Confere tipos dos campos da API e marca o processo com VERSAO_ESQUEMA
+
+    Levanta ValueError com o primeiro campo inválido.
+    """
+    for campo, tipo in CAMPOS_OBRIGATORIOS.items():
+        if not isinstance(processo.get(campo), tipo):
+            raise ValueError(f"Processo {processo.get('numero_processo')}: campo '{campo}' inválido")
+    for campo, tipo in CAMPOS_OPCIONAIS.items():
+        if processo.get(campo) is not None and not isinstance(processo[campo], tipo):
+            raise ValueError(f"Processo {processo.get('numero_processo')}: campo '{campo}' inválido")
+    datetime.fromisoformat(processo['data_extracao'])
+    processo['versao_esquema'] = VERSAO_ESQUEMA
+    return processo
+
+
+def validar_processos(processos: list) -> int:
+    """Valida e marca cada processo antes do insert; inválidos são gravados sem a marca
+
+    Retorna a quantidade de processos inválidos.
+    """
+    invalidos = 0
+    for processo in processos:
+        try:
+            validar_processo(processo)
+        except ValueError as e:
+            invalidos += 1
+            processo.pop('versao_esquema', None)
+            logger.warning(f"{str(e)} - será validado na leitura")
+    return invalidos
+
+
+def formatar_data_utc(valor: str) -> str:
+    """Data ISO em UTC no formato do Pydantic ('Z' em vez de +00:00)"""
+    return valor[:-6] + 'Z' if valor.endswith('+00:00') else valor
+
+
+def eh_confiavel(processo: dict) -> bool:
+    return processo.get('versao_esquema') == VERSAO_ESQUEMA
+
+
+def projecao_resposta() -> dict:
+    """Projeção do MongoDB com só os campos da resposta (mais a versão do esquema)"""
+    return {"_id": 0, "versao_esquema": 1, **{campo: 1 for campo in (*CAMPOS_OBRIGATORIOS, *CAMPOS_OPCIONAIS)}}
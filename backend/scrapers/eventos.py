@@ -0,0 +1,283 @@
+"""
+Pub/sub em processo para o progresso das execuções (consumido pelo SSE do server.py).
+
+As execuções publicam eventos (publicar) em qualquer thread/event loop — o scheduler
+roda cada execução em um loop próprio — e cada assinante recebe os eventos na fila
+do seu loop via call_soon_threadsafe. Tipos de evento:
+  - inicio: execução criada
+  - etapa: mudança de etapa (download_zip, parse_xml, enriquecimento, ...)
+  - processos: processos gravados no MongoDB (linhas iniciais da tabela)
+  - processo: um processo terminou o enriquecimento (resultado, marca, email)
+  - status: execução concluída ou com erro (evento final)
+
+Assinantes de uma execução (execucao_id) recebem todos os eventos dela; assinantes
+globais (execucao_id=None) recebem só inicio, etapa e status de todas as execuções.
+
+O barramento só vê as execuções deste processo. As de outra réplica (a líder, com
+o scheduler) chegam por AssinaturaMongo, que acompanha o resumo materializado da
+última execução (resumo_execucao.py) a cada EVENTOS_INTERVALO_S e converte as
+alterações nos mesmos eventos (sem etapa, que não é materializada).
+"""
+from collections import deque
+import asyncio
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from .resumo_execucao import ler_execucao_resumo, ler_resumo, versao_resumo
+
+logger = logging.getLogger(__name__)
+
+TIPO_INICIO = 'inicio'
+TIPO_ETAPA = 'etapa'
+TIPO_PROCESSOS = 'processos'
+TIPO_PROCESSO = 'processo'
+TIPO_STATUS = 'status'
+TIPOS_GLOBAIS = (TIPO_INICIO, TIPO_ETAPA, TIPO_STATUS)
+
+STATUS_FINAIS = ('concluido', 'erro')
+
+# Eventos acumulados por assinante lento antes de começar a descartar
+MAX_EVENTOS_PENDENTES = 1000
+# Comentário SSE enviado sem eventos para manter a conexão (proxies fecham conexões paradas)
+KEEPALIVE_S = 15
+# Intervalo de leitura do resumo no MongoDB para execuções de outras réplicas
+EVENTOS_INTERVALO_S = float(os.environ.get('INPI_EVENTOS_INTERVALO_S', '2'))
+
+
+class Assinatura:
+    """Fila de eventos de um assinante, presa ao event loop em que foi criada"""
+
+    def __init__(self, execucao_id: str = None):
+        self.execucao_id = execucao_id
+        self.loop = asyncio.get_running_loop()
+        self.fila = asyncio.Queue(MAX_EVENTOS_PENDENTES)
+        self.descartados = 0
+
+    def _entregar(self, evento: dict):
+        # Sempre executado no loop do assinante
+        try:
+            self.fila.put_nowait(evento)
+        except asyncio.QueueFull:
+            self.descartados += 1
+
+    async def proximo(self, timeout: float = None) -> dict:
+        """Próximo evento ou None se nada chegar em `timeout` segundos"""
+        try:
+            return await asyncio.wait_for(self.fila.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def encerrar(self):
+        barramento.cancelar(self)
+
+
+class BarramentoEventos:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._assinaturas = {}
+        self._sequencia = itertools.count(1)
+        # Último evento de etapa/status por execução: estado inicial de novos assinantes
+        self._estado = {}
+
+    def assinar(self, execucao_id: str = None) -> Assinatura:
+        assinatura = Assinatura(execucao_id)
+        with self._lock:
+            self._assinaturas.setdefault(execucao_id, set()).add(assinatura)
+        return assinatura
+
+    def cancelar(self, assinatura: Assinatura):
+        with self._lock:
+            assinaturas = self._assinaturas.get(assinatura.execucao_id)
+            if assinaturas:
+                assinaturas.discard(assinatura)
+                if not assinaturas:
+                    del self._assinaturas[assinatura.execucao_id]
+        if assinatura.descartados:
+            logger.warning(f"Assinante de eventos lento: {assinatura.descartados} eventos descartados")
+
+    def estado(self, execucao_id: str):
+        """Último evento de etapa/status conhecido da execução (None se ela não rodou aqui)"""
+        with self._lock:
+            return self._estado.get(execucao_id)
+
+    def publicar(self, execucao_id: str, tipo: str, **dados):
+        evento = {
+            'id': next(self._sequencia),
+            'tipo': tipo,
+            'execucao_id': execucao_id,
+            'momento': datetime.now(timezone.utc).isoformat(),
+            **dados
+        }
+        with self._lock:
+            if tipo in TIPOS_GLOBAIS:
+                self._estado[execucao_id] = evento
+            destinos = list(self._assinaturas.get(execucao_id, ()))
+            if tipo in TIPOS_GLOBAIS:
+                destinos += self._assinaturas.get(None, ())
+
+        for assinatura in destinos:
+            try:
+                assinatura.loop.call_soon_threadsafe(assinatura._entregar, evento)
+            except RuntimeError:
+                # Loop do assinante já foi fechado
+                self.cancelar(assinatura)
+        return evento
+
+
+barramento = BarramentoEventos()
+
+
+class AssinaturaMongo:
+    """Eventos lidos do resumo materializado no MongoDB (mesma interface de Assinatura)
+
+    Com execucao_id: 'processos' com as linhas conhecidas quando surgem processos
+    novos, 'processo' para cada resultado e 'status' no fim. Se a execução não é a
+    do resumo (mais antiga), só o status é acompanhado, em execucoes. Sem
+    execucao_id: 'inicio' e 'status' das execuções que não rodam neste processo,
+    junto com os eventos da assinatura `local` do barramento.
+    """
+
+    def __init__(self, db, execucao_id: str = None, status: str = None, local: Assinatura = None,
+                 intervalo_s: float = EVENTOS_INTERVALO_S):
+        self.db = db
+        self.execucao_id = execucao_id
+        self.local = local
+        self.intervalo_s = intervalo_s
+        self.descartados = 0
+        self._pendentes = deque()
+        self._sequencia = itertools.count(1)
+        self._ultima_leitura = 0.0
+        self._versao = None
+        self._cursor = None
+        self._status = status
+        self._execucao_vista = None
+        self._linhas = {}
+
+    def _evento(self, execucao_id: str, tipo: str, **dados) -> dict:
+        return {
+            **dados,
+            'id': next(self._sequencia),
+            'tipo': tipo,
+            'execucao_id': execucao_id,
+            'momento': datetime.now(timezone.utc).isoformat(),
+        }
+
+    async def proximo(self, timeout: float = None) -> dict:
+        prazo = None if timeout is None else time.monotonic() + timeout
+        while not self._pendentes:
+            agora = time.monotonic()
+            if agora - self._ultima_leitura >= self.intervalo_s:
+                self._ultima_leitura = agora
+                try:
+                    self._pendentes.extend(await self._ler())
+                except Exception as e:
+                    logger.warning(f"Falha ao ler eventos do MongoDB: {str(e)}")
+                continue
+            espera = self._ultima_leitura + self.intervalo_s - agora
+            if prazo is not None:
+                if agora >= prazo:
+                    return None
+                espera = min(espera, prazo - agora)
+            if self.local is not None:
+                evento = await self.local.proximo(espera)
+                if evento is not None:
+                    return evento
+            else:
+                await asyncio.sleep(espera)
+        return self._pendentes.popleft()
+
+    def encerrar(self):
+        if self.local is not None:
+            self.local.encerrar()
+
+    async def _ler(self) -> list:
+        versao = await versao_resumo(self.db)
+        if self.execucao_id is not None and (versao is None or versao[0] != self.execucao_id):
+            return await self._ler_status()
+        if versao == self._versao:
+            return []
+        self._versao = versao
+        if self.execucao_id is None:
+            return await self._ler_global()
+        return await self._ler_execucao()
+
+    def _mudou_status(self, execucao: dict) -> list:
+        status, self._status = self._status, execucao.get('status')
+        if self._status == status or self._status not in STATUS_FINAIS:
+            return []
+        return [self._evento(execucao['id'], TIPO_STATUS, **execucao)]
+
+    async def _ler_global(self) -> list:
+        execucao = await ler_execucao_resumo(self.db)
+        if execucao is None:
+            return []
+        # Primeira leitura (só o estado de partida, como no barramento) ou execução
+        # deste processo, cujos eventos vêm do barramento
+        silenciosa = self._execucao_vista is None or barramento.estado(execucao['id']) is not None
+        eventos = []
+        if execucao['id'] != self._execucao_vista:
+            self._execucao_vista, self._status = execucao['id'], None
+            eventos.append(self._evento(
+                execucao['id'], TIPO_INICIO, data_execucao=execucao.get('data_execucao'),
+                semana=execucao.get('semana'), ano=execucao.get('ano')
+            ))
+        eventos += self._mudou_status(execucao)
+        return [] if silenciosa else eventos
+
+    async def _ler_status(self) -> list:
+        execucao = await self.db.execucoes.find_one({"id": self.execucao_id}, {"_id": 0, "metricas_etapas": 0})
+        return self._mudou_status(execucao) if execucao else []
+
+    async def _ler_execucao(self) -> list:
+        resumo = await ler_resumo(self.db, self._cursor)
+        self._cursor = resumo['cursor']
+        eventos = []
+        novos = False
+        for processo in resumo['processos']:
+            numero = processo['numero_processo']
+            novos = novos or numero not in self._linhas
+            if numero in self._linhas and processo.get('resultado'):
+                eventos.append(self._evento(self.execucao_id, TIPO_PROCESSO, **processo))
+            self._linhas[numero] = processo
+        if novos:
+            eventos.insert(0, self._evento(self.execucao_id, TIPO_PROCESSOS, processos=list(self._linhas.values())))
+        return eventos + self._mudou_status(resumo['execucao'])
+
+
+def publicar(execucao_id: str, tipo: str, **dados):
+    """Publica um evento de progresso (seguro em qualquer thread)"""
+    return barramento.publicar(execucao_id, tipo, **dados)
+
+
+def formatar_sse(evento: dict) -> str:
+    """Evento no formato text/event-stream (o EventSource reenvia o id no Last-Event-ID)"""
+    dados = json.dumps(evento, ensure_ascii=False, default=str)
+    return f"id: {evento['id']}\nevent: {evento['tipo']}\ndata: {dados}\n\n"
+
+
+async def transmitir(assinatura: Assinatura, iniciais=(), ate_finalizar: bool = True):
+    """Gerador SSE: eventos iniciais, depois os da assinatura com keepalive
+
+    Com ate_finalizar, encerra após o evento de status final da execução. A
+    assinatura é cancelada quando o cliente desconecta.
+    """
+    try:
+        for evento in iniciais:
+            yield formatar_sse(evento)
+            if ate_finalizar and evento['tipo'] == TIPO_STATUS and evento.get('status') in STATUS_FINAIS:
+                return
+        while True:
+            evento = await assinatura.proximo(KEEPALIVE_S)
+            if evento is None:
+                yield ": keepalive\n\n"
+                continue
+            yield formatar_sse(evento)
+            if ate_finalizar and evento['tipo'] == TIPO_STATUS and evento.get('status') in STATUS_FINAIS:
+                return
+    finally:
+        assinatura.encerrar()
@@ -0,0 +1,79 @@
+from lxml import html as lxml_html
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Serviços cujo PDF traz os dados do requerente (email)
+SERVICOS_PDF = ('389', '394')
+
+
+def _texto_proprio(elemento) -> str:
+    """Texto do elemento sem o conteúdo de tooltips (div) e tabelas aninhadas"""
+    partes = [elemento.text or '']
+    for filho in elemento:
+        if filho.tag not in ('div', 'table'):
+            partes.append(_texto_proprio(filho))
+        partes.append(filho.tail or '')
+    return ' '.join(''.join(partes).split())
+
+
+def _valor_do_rotulo(arvore, rotulo: str):
+    """Valor da célula seguinte a um rótulo ('Marca:', 'Natureza:' ...)"""
+    celulas = arvore.xpath('//td[normalize-space(.)=$rotulo]', rotulo=rotulo)
+    if not celulas:
+        return None
+    vizinhas = celulas[0].xpath('following-sibling::td')
+    if not vizinhas:
+        return None
+    valor = ' '.join(vizinhas[0].text_content().split())
+    return valor or None
+
+
+def extrair_dados_detalhe(html: str) -> dict:
+    """Extrai de um snapshot da página de detalhes tudo que o scraper precisa
+
+    Retorna:
+      marca, apresentacao, natureza: textos da seção de dados da marca (ou None)
+      peticoes_expandidas: estado do accordion de petições
+      pdf_servico: {'servico': '389', 'indice_pdf': n} com a posição do ícone entre
+                   todos os img[src*="pdf.gif"] da página, ou None
+      servicos_encontrados: códigos 389/394 vistos (com ou sem PDF)
+    """
+    arvore = lxml_html.fromstring(html)
+
+    resultado = {
+        'marca': _valor_do_rotulo(arvore, 'Marca:'),
+        'apresentacao': _valor_do_rotulo(arvore, 'Apresentação:'),
+        'natureza': _valor_do_rotulo(arvore, 'Natureza:'),
+        'peticoes_expandidas': bool(arvore.xpath('//input[@id="accordion-1"][@checked]')),
+        'pdf_servico': None,
+        'servicos_encontrados': []
+    }
+
+    # Índice de cada ícone de PDF na ordem do documento (mesma ordem do locator no navegador)
+    icones_pdf = arvore.xpath('//img[contains(@src, "pdf.gif")]')
+    indice_icone = {id(img): i for i, img in enumerate(icones_pdf)}
+
+    for linha in arvore.xpath('//tr'):
+        celulas = linha.xpath('./td')
+        servico = next((c for c in (_texto_proprio(td) for td in celulas) if c in SERVICOS_PDF), None)
+        if not servico:
+            continue
+
+        resultado['servicos_encontrados'].append(servico)
+        icones = [img for td in celulas for img in td.xpath('.//img[contains(@src, "pdf.gif")]')]
+        if icones and resultado['pdf_servico'] is None:
+            resultado['pdf_servico'] = {
+                'servico': servico,
+                'indice_pdf': indice_icone[id(icones[0])]
+            }
+
+    return resultado
+
+
+def eh_figurativa(dados_detalhe: dict, html: str) -> bool:
+    """Marca figurativa pela apresentação; sem o campo, cai na busca textual antiga"""
+    apresentacao = dados_detalhe.get('apresentacao')
+    if apresentacao:
+        return apresentacao.strip().lower() == 'figurativa'
+    return 'Figurativa' in html
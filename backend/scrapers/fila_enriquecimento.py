@@ -0,0 +1,397 @@
+"""
+Fila de enriquecimento no MongoDB para workers em várias máquinas.
+
+Com INPI_FILA_DISTRIBUIDA=1 a execução não consulta o pePI no próprio processo:
+cada processo a consultar vira uma unidade em fila_enriquecimento e workers
+independentes (python -m scrapers.fila_enriquecimento, em qualquer host com acesso
+ao MongoDB) fazem a consulta e gravam o resultado na unidade. A execução
+(coordenadora) recolhe os resultados e aplica as mesmas regras do modo local
+(supressão, propagação por titular, orçamento).
+
+Unidade: {_id: '<execucao_id>:<numero_processo>', execucao_id, numero_processo,
+prioridade, status, tentativas, disponivel_em, worker, visivel_ate, resultado}
+  - reivindicar(): find_one_and_update atômico na unidade pendente mais prioritária
+  - unidade em andamento com visibilidade vencida (worker morreu) volta para
+    pendente contando a tentativa; na MAX_TENTATIVAS conclui com FALHA_WORKER_PERDIDO
+  - o worker estende visivel_ate das suas unidades a cada FILA_HEARTBEAT_S
+  - falha transitória volta para pendente com backoff (disponivel_em); as demais
+    concluem a unidade com o resultado do pePI
+  - PEPI_TAXA_GLOBAL_POR_MIN limita as consultas somando todos os workers
+  - a coordenadora desiste das unidades em aberto (canceladas, processos com falha)
+    após FILA_TEMPO_MAXIMO_S ou sem heartbeat de nenhum worker por FILA_SEM_WORKERS_S
+"""
+from datetime import datetime, timedelta, timezone
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import uuid
+
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from .contas_pepi import obter_pool
+from .resiliencia import circuito_pepi, calcular_backoff, eh_transitoria, MAX_TENTATIVAS, FALHA_DESCONHECIDA
+
+logger = logging.getLogger(__name__)
+
+FILA_DISTRIBUIDA = os.environ.get('INPI_FILA_DISTRIBUIDA', '0') == '1'
+# Sem heartbeat por esse tempo, a unidade volta para a fila
+FILA_VISIBILIDADE_S = float(os.environ.get('FILA_VISIBILIDADE_S', '300'))
+FILA_HEARTBEAT_S = float(os.environ.get('FILA_HEARTBEAT_S', '30'))
+# Intervalo da coordenadora entre coletas de resultados e dos workers com a fila vazia
+FILA_INTERVALO_S = float(os.environ.get('FILA_INTERVALO_S', '2'))
+# A coordenadora cancela as unidades em aberto após esse tempo (0 = sem limite)
+FILA_TEMPO_MAXIMO_S = float(os.environ.get('FILA_TEMPO_MAXIMO_S', '21600'))
+# ... ou quando nenhum worker tem heartbeat por esse tempo (0 = sem limite)
+FILA_SEM_WORKERS_S = float(os.environ.get('FILA_SEM_WORKERS_S', '600'))
+# Limite global de consultas ao pePI por minuto, somando todos os workers (0 = sem limite)
+TAXA_GLOBAL_POR_MIN = float(os.environ.get('PEPI_TAXA_GLOBAL_POR_MIN', '0'))
+
+STATUS_PENDENTE = 'pendente'
+STATUS_EM_ANDAMENTO = 'em_andamento'
+STATUS_CONCLUIDO = 'concluido'
+STATUS_CANCELADO = 'cancelado'
+
+# Falhas gravadas pela fila (além das do pePI, ver resiliencia.py)
+FALHA_WORKER_PERDIDO = 'worker_perdido'
+FALHA_FILA_TEMPO = 'fila_tempo_esgotado'
+FALHA_FILA_SEM_WORKERS = 'fila_sem_workers'
+
+
+def _agora():
+    return datetime.now(timezone.utc)
+
+
+def id_unidade(execucao_id: str, numero_processo: str) -> str:
+    return f"{execucao_id}:{numero_processo}"
+
+
+def identificar_worker() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+async def garantir_indices_fila(db):
+    await db.fila_enriquecimento.create_index(
+        [("status", ASCENDING), ("prioridade", DESCENDING), ("disponivel_em", ASCENDING)]
+    )
+    await db.fila_enriquecimento.create_index([("execucao_id", ASCENDING), ("status", ASCENDING), ("aplicado", ASCENDING)])
+    await db.fila_enriquecimento.create_index([("worker", ASCENDING), ("status", ASCENDING)])
+
+
+async def publicar_unidades(db, execucao_id: str, processos: list) -> int:
+    """Uma unidade por processo; unidades já publicadas são ignoradas"""
+    if not processos:
+        return 0
+    agora = _agora()
+    unidades = [{
+        "_id": id_unidade(execucao_id, p['numero_processo']),
+        "execucao_id": execucao_id,
+        "numero_processo": p['numero_processo'],
+        "prioridade": p.get('prioridade', 0),
+        "status": STATUS_PENDENTE,
+        "tentativas": 0,
+        "disponivel_em": agora,
+        "criado_em": agora,
+        "aplicado": False
+    } for p in processos]
+    try:
+        resultado = await db.fila_enriquecimento.insert_many(unidades, ordered=False)
+        return len(resultado.inserted_ids)
+    except BulkWriteError as e:
+        return e.details.get('nInserted', 0)
+
+
+async def recuperar_vencidas(db) -> int:
+    """Unidades de workers mortos voltam para a fila, contando a tentativa perdida
+
+    Na MAX_TENTATIVAS a unidade é concluída com FALHA_WORKER_PERDIDO: um processo
+    que derruba o worker (navegador travado, memória) não é reivindicado para sempre.
+    """
+    agora = _agora()
+    vencidas = {"status": STATUS_EM_ANDAMENTO, "visivel_ate": {"$lt": agora}}
+    esgotadas = await db.fila_enriquecimento.update_many(
+        {**vencidas, "tentativas": {"$gte": MAX_TENTATIVAS - 1}},
+        {"$set": {
+            "status": STATUS_CONCLUIDO,
+            "resultado": {"falha": FALHA_WORKER_PERDIDO},
+            "concluido_em": agora
+        },
+         "$unset": {"worker": "", "visivel_ate": ""},
+         "$inc": {"tentativas": 1}}
+    )
+    devolvidas = await db.fila_enriquecimento.update_many(
+        vencidas,
+        {"$set": {"status": STATUS_PENDENTE, "disponivel_em": agora, "ultima_falha": FALHA_WORKER_PERDIDO},
+         "$unset": {"worker": "", "visivel_ate": ""},
+         "$inc": {"tentativas": 1}}
+    )
+    total = esgotadas.modified_count + devolvidas.modified_count
+    if total:
+        logger.warning(
+            f"♻️  {total} unidades com visibilidade vencida: {devolvidas.modified_count} de volta à fila, "
+            f"{esgotadas.modified_count} com falha ({FALHA_WORKER_PERDIDO})"
+        )
+    return total
+
+
+async def reivindicar(db, worker_id: str, visibilidade_s: float = FILA_VISIBILIDADE_S):
+    """Reivindica atomicamente a unidade disponível mais prioritária (ou None)"""
+    await recuperar_vencidas(db)
+    agora = _agora()
+    return await db.fila_enriquecimento.find_one_and_update(
+        {"status": STATUS_PENDENTE, "disponivel_em": {"$lte": agora}},
+        {"$set": {
+            "status": STATUS_EM_ANDAMENTO,
+            "worker": worker_id,
+            "reivindicado_em": agora,
+            "visivel_ate": agora + timedelta(seconds=visibilidade_s)
+        }},
+        sort=[("prioridade", DESCENDING), ("disponivel_em", ASCENDING)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def estender_visibilidade(db, worker_id: str, visibilidade_s: float = FILA_VISIBILIDADE_S) -> int:
+    resultado = await db.fila_enriquecimento.update_many(
+        {"worker": worker_id, "status": STATUS_EM_ANDAMENTO},
+        {"$set": {"visivel_ate": _agora() + timedelta(seconds=visibilidade_s)}}
+    )
+    return resultado.modified_count
+
+
+async def concluir_unidade(db, unidade: dict, worker_id: str, dados: dict) -> bool:
+    """Grava o resultado; False se a unidade já foi reivindicada por outro worker"""
+    resultado = await db.fila_enriquecimento.update_one(
+        {"_id": unidade['_id'], "worker": worker_id, "status": STATUS_EM_ANDAMENTO},
+        {"$set": {"status": STATUS_CONCLUIDO, "resultado": dados, "concluido_em": _agora()},
+         "$inc": {"tentativas": 1}}
+    )
+    return resultado.modified_count == 1
+
+
+async def reagendar_unidade(db, unidade: dict, worker_id: str, espera: float, falha: str) -> bool:
+    resultado = await db.fila_enriquecimento.update_one(
+        {"_id": unidade['_id'], "worker": worker_id, "status": STATUS_EM_ANDAMENTO},
+        {"$set": {
+            "status": STATUS_PENDENTE,
+            "disponivel_em": _agora() + timedelta(seconds=espera),
+            "ultima_falha": falha
+        },
+         "$unset": {"worker": "", "visivel_ate": ""},
+         "$inc": {"tentativas": 1}}
+    )
+    return resultado.modified_count == 1
+
+
+async def coletar_resultados(db, execucao_id: str) -> list:
+    """Unidades concluídas ainda não aplicadas pela coordenadora (marcadas como aplicadas)"""
+    unidades = await db.fila_enriquecimento.find(
+        {"execucao_id": execucao_id, "status": STATUS_CONCLUIDO, "aplicado": False}
+    ).to_list(None)
+    if unidades:
+        await db.fila_enriquecimento.update_many(
+            {"_id": {"$in": [u['_id'] for u in unidades]}},
+            {"$set": {"aplicado": True}}
+        )
+    return unidades
+
+
+async def cancelar_pendentes(db, execucao_id: str, em_andamento: bool = False) -> list:
+    """Cancela as unidades ainda não reivindicadas; retorna os números de processo
+
+    Com em_andamento, cancela também as reivindicadas (o resultado do worker é
+    descartado em concluir_unidade).
+    """
+    status = [STATUS_PENDENTE, STATUS_EM_ANDAMENTO] if em_andamento else [STATUS_PENDENTE]
+    cancelados = []
+    while True:
+        unidade = await db.fila_enriquecimento.find_one_and_update(
+            {"execucao_id": execucao_id, "status": {"$in": status}},
+            {"$set": {"status": STATUS_CANCELADO, "aplicado": True}}
+        )
+        if unidade is None:
+            return cancelados
+        cancelados.append(unidade['numero_processo'])
+
+
+async def contar_em_aberto(db, execucao_id: str) -> int:
+    return await db.fila_enriquecimento.count_documents(
+        {"execucao_id": execucao_id, "status": {"$in": [STATUS_PENDENTE, STATUS_EM_ANDAMENTO]}}
+    )
+
+
+async def contar_workers_ativos(db) -> int:
+    """Workers com heartbeat recente"""
+    limite = _agora() - timedelta(seconds=2 * FILA_HEARTBEAT_S)
+    return await db.workers_enriquecimento.count_documents({"heartbeat_em": {"$gte": limite}})
+
+
+async def estado_fila(db) -> dict:
+    """Unidades por status e workers com heartbeat recente"""
+    por_status = await db.fila_enriquecimento.aggregate([
+        {"$match": {"status": {"$in": [STATUS_PENDENTE, STATUS_EM_ANDAMENTO]}}},
+        {"$group": {"_id": "$status", "total": {"$sum": 1}}}
+    ]).to_list(None)
+    limite = _agora() - timedelta(seconds=2 * FILA_HEARTBEAT_S)
+    workers = await db.workers_enriquecimento.find({"heartbeat_em": {"$gte": limite}}).to_list(None)
+    return {
+        "distribuida": FILA_DISTRIBUIDA,
+        "unidades": {item['_id']: item['total'] for item in por_status},
+        "workers": [{"id": w.pop('_id'), **w} for w in workers]
+    }
+
+
+async def aguardar_vez_global(db, taxa_por_min: float = TAXA_GLOBAL_POR_MIN):
+    """Reserva um intervalo no limite global de consultas ao pePI (todos os workers)"""
+    if not taxa_por_min:
+        return
+    intervalo = timedelta(seconds=60 / taxa_por_min)
+    while True:
+        agora = _agora()
+        try:
+            # Casa com a vaga livre ou cria o documento na primeira consulta
+            await db.fila_taxa.find_one_and_update(
+                {"_id": "pepi", "proxima_em": {"$lte": agora}},
+                {"$set": {"proxima_em": agora + intervalo}},
+                upsert=True
+            )
+            return
+        except DuplicateKeyError:
+            # Vaga já reservada por outro worker: espera até a próxima
+            pass
+        documento = await db.fila_taxa.find_one({"_id": "pepi"}) or {}
+        proxima = documento.get('proxima_em')
+        if proxima is not None and proxima.tzinfo is None:
+            proxima = proxima.replace(tzinfo=timezone.utc)
+        espera = (proxima - _agora()).total_seconds() if proxima else 0
+        await asyncio.sleep(min(max(espera, 0.05), 5))
+
+
+class WorkerEnriquecimento:
+    """Processo worker: reivindica unidades, consulta o pePI e grava o resultado
+
+    `concorrencia` consultas simultâneas por processo (cada uma com seu navegador);
+    para usar mais máquinas basta subir mais workers apontando para o mesmo MongoDB.
+    """
+
+    def __init__(self, db, concorrencia: int = 1, intervalo: float = 0.0):
+        self.db = db
+        self.worker_id = identificar_worker()
+        self.concorrencia = max(1, concorrencia)
+        self.intervalo = intervalo
+        self.processados = 0
+        self.falhas = 0
+        self._pepi = None
+
+    def _pepi_scraper(self):
+        if self._pepi is None:
+            from .pepi_scraper import PepiScraper
+            self._pepi = PepiScraper()
+        return self._pepi
+
+    async def _heartbeat(self):
+        while True:
+            try:
+                await estender_visibilidade(self.db, self.worker_id)
+                contas = await asyncio.get_running_loop().run_in_executor(None, obter_pool().estado)
+                await self.db.workers_enriquecimento.update_one(
+                    {"_id": self.worker_id},
+                    {"$set": {
+                        "host": socket.gethostname(),
+                        "heartbeat_em": _agora(),
+                        "concorrencia": self.concorrencia,
+                        "processados": self.processados,
+                        "falhas": self.falhas,
+                        "contas": contas
+                    }},
+                    upsert=True
+                )
+            except Exception as e:
+                logger.warning(f"Falha no heartbeat do worker: {str(e)}")
+            await asyncio.sleep(FILA_HEARTBEAT_S)
+
+    async def processar(self, unidade: dict):
+        numero_processo = unidade['numero_processo']
+        await circuito_pepi.aguardar_liberacao()
+        await aguardar_vez_global(self.db)
+
+        loop = asyncio.get_running_loop()
+        try:
+            dados = await loop.run_in_executor(
+                None, self._pepi_scraper().buscar_processo_e_extrair_dados, numero_processo
+            )
+        except Exception as e:
+            logger.error(f"❌ Erro ao processar {numero_processo}: {str(e)}")
+            dados = {'falha': FALHA_DESCONHECIDA}
+
+        falha = dados.get('falha')
+        circuito_pepi.registrar_consulta(falha)
+        if falha and eh_transitoria(falha):
+            if unidade['tentativas'] + 1 < MAX_TENTATIVAS:
+                espera = calcular_backoff(unidade['tentativas'])
+                logger.warning(f"🔁 {numero_processo}: falha transitória ({falha}) - nova tentativa em {espera:.0f}s")
+                await reagendar_unidade(self.db, unidade, self.worker_id, espera, falha)
+                return
+
+        if falha:
+            self.falhas += 1
+        if not await concluir_unidade(self.db, unidade, self.worker_id, dados):
+            logger.warning(f"{numero_processo}: unidade reivindicada por outro worker (visibilidade vencida)")
+        self.processados += 1
+
+    async def _consumir(self):
+        while True:
+            unidade = await reivindicar(self.db, self.worker_id)
+            if unidade is None:
+                await asyncio.sleep(FILA_INTERVALO_S)
+                continue
+            await self.processar(unidade)
+            await asyncio.sleep(self.intervalo)
+
+    async def executar(self):
+        logger.info(f"👷 Worker {self.worker_id} consumindo fila_enriquecimento ({self.concorrencia} consultas simultâneas)")
+        tarefas = [asyncio.create_task(self._heartbeat())]
+        tarefas += [asyncio.create_task(self._consumir()) for _ in range(self.concorrencia)]
+        try:
+            await asyncio.gather(*tarefas)
+        finally:
+            for tarefa in tarefas:
+                tarefa.cancel()
+            await asyncio.gather(*tarefas, return_exceptions=True)
+            # Unidades em andamento voltam para a fila na hora
+            await self.db.fila_enriquecimento.update_many(
+                {"worker": self.worker_id, "status": STATUS_EM_ANDAMENTO},
+                {"$set": {"status": STATUS_PENDENTE, "disponivel_em": _agora()},
+                 "$unset": {"worker": "", "visivel_ate": ""}}
+            )
+            await self.db.workers_enriquecimento.delete_one({"_id": self.worker_id})
+
+
+async def _main(args):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    # backend/.env já foi carregado na importação do pacote (scrapers/__init__.py)
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        db = client[os.environ['DB_NAME']]
+        await garantir_indices_fila(db)
+        await WorkerEnriquecimento(db, args.concorrencia, args.intervalo).executar()
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Worker de enriquecimento (consome fila_enriquecimento)')
+    parser.add_argument('--concorrencia', type=int, default=int(os.environ.get('PEPI_WORKERS') or obter_pool().capacidade),
+                        help='consultas simultâneas ao pePI neste processo')
+    parser.add_argument('--intervalo', type=float, default=float(os.environ.get('PEPI_INTERVALO', '2')),
+                        help='pausa entre consultas de uma mesma tarefa (segundos)')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    asyncio.run(_main(args))
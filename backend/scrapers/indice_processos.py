@@ -0,0 +1,153 @@
+"""
+Índice de busca de processos entre edições (número, email, titular e marca).
+
+Os campos normalizados (sem acento, minúsculos, só letras/números) são gravados
+junto com cada processo no momento da escrita, então as buscas usam o índice
+diretamente: igualdade para modo exato e regex ancorada (^prefixo) para prefixo.
+
+Uso (preencher documentos antigos): python -m scrapers.indice_processos
+"""
+from pymongo import ASCENDING, DESCENDING
+import asyncio
+import logging
+import os
+import re
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+CAMPOS_BUSCA = {
+    'numero': 'numero_processo',
+    'email': 'email_norm',
+    'titular': 'titular_norm',
+    'marca': 'marca_norm',
+}
+
+MODOS_BUSCA = ('exato', 'prefixo')
+
+_NAO_ALFANUMERICO = re.compile(r'[^a-z0-9]+')
+
+
+def normalizar_texto(texto) -> str:
+    """'Café & Cia. LTDA' -> 'cafe cia ltda'"""
+    if not texto:
+        return ''
+    sem_acento = unicodedata.normalize('NFKD', texto)
+    sem_acento = ''.join(c for c in sem_acento if not unicodedata.combining(c))
+    return _NAO_ALFANUMERICO.sub(' ', sem_acento.casefold()).strip()
+
+
+def normalizar_email(email) -> str:
+    if not email:
+        return ''
+    return email.strip().lower()
+
+
+def campos_normalizados(processo: dict) -> dict:
+    """Campos *_norm de um processo (só os que têm valor)"""
+    campos = {}
+    titular = normalizar_texto(processo.get('titular'))
+    if titular:
+        campos['titular_norm'] = titular
+    marca = processo.get('marca')
+    if marca and marca != 'Não informado':
+        campos['marca_norm'] = normalizar_texto(marca)
+    email = normalizar_email(processo.get('email'))
+    if email:
+        campos['email_norm'] = email
+    return campos
+
+
+def normalizar_termo(campo: str, termo: str) -> str:
+    if campo == 'numero':
+        return re.sub(r'\D', '', termo or '')
+    if campo == 'email':
+        return normalizar_email(termo)
+    return normalizar_texto(termo)
+
+
+async def garantir_indices(db):
+    """Cria (se não existirem) os índices usados pelas buscas e pelo pipeline"""
+    await db.processos_indeferimento.create_index([("numero_processo", ASCENDING)])
+    await db.processos_indeferimento.create_index([("execucao_id", ASCENDING)])
+    await db.processos_indeferimento.create_index([("email_norm", ASCENDING)], sparse=True)
+    await db.processos_indeferimento.create_index([("titular_norm", ASCENDING)], sparse=True)
+    await db.processos_indeferimento.create_index([("marca_norm", ASCENDING)], sparse=True)
+    await db.processos_indeferimento.create_index([("chaves_bloqueio", ASCENDING)], sparse=True)
+    await db.execucoes.create_index([("id", ASCENDING)], unique=True)
+    await db.execucoes.create_index([("data_execucao", DESCENDING)])
+    await db.execucoes.create_index([("numero_revista", ASCENDING)], sparse=True)
+    logger.info("Índices de processos verificados")
+
+
+async def buscar_processos(db, campo: str, termo: str, modo: str = 'exato', limite: int = 50) -> list:
+    """Busca processos por número, email, titular ou marca (exato ou prefixo)"""
+    if campo not in CAMPOS_BUSCA:
+        raise ValueError(f"Campo de busca inválido: {campo}")
+    if modo not in MODOS_BUSCA:
+        raise ValueError(f"Modo de busca inválido: {modo}")
+
+    termo_normalizado = normalizar_termo(campo, termo)
+    if not termo_normalizado:
+        return []
+
+    chave = CAMPOS_BUSCA[campo]
+    if modo == 'exato':
+        filtro = {chave: termo_normalizado}
+    else:
+        # Regex ancorada e sensível a maiúsculas: o MongoDB usa limites do índice
+        filtro = {chave: {"$regex": f"^{re.escape(termo_normalizado)}"}}
+
+    return await db.processos_indeferimento.find(
+        filtro, {"_id": 0}
+    ).sort(chave, ASCENDING).limit(limite).to_list(limite)
+
+
+async def preencher_campos_normalizados(db, tamanho_lote: int = 1000) -> int:
+    """Grava os campos *_norm em processos antigos que ainda não os têm"""
+    from pymongo import UpdateOne
+
+    total = 0
+    lote = []
+    cursor = db.processos_indeferimento.find(
+        {"$or": [
+            {"marca_norm": {"$exists": False}},
+            {"email": {"$ne": None}, "email_norm": {"$exists": False}},
+            {"titular": {"$exists": True}, "titular_norm": {"$exists": False}},
+        ]},
+        {"_id": 1, "marca": 1, "email": 1, "titular": 1}
+    )
+    async for processo in cursor:
+        campos = campos_normalizados(processo)
+        if campos:
+            lote.append(UpdateOne({"_id": processo["_id"]}, {"$set": campos}))
+        if len(lote) >= tamanho_lote:
+            await db.processos_indeferimento.bulk_write(lote, ordered=False)
+            total += len(lote)
+            lote = []
+    if lote:
+        await db.processos_indeferimento.bulk_write(lote, ordered=False)
+        total += len(lote)
+
+    logger.info(f"{total} processos atualizados com campos normalizados")
+    return total
+
+
+async def _main():
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        db = client[os.environ['DB_NAME']]
+        await garantir_indices(db)
+        await preencher_campos_normalizados(db)
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    asyncio.run(_main())
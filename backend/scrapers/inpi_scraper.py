@@ -1,112 +1,669 @@
-import requests
 import logging
-from bs4 import BeautifulSoup
 from datetime import datetime, timezone
 from typing import Optional
+from urllib.parse import urljoin
 import uuid
 import zipfile
 import io
 import asyncio
+import itertools
+import os
+import time
 from concurrent.futures import ThreadPoolExecutor
-from .xml_parser import parsear_xml_revista
-from .email_notifier import enviar_email_notificacao
-from .pepi_scraper import PepiScraper
+from .xml_parser import iterar_processos_xml, documentos, eh_figurativa_xml
+from .email_notifier import enviar_email_notificacao, adicionar_ao_resumo, enviar_emails_pendentes
+from .metricas import ResumoEtapas, medir
+from .eventos import publicar, TIPO_INICIO, TIPO_ETAPA, TIPO_PROCESSOS, TIPO_PROCESSO, TIPO_STATUS
+from .resumo_execucao import ResumoMaterializado
+from .cache import invalidar as invalidar_cache
+from .esquema import validar_processos
+from .indice_processos import campos_normalizados, normalizar_email
+from .similaridade import campos_similaridade, marcar_similares, SIMILARIDADE_ATIVA
+from .priorizacao import (
+    carregar_historico_titulares, selecionar_prioritarios, contar_sessoes_evitadas, OrcamentoEnriquecimento
+)
+from .contas_pepi import obter_pool
+from .pipeline import (
+    GravadorResultados, ControleInsercao, produzir_de_thread, consumir,
+    PIPELINE_FILA_MAXIMA, PIPELINE_LOTE_HISTORICO, PIPELINE_LOTE_INSERCAO, PIPELINE_INSERCOES
+)
+from .descadastro import registrar_pendente as registrar_descadastro, descadastrar_pendentes
+from .fila_enriquecimento import (
+    FILA_DISTRIBUIDA, FILA_INTERVALO_S, FILA_TEMPO_MAXIMO_S, FILA_SEM_WORKERS_S, FALHA_FILA_TEMPO,
+    FALHA_FILA_SEM_WORKERS, publicar_unidades, coletar_resultados, cancelar_pendentes, contar_em_aberto,
+    contar_workers_ativos
+)
+from .supressao import (
+    planejar_enriquecimento, carregar_suprimidos, chave_grupo,
+    ORIGEM_PEPI, ORIGEM_HISTORICO, ORIGEM_TITULAR
+)
+from .resiliencia import (
+    circuito_pepi, calcular_backoff, eh_transitoria,
+    MAX_TENTATIVAS, FALHA_DESCONHECIDA
+)
 
 logger = logging.getLogger(__name__)
 
+# Intervalo do heartbeat de uma execução em andamento (ver monitor_revista.py)
+EXECUCAO_HEARTBEAT_S = float(os.environ.get('INPI_EXECUCAO_HEARTBEAT_S', '60'))
+MENSAGEM_CANCELADA = 'Execução cancelada: scheduler parado (liderança perdida ou desligamento)'
+
+# requests, BeautifulSoup e o pepi_scraper (Playwright, PyPDF2, capmonster) são
+# importados só quando o scraping roda: réplicas só de API não pagam esse custo
+
+def extrair_revistas(html, base_url: str) -> list:
+    """Extrai as edições da tabela de revistas que têm link XML na coluna de Marcas"""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    
+    # Primeira linha da tabela é a última edição
+    # Formato do link: https://revistas.inpi.gov.br/txt/RM{NUMERO}.zip
+    table = soup.find('table')
+    if not table:
+        logger.error("Tabela de revistas não encontrada")
+        return []
+    
+    revistas = []
+    for row in table.find_all('tr'):
+        cols = row.find_all('td')
+        # Primeira coluna: número da revista; coluna 6: "SEÇÃO V - MARCAS"
+        if len(cols) < 7:
+            continue
+        
+        xml_link = cols[6].find('a', string='XML')
+        if not xml_link or not xml_link.get('href'):
+            continue
+        
+        xml_url = xml_link.get('href')
+        if not xml_url.startswith('http'):
+            xml_url = urljoin(base_url, xml_url)
+        
+        revistas.append({
+            'numero_revista': cols[0].get_text().strip(),
+            'data_publicacao': cols[1].get_text().strip(),
+            'xml_url': xml_url
+        })
+    
+    return revistas
+
+def baixar_xml_zip(url: str) -> Optional[str]:
+    """Baixa e extrai o conteúdo XML do arquivo ZIP"""
+    import requests
+    try:
+        logger.info(f"Baixando arquivo ZIP de {url}")
+        response = requests.get(url, timeout=60)
+        response.raise_for_status()
+        logger.info(f"ZIP baixado com sucesso - {len(response.content)} bytes")
+        
+        # Extrair XML do ZIP
+        with zipfile.ZipFile(io.BytesIO(response.content)) as zip_file:
+            # Listar arquivos no ZIP
+            file_list = zip_file.namelist()
+            logger.info(f"Arquivos no ZIP: {file_list}")
+            
+            # Buscar arquivo XML
+            xml_file = None
+            for filename in file_list:
+                if filename.lower().endswith('.xml'):
+                    xml_file = filename
+                    break
+            
+            if not xml_file:
+                logger.error("Nenhum arquivo XML encontrado no ZIP")
+                return None
+            
+            # Ler conteúdo do XML
+            with zip_file.open(xml_file) as xml_content:
+                xml_text = xml_content.read().decode('utf-8')
+                logger.info(f"XML extraído com sucesso - {len(xml_text)} bytes")
+                return xml_text
+        
+    except Exception as e:
+        logger.error(f"Erro ao baixar/extrair XML: {str(e)}")
+        return None
+
 class INPIScraper:
     def __init__(self, db):
         self.db = db
-        self.base_url = "https://revistas.inpi.gov.br/rpi/"
+        self.base_url = os.environ.get('INPI_REVISTAS_URL', "https://revistas.inpi.gov.br/rpi/")
+        # Quantidade de processos (os mais prioritários) enviados ao pePI
+        self.limite_processos = int(os.environ.get('INPI_LIMITE_PROCESSOS', '10'))
+        # Pausa entre processos de um mesmo worker (segundos)
+        self.pepi_intervalo = float(os.environ.get('PEPI_INTERVALO', '2'))
+        # Quantidade de workers consultando o pePI em paralelo (padrão: uma
+        # consulta por vaga das contas do pePI, ver contas_pepi.py)
+        self.pepi_workers = int(os.environ.get('PEPI_WORKERS') or obter_pool().capacidade)
+    
+    async def listar_revistas(self) -> list:
+        """Lista todas as edições da página de revistas que têm XML de marcas
+        Retorna: [{'numero_revista', 'data_publicacao', 'xml_url'}] (mais recente primeiro)
+        """
+        import requests
+        logger.info(f"Buscando revistas em {self.base_url}")
+        loop = asyncio.get_event_loop()
+        response = await loop.run_in_executor(None, lambda: requests.get(self.base_url, timeout=30))
+        response.raise_for_status()
+        return extrair_revistas(response.content, self.base_url)
     
     async def buscar_ultimo_xml_marcas(self) -> Optional[tuple]:
         """Busca URL do último XML da seção de marcas
         Retorna: (xml_url, numero_revista)
         """
         try:
-            logger.info(f"Buscando revista em {self.base_url}")
-            response = requests.get(self.base_url, timeout=30)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Encontrar primeira linha da tabela (última edição)
-            # Formato do link: https://revistas.inpi.gov.br/txt/RM{NUMERO}.zip
-            table = soup.find('table')
-            if not table:
-                logger.error("Tabela de revistas não encontrada")
+            revistas = await self.listar_revistas()
+            if not revistas:
+                logger.warning("Nenhum XML de marcas encontrado na primeira edição")
                 return None
             
-            rows = table.find_all('tr')
-            for row in rows:
-                cols = row.find_all('td')
-                if len(cols) > 0:
-                    # Primeira coluna: número da revista
-                    numero_revista = cols[0].get_text().strip()
-                    
-                    # Buscar link XML na coluna de Marcas (coluna 6)
-                    if len(cols) >= 7:
-                        marcas_col = cols[6]  # Coluna "SEÇÃO V - MARCAS"
-                        xml_link = marcas_col.find('a', string='XML')
-                        
-                        if xml_link and xml_link.get('href'):
-                            xml_url = xml_link.get('href')
-                            if not xml_url.startswith('http'):
-                                xml_url = f"https://revistas.inpi.gov.br/{xml_url.lstrip('/')}"
-                            
-                            logger.info(f"XML encontrado: {xml_url} (Revista {numero_revista})")
-                            return (xml_url, numero_revista)
-            
-            logger.warning("Nenhum XML de marcas encontrado na primeira edição")
-            return None
+            revista = revistas[0]
+            logger.info(f"XML encontrado: {revista['xml_url']} (Revista {revista['numero_revista']})")
+            return (revista['xml_url'], revista['numero_revista'])
             
         except Exception as e:
             logger.error(f"Erro ao buscar XML: {str(e)}")
             return None
     
     async def baixar_xml(self, url: str) -> Optional[str]:
-        """Baixa e extrai o conteúdo XML do arquivo ZIP"""
-        try:
-            logger.info(f"Baixando arquivo ZIP de {url}")
-            response = requests.get(url, timeout=60)
-            response.raise_for_status()
-            logger.info(f"ZIP baixado com sucesso - {len(response.content)} bytes")
+        """Baixa e extrai o conteúdo XML do arquivo ZIP (em thread, sem bloquear o loop)"""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, baixar_xml_zip, url)
+    
+    async def _enriquecer_processos(self, processos: list, execucao_id: str, resumo: ResumoEtapas = None,
+                                    materializado: ResumoMaterializado = None,
+                                    gravador: GravadorResultados = None) -> dict:
+        """Busca marca e email no pePI para cada processo
+        
+        Antes do pePI os processos são agrupados por titular (ver supressao.py):
+        contatos suprimidos são pulados, emails já conhecidos são reaproveitados e
+        só um processo por titular entra na fila; os demais recebem o email dele ou,
+        se ele não trouxer email, o próximo do grupo é consultado.
+        
+        A fila é de prioridade (campo 'prioridade', ver priorizacao.py): com orçamento
+        de CAPTCHAs/minutos esgotado, os processos restantes são os menos valiosos e
+        ficam marcados com orcamento_esgotado em vez de consultados.
+        
+        A fila é consumida por PEPI_WORKERS workers, cada consulta com uma conta do
+        pool de contas do pePI (contas_pepi.py). Falhas transitórias (timeout,
+        login, captcha) voltam para a fila com backoff exponencial; falhas permanentes
+        são gravadas no processo. Todos os workers respeitam o circuit breaker do pePI.
+        
+        Com INPI_FILA_DISTRIBUIDA=1 as consultas vão para fila_enriquecimento e são
+        feitas por workers externos (fila_enriquecimento.py); esta execução só coleta
+        os resultados e aplica as mesmas regras (grupos, supressão, orçamento). Após
+        FILA_TEMPO_MAXIMO_S, ou sem workers por FILA_SEM_WORKERS_S, as unidades em
+        aberto são canceladas e os processos (com os grupos) ficam com a falha da fila.
+        
+        Cada processo concluído é publicado como evento 'processo' (ver eventos.py) e,
+        com `materializado`, gravado no resumo da última execução (resumo_execucao.py).
+        
+        As atualizações dos processos passam pelo `gravador` (etapa de gravação em
+        lote, ver pipeline.py); sem ele um gravador próprio é usado e fechado no fim.
+        """
+        if gravador is None:
+            gravador = GravadorResultados(self.db, execucao_id)
+            try:
+                return await self._enriquecer_processos(processos, execucao_id, resumo, materializado, gravador)
+            finally:
+                await gravador.fechar()
+        
+        fila = asyncio.PriorityQueue()
+        sequencia = itertools.count()
+        orcamento = OrcamentoEnriquecimento()
+        estatisticas = {
+            'total_com_dados': 0,
+            'total_figurativas': 0,
+            'total_retentativas': 0,
+            'total_falhas': 0,
+            'total_consultas_pepi': 0,
+            'total_emails_reutilizados': 0,
+            'total_suprimidos': 0,
+            'total_nao_consultados': 0,
+            'orcamento_esgotado': None
+        }
+        
+        async def processos_concluidos(numeros, resultado, **dados):
+            for numero in numeros:
+                publicar(execucao_id, TIPO_PROCESSO, numero_processo=numero, resultado=resultado, **dados)
+            if materializado is not None:
+                await materializado.atualizar_processos(numeros, resultado=resultado, **dados)
+        
+        plano = await planejar_enriquecimento(self.db, processos)
+        pendentes = plano['pendentes']
+        
+        for proc, motivo in plano['suprimidos']:
+            await gravador.atualizar([proc['numero_processo']], {"suprimido_motivo": motivo})
+            await processos_concluidos([proc['numero_processo']], 'suprimido', suprimido_motivo=motivo)
+        for proc, email in plano['reutilizados']:
+            await gravador.atualizar(
+                [proc['numero_processo']],
+                {"email": email, "email_norm": normalizar_email(email), "email_origem": ORIGEM_HISTORICO}
+            )
+            await processos_concluidos([proc['numero_processo']], 'email_reaproveitado', email=email, email_origem=ORIGEM_HISTORICO)
+        estatisticas['total_suprimidos'] = len(plano['suprimidos'])
+        estatisticas['total_emails_reutilizados'] = len(plano['reutilizados'])
+        
+        logger.info(
+            f"🧮 {len(processos)} processos: {len(plano['consultar'])} titulares para o pePI, "
+            f"{len(plano['reutilizados'])} com email reaproveitado, {len(plano['suprimidos'])} suprimidos"
+        )
+        
+        async def marcar_nao_consultados(proc, motivo_orcamento):
+            """Processo e o restante do grupo ficam sem consulta (orçamento esgotado)"""
+            numeros = [proc['numero_processo']] + [m['numero_processo'] for m in pendentes.pop(chave_grupo(proc), [])]
+            estatisticas['total_nao_consultados'] += len(numeros)
+            estatisticas['orcamento_esgotado'] = motivo_orcamento
+            await gravador.atualizar(numeros, {"orcamento_esgotado": motivo_orcamento})
+            await processos_concluidos(numeros, 'nao_consultado', orcamento_esgotado=motivo_orcamento)
+        
+        async def concluir_grupo(proc, email=None, motivo=None):
+            """Propaga o resultado do representante para o restante do grupo"""
+            membros = pendentes.get(chave_grupo(proc))
+            if not membros:
+                return
+            if email or motivo:
+                del pendentes[chave_grupo(proc)]
+                numeros = [m['numero_processo'] for m in membros]
+                campos = {"suprimido_motivo": motivo} if motivo else {
+                    "email": email, "email_norm": normalizar_email(email), "email_origem": ORIGEM_TITULAR
+                }
+                await gravador.atualizar(numeros, campos)
+                chave = 'total_suprimidos' if motivo else 'total_emails_reutilizados'
+                estatisticas[chave] += len(membros)
+                if motivo:
+                    await processos_concluidos(numeros, 'suprimido', suprimido_motivo=motivo)
+                else:
+                    await processos_concluidos(numeros, 'email_reaproveitado', email=email, email_origem=ORIGEM_TITULAR)
+            else:
+                # Representante sem email (figurativa, sem PDF, falha): tenta o próximo
+                proximo = membros.pop(0)
+                if not membros:
+                    del pendentes[chave_grupo(proc)]
+                await consultar_proximo(proximo)
+        
+        async def aplicar_dados(proc, dados, tentativas):
+            """Grava o resultado definitivo do pePI para o processo e conclui o grupo"""
+            numero_processo = proc['numero_processo']
+            falha = dados.get('falha')
+            if falha:
+                estatisticas['total_falhas'] += 1
+                logger.error(f"❌ {numero_processo}: falha definitiva ({falha}) após {tentativas} tentativa(s)")
+                await gravador.atualizar([numero_processo], {"falha_enriquecimento": falha})
+                await processos_concluidos([numero_processo], 'falha', falha_enriquecimento=falha)
+                await concluir_grupo(proc)
+                return
+            
+            if dados.get('conta_habilitada'):
+                await registrar_descadastro(self.db, numero_processo, dados['conta_habilitada'], execucao_id)
+            
+            # Verificar se é figurativa
+            if dados.get('tipo') == 'figurativa':
+                estatisticas['total_figurativas'] += 1
+                logger.warning(f"⏭️  Pulando processo {numero_processo} (figurativa)")
+                await processos_concluidos([numero_processo], 'figurativa')
+                await concluir_grupo(proc)
+                return
+            
+            # Atualizar no MongoDB se encontrou dados
+            updates = {}
+            if dados.get('marca'):
+                updates['marca'] = dados['marca']
+                logger.info(f"  ✅ MARCA: {dados['marca']}")
+            motivo = None
+            if dados.get('email'):
+                updates['email'] = dados['email']
+                updates['email_origem'] = ORIGEM_PEPI
+                logger.info(f"  ✅ EMAIL: {dados['email']}")
+                suprimidos = await carregar_suprimidos(self.db, [normalizar_email(dados['email'])], [])
+                motivo = suprimidos['emails'].get(normalizar_email(dados['email']))
+                if motivo:
+                    updates['suprimido_motivo'] = motivo
+                    estatisticas['total_suprimidos'] += 1
+                    logger.info(f"  🚫 Email na lista de supressão ({motivo})")
+            
+            if updates:
+                updates.update(campos_normalizados(updates))
+                if 'marca_norm' in updates:
+                    updates.update(campos_similaridade({**proc, **updates}))
+                await gravador.atualizar([numero_processo], updates)
+                estatisticas['total_com_dados'] += 1
+                logger.info(f"  💾 Dados salvos no MongoDB")
+            else:
+                logger.warning(f"  ⚠️  Nenhum dado extraído para {numero_processo}")
             
-            # Extrair XML do ZIP
-            with zipfile.ZipFile(io.BytesIO(response.content)) as zip_file:
-                # Listar arquivos no ZIP
-                file_list = zip_file.namelist()
-                logger.info(f"Arquivos no ZIP: {file_list}")
+            await processos_concluidos(
+                [numero_processo], 'enriquecido' if updates else 'sem_dados',
+                marca=updates.get('marca'), email=updates.get('email'), suprimido_motivo=motivo
+            )
+            await concluir_grupo(proc, dados.get('email'), motivo)
+        
+        if FILA_DISTRIBUIDA:
+            # Workers de fila_enriquecimento consultam o pePI; aqui só se aplicam os resultados
+            por_numero = {p['numero_processo']: p for p in plano['consultar']}
+            parada = None
+            
+            async def marcar_falha_fila(proc, falha):
+                """Processo e o restante do grupo ficam com a falha (fila abandonada)"""
+                numeros = [proc['numero_processo']] + [m['numero_processo'] for m in pendentes.pop(chave_grupo(proc), [])]
+                estatisticas['total_falhas'] += len(numeros)
+                await gravador.atualizar(numeros, {"falha_enriquecimento": falha})
+                await processos_concluidos(numeros, 'falha', falha_enriquecimento=falha)
+            
+            async def consultar_proximo(proc):
+                if parada:
+                    await marcar_falha_fila(proc, parada)
+                    return
+                motivo_orcamento = orcamento.esgotado()
+                if motivo_orcamento:
+                    await marcar_nao_consultados(proc, motivo_orcamento)
+                    return
+                por_numero[proc['numero_processo']] = proc
+                await publicar_unidades(self.db, execucao_id, [proc])
+            
+            await publicar_unidades(self.db, execucao_id, plano['consultar'])
+            workers_ativos = await contar_workers_ativos(self.db)
+            logger.info(f"📤 {len(plano['consultar'])} processos publicados em fila_enriquecimento ({workers_ativos} workers ativos)")
+            if not workers_ativos:
+                logger.warning("Nenhum worker de enriquecimento ativo: rode python -m scrapers.fila_enriquecimento")
+            
+            inicio_fila = ultimo_worker = time.monotonic()
+            while True:
+                # Contar antes de coletar: unidade concluída entre as duas leituras
+                # continua contada como aberta e é coletada na próxima volta
+                em_aberto = await contar_em_aberto(self.db, execucao_id)
+                unidades = await coletar_resultados(self.db, execucao_id)
+                for unidade in unidades:
+                    proc = por_numero[unidade['numero_processo']]
+                    tentativas = unidade.get('tentativas', 1)
+                    estatisticas['total_consultas_pepi'] += tentativas
+                    estatisticas['total_retentativas'] += tentativas - 1
+                    for _ in range(tentativas):
+                        orcamento.consumir_captcha()
+                    try:
+                        await aplicar_dados(proc, unidade.get('resultado') or {}, tentativas)
+                    except Exception as e:
+                        estatisticas['total_falhas'] += 1
+                        logger.error(f"❌ Erro ao aplicar resultado de {proc['numero_processo']}: {str(e)}")
+                        await gravador.atualizar([proc['numero_processo']], {"falha_enriquecimento": FALHA_DESCONHECIDA})
+                        await processos_concluidos([proc['numero_processo']], 'falha', falha_enriquecimento=FALHA_DESCONHECIDA)
                 
-                # Buscar arquivo XML
-                xml_file = None
-                for filename in file_list:
-                    if filename.lower().endswith('.xml'):
-                        xml_file = filename
-                        break
+                motivo_orcamento = orcamento.esgotado()
+                if motivo_orcamento:
+                    # Unidades já reivindicadas terminam; as pendentes não são consultadas
+                    for numero in await cancelar_pendentes(self.db, execucao_id):
+                        await marcar_nao_consultados(por_numero[numero], motivo_orcamento)
                 
-                if not xml_file:
-                    logger.error("Nenhum arquivo XML encontrado no ZIP")
-                    return None
+                if parada or (not em_aberto and not unidades):
+                    break
                 
-                # Ler conteúdo do XML
-                with zip_file.open(xml_file) as xml_content:
-                    xml_text = xml_content.read().decode('utf-8')
-                    logger.info(f"XML extraído com sucesso - {len(xml_text)} bytes")
-                    return xml_text
+                agora = time.monotonic()
+                if await contar_workers_ativos(self.db):
+                    ultimo_worker = agora
+                if FILA_TEMPO_MAXIMO_S and agora - inicio_fila >= FILA_TEMPO_MAXIMO_S:
+                    parada = FALHA_FILA_TEMPO
+                elif FILA_SEM_WORKERS_S and agora - ultimo_worker >= FILA_SEM_WORKERS_S:
+                    parada = FALHA_FILA_SEM_WORKERS
+                if parada:
+                    cancelados = await cancelar_pendentes(self.db, execucao_id, em_andamento=True)
+                    logger.error(f"🛑 Fila de enriquecimento abandonada ({parada}): {len(cancelados)} unidades canceladas")
+                    for numero in cancelados:
+                        await marcar_falha_fila(por_numero[numero], parada)
+                    # Mais uma volta: aplica as unidades concluídas antes do cancelamento
+                    continue
+                await asyncio.sleep(FILA_INTERVALO_S)
             
-        except Exception as e:
-            logger.error(f"Erro ao baixar/extrair XML: {str(e)}")
-            return None
+            return estatisticas
+        
+        from .pepi_scraper import PepiScraper
+        pepi_scraper = PepiScraper(resumo=resumo)
+        
+        async def consultar_proximo(proc):
+            enfileirar((next(proximo_idx), proc, 0))
+        
+        def enfileirar(item):
+            # (prioridade desc, ordem de chegada): dicts nunca são comparados
+            fila.put_nowait((-item[1].get('prioridade', 0), next(sequencia), item))
+        
+        for idx, proc in enumerate(plano['consultar'], 1):
+            enfileirar((idx, proc, 0))
+        proximo_idx = itertools.count(len(plano['consultar']) + 1)
+        
+        reagendamentos = set()
+        
+        async def reagendar(item, espera):
+            # task_done só depois de recolocar o item, senão fila.join() retornaria cedo
+            await asyncio.sleep(espera)
+            enfileirar(item)
+            fila.task_done()
+        
+        async def worker():
+            loop = asyncio.get_event_loop()
+            while True:
+                _, _, (idx, proc, tentativa) = await fila.get()
+                numero_processo = proc.get('numero_processo')
+                reagendado = False
+                
+                try:
+                    # Reserva o CAPTCHA antes de qualquer await (ver OrcamentoEnriquecimento)
+                    motivo_orcamento = orcamento.tentar_consumir()
+                    if motivo_orcamento:
+                        await marcar_nao_consultados(proc, motivo_orcamento)
+                        continue
+                    
+                    await circuito_pepi.aguardar_liberacao()
+                    
+                    logger.info(f"\n{'='*80}")
+                    logger.info(f"📋 Processo {idx}/{len(processos)}: {numero_processo} (tentativa {tentativa + 1})")
+                    logger.info(f"{'='*80}")
+                    
+                    # Buscar dados no pePI (executar em thread para não bloquear loop async)
+                    estatisticas['total_consultas_pepi'] += 1
+                    dados = await loop.run_in_executor(
+                        None,
+                        pepi_scraper.buscar_processo_e_extrair_dados,
+                        numero_processo
+                    )
+                    
+                    falha = dados.get('falha')
+                    circuito_pepi.registrar_consulta(falha)
+                    if falha and eh_transitoria(falha):
+                        if tentativa + 1 < MAX_TENTATIVAS:
+                            espera = calcular_backoff(tentativa)
+                            estatisticas['total_retentativas'] += 1
+                            logger.warning(f"🔁 {numero_processo}: falha transitória ({falha}) - nova tentativa em {espera:.0f}s")
+                            tarefa = asyncio.create_task(reagendar((idx, proc, tentativa + 1), espera))
+                            # Referência até terminar: tarefa coletada deixaria fila.join() esperando
+                            reagendamentos.add(tarefa)
+                            tarefa.add_done_callback(reagendamentos.discard)
+                            reagendado = True
+                            continue
+                    
+                    await aplicar_dados(proc, dados, tentativa + 1)
+                        
+                except Exception as e:
+                    circuito_pepi.registrar_falha()
+                    estatisticas['total_falhas'] += 1
+                    logger.error(f"❌ Erro ao processar {numero_processo}: {str(e)}")
+                    await gravador.atualizar([numero_processo], {"falha_enriquecimento": FALHA_DESCONHECIDA})
+                    await processos_concluidos([numero_processo], 'falha', falha_enriquecimento=FALHA_DESCONHECIDA)
+                    await concluir_grupo(proc)
+                
+                finally:
+                    if not reagendado:
+                        fila.task_done()
+                
+                # Delay entre processos
+                await asyncio.sleep(self.pepi_intervalo)
+        
+        workers = [asyncio.create_task(worker()) for _ in range(max(1, self.pepi_workers))]
+        try:
+            await fila.join()
+        finally:
+            for tarefa in [*workers, *reagendamentos]:
+                tarefa.cancel()
+            await asyncio.gather(*workers, *reagendamentos, return_exceptions=True)
+        
+        return estatisticas
     
-    async def executar_scraping(self):
-        """Executa o processo completo de scraping"""
+    async def _processar_revista(self, xml_content: str, execucao_id: str, semana: int, ano: int,
+                                 resumo: ResumoEtapas, materializado: ResumoMaterializado):
+        """Parse, filtro, priorização, inserção e enriquecimento como etapas (ver pipeline.py)
+        
+        Retorna (processos selecionados, contagem do filtro, estatísticas do enriquecimento).
+        """
+        # 3. Parse iterativo numa thread → filtro; o histórico dos titulares é
+        # consultado em lotes enquanto o parse continua. Os candidatos são
+        # ProcessoXML (compactos); viram documentos só depois da seleção
+        publicar(execucao_id, TIPO_ETAPA, etapa='parse_xml')
+        fila_xml = asyncio.Queue(PIPELINE_FILA_MAXIMA)
+        contagem = {'total': 0, 'com_procurador': 0, 'figurativas_xml': 0}
+        candidatos = []
+        figurativas = []
+        por_titular = {}
+        titulares_pedidos = set()
+        titulares_novos = []
+        consultas_historico = []
+        
+        def consultar_historico():
+            if titulares_novos:
+                consultas_historico.append(asyncio.create_task(
+                    carregar_historico_titulares(self.db, list(titulares_novos))
+                ))
+                titulares_novos.clear()
+        
+        def pedir_historico(titular):
+            if titular and titular not in titulares_pedidos:
+                titulares_pedidos.add(titular)
+                titulares_novos.append(titular)
+                if len(titulares_novos) >= PIPELINE_LOTE_HISTORICO:
+                    consultar_historico()
+        
+        with medir('parse_xml', resumo):
+            produtor = asyncio.create_task(produzir_de_thread(
+                lambda: iterar_processos_xml(xml_content), fila_xml
+            ))
+            try:
+                async for processo in consumir(fila_xml):
+                    contagem['total'] += 1
+                    # Filtrar apenas processos SEM procurador
+                    if processo.get('tem_procurador', False):
+                        contagem['com_procurador'] += 1
+                        continue
+                    # Figurativas pela apresentação do XML: nunca vão ao pePI (cada uma custaria
+                    # lançamento do navegador, login, pesquisa e detalhes só para ser descartada)
+                    # (guardadas só para contar as sessões evitadas depois da seleção)
+                    if eh_figurativa_xml(processo):
+                        contagem['figurativas_xml'] += 1
+                        figurativas.append(processo)
+                        pedir_historico(processo.get('titular_norm'))
+                        continue
+                    candidatos.append(processo)
+                    titular = processo.get('titular_norm')
+                    if titular:
+                        pedir_historico(titular)
+                        por_titular[titular] = por_titular.get(titular, 0) + 1
+                await produtor
+                consultar_historico()
+                historico = {}
+                for parcial in await asyncio.gather(*consultas_historico):
+                    historico.update(parcial)
+            finally:
+                produtor.cancel()
+                for consulta in consultas_historico:
+                    consulta.cancel()
+        
+        logger.info(f"Encontrados {contagem['total']} processos de indeferimento no total")
+        logger.info(f"Total de processos sem procurador: {contagem['total'] - contagem['com_procurador']}")
+        logger.info(f"Total de processos com procurador: {contagem['com_procurador']} (serão ignorados)")
+        logger.info(f"🖼️  {contagem['figurativas_xml']} figurativas (apresentação no XML) descartadas antes do pePI")
+        
+        # Selecionar os LIMITE_PROCESSOS mais prioritários (ver priorizacao.py):
+        # barreira, a seleção precisa de todos os candidatos
+        publicar(execucao_id, TIPO_ETAPA, etapa='priorizacao', total_processos=len(candidatos))
+        with medir('priorizacao', resumo):
+            selecionados = selecionar_prioritarios(candidatos, historico, por_titular, self.limite_processos)
+            contagem['sessoes_evitadas'] = contar_sessoes_evitadas(
+                figurativas, selecionados, historico, por_titular, self.limite_processos
+            )
+        del candidatos, figurativas
+        
+        # Documentos do MongoDB por lote de inserção (em ordem de prioridade)
+        lotes = asyncio.Queue()
+        documentos_selecionados = []
+        for inicio in range(0, len(selecionados), PIPELINE_LOTE_INSERCAO):
+            lote = documentos(selecionados[inicio:inicio + PIPELINE_LOTE_INSERCAO], execucao_id, semana, ano)
+            lotes.put_nowait(lote)
+            documentos_selecionados.extend(lote)
+        selecionados = documentos_selecionados
+        validar_processos(selecionados)
+        
+        # Resumo e evento com a seleção inteira antes das atualizações de cada processo
+        await materializado.adicionar_processos(selecionados)
+        publicar(execucao_id, TIPO_PROCESSOS, processos=[
+            {"numero_processo": p['numero_processo'], "marca": p.get('marca'), "titular": p.get('titular')}
+            for p in selecionados
+        ])
+        
+        # 4-5. Inserção em lotes e pePI em paralelo: os resultados só são
+        # gravados depois de o lote do processo estar inserido
+        insercao = ControleInsercao()
+        gravador = GravadorResultados(self.db, execucao_id, insercao)
+        
+        async def inserir():
+            while not lotes.empty():
+                lote = lotes.get_nowait()
+                await self.db.processos_indeferimento.insert_many(lote)
+                await insercao.marcar([p['numero_processo'] for p in lote])
+        
+        async def inserir_todos():
+            logger.info(f"💾 Salvando {len(selecionados)} números de processo no MongoDB...")
+            with medir('insert_mongo', resumo):
+                await asyncio.gather(*(inserir() for _ in range(max(1, PIPELINE_INSERCOES))))
+            await invalidar_cache(self.db, execucao_id)
+            logger.info("✅ Números de processo salvos")
+        
+        logger.info("🔍 Iniciando busca de MARCA e EMAIL no pePI...")
+        publicar(execucao_id, TIPO_ETAPA, etapa='enriquecimento', total_processos=len(selecionados))
+        etapas = [
+            asyncio.create_task(inserir_todos()),
+            asyncio.create_task(self._enriquecer_processos(selecionados, execucao_id, resumo, materializado, gravador))
+        ]
+        try:
+            await asyncio.wait(etapas, return_when=asyncio.FIRST_EXCEPTION)
+            for etapa in etapas:
+                if etapa.done() and etapa.exception():
+                    raise etapa.exception()
+            await gravador.fechar()
+        finally:
+            for etapa in etapas:
+                etapa.cancel()
+            gravador.cancelar()
+        
+        return selecionados, contagem, etapas[1].result()
+    
+    async def _manter_execucao_ativa(self, execucao_id: str):
+        """Atualiza heartbeat_em enquanto a execução roda: sem ele, 'processando' é execução interrompida"""
+        while True:
+            await asyncio.sleep(EXECUCAO_HEARTBEAT_S)
+            try:
+                await self.db.execucoes.update_one(
+                    {"id": execucao_id}, {"$set": {"heartbeat_em": datetime.now(timezone.utc)}}
+                )
+            except Exception as e:
+                logger.warning(f"Falha ao atualizar heartbeat da execução: {str(e)}")
+    
+    async def executar_scraping(self, revista: Optional[tuple] = None):
+        """Executa o processo completo de scraping
+        
+        revista: (xml_url, numero_revista) já detectada pelo monitor; sem ela a
+        página de revistas é consultada
+        """
         execucao_id = str(uuid.uuid4())
         now = datetime.now(timezone.utc)
         semana = now.isocalendar()[1]
         ano = now.year
         
         logger.info(f"Iniciando scraping - Execução ID: {execucao_id}")
+        resumo = ResumoEtapas()
         
         # Criar registro de execução
         execucao = {
@@ -117,13 +674,23 @@ class INPIScraper:
             "total_processos": 0,
             "semana": semana,
             "ano": ano,
-            "mensagem_erro": None
+            "mensagem_erro": None,
+            "heartbeat_em": now
         }
         await self.db.execucoes.insert_one(execucao)
+        materializado = ResumoMaterializado(self.db, execucao_id)
+        await materializado.iniciar(execucao)
+        await invalidar_cache(self.db, execucao_id)
+        publicar(execucao_id, TIPO_INICIO, data_execucao=execucao['data_execucao'], semana=semana, ano=ano)
+        heartbeat = asyncio.create_task(self._manter_execucao_ativa(execucao_id))
         
         try:
             # 1. Buscar URL do XML
-            result = await self.buscar_ultimo_xml_marcas()
+            result = revista
+            if not result:
+                publicar(execucao_id, TIPO_ETAPA, etapa='revista')
+                with medir('revista', resumo):
+                    result = await self.buscar_ultimo_xml_marcas()
             if not result:
                 raise Exception("XML não encontrado na página da revista")
             
@@ -132,11 +699,15 @@ class INPIScraper:
             # Atualizar URL
             await self.db.execucoes.update_one(
                 {"id": execucao_id},
-                {"$set": {"xml_url": xml_url}}
+                {"$set": {"xml_url": xml_url, "numero_revista": numero_revista}}
             )
+            await materializado.atualizar_execucao(xml_url=xml_url, numero_revista=numero_revista)
+            await invalidar_cache(self.db, execucao_id)
             
             # 2. Baixar e extrair XML do ZIP
-            xml_content = await self.baixar_xml(xml_url)
+            publicar(execucao_id, TIPO_ETAPA, etapa='download_zip', xml_url=xml_url, numero_revista=numero_revista)
+            with medir('download_zip', resumo):
+                xml_content = await self.baixar_xml(xml_url)
             if not xml_content:
                 raise Exception("Falha ao baixar/extrair XML")
             
@@ -152,110 +723,93 @@ URL: {xml_url}
 Processando dados..."""
             )
             
-            # 3. Parsear XML e extrair processos de indeferimento
-            processos = parsear_xml_revista(xml_content, execucao_id, semana, ano)
-            
-            logger.info(f"Encontrados {len(processos)} processos de indeferimento no total")
-            
-            # Filtrar apenas processos SEM procurador
-            processos_sem_procurador = [p for p in processos if not p.get('tem_procurador', False)]
-            processos_com_procurador = [p for p in processos if p.get('tem_procurador', False)]
-            
-            logger.info(f"Total de processos sem procurador: {len(processos_sem_procurador)}")
-            logger.info(f"Total de processos com procurador: {len(processos_com_procurador)} (serão ignorados)")
-            
-            # Pegar processos 101-110 (índices 100 a 109) - 10 PROCESSOS
-            if len(processos_sem_procurador) > 100:
-                processos_sem_procurador = processos_sem_procurador[100:110]
-                logger.info(f"📋 Selecionados processos 101-110: {len(processos_sem_procurador)} processos")
-            else:
-                logger.warning(f"⚠️  Menos de 100 processos disponíveis. Usando os primeiros 10.")
-                processos_sem_procurador = processos_sem_procurador[:10]
-            
-            # 4. PRIMEIRO: Salvar apenas os números de processo no MongoDB
-            logger.info(f"💾 Salvando {len(processos_sem_procurador)} números de processo no MongoDB...")
-            processos_dict = [p.dict() if hasattr(p, 'dict') else p for p in processos_sem_procurador]
-            for proc in processos_dict:
-                if 'data_extracao' in proc and isinstance(proc['data_extracao'], datetime):
-                    proc['data_extracao'] = proc['data_extracao'].isoformat()
-            
-            await self.db.processos_indeferimento.insert_many(processos_dict)
-            logger.info("✅ Números de processo salvos")
-            
-            # 5. SEGUNDO: Buscar marca e email no pePI para cada processo
-            logger.info("🔍 Iniciando busca de MARCA e EMAIL no pePI...")
-            pepi_scraper = PepiScraper()
-            
-            total_com_dados = 0
-            total_figurativas = 0
+            # 3-5. Parse → filtro → priorização → inserção e pePI, em etapas (ver pipeline.py)
+            processos_sem_procurador, contagem, estatisticas = await self._processar_revista(
+                xml_content, execucao_id, semana, ano, resumo, materializado
+            )
+            sessoes_evitadas = contagem['sessoes_evitadas']
             
-            # Processar UM POR VEZ para garantir estabilidade
-            for idx, proc in enumerate(processos_sem_procurador, 1):
-                numero_processo = proc.get('numero_processo')
-                logger.info(f"\n{'='*80}")
-                logger.info(f"📋 Processo {idx}/{len(processos_sem_procurador)}: {numero_processo}")
-                logger.info(f"{'='*80}")
-                
-                try:
-                    # Buscar dados no pePI (executar em thread para não bloquear loop async)
-                    loop = asyncio.get_event_loop()
-                    dados = await loop.run_in_executor(
-                        None,
-                        pepi_scraper.buscar_processo_e_extrair_dados,
-                        numero_processo
-                    )
-                    
-                    # Verificar se é figurativa
-                    if dados.get('tipo') == 'figurativa':
-                        total_figurativas += 1
-                        logger.warning(f"⏭️  Pulando processo {numero_processo} (figurativa)")
-                        continue
-                    
-                    # Atualizar no MongoDB se encontrou dados
-                    updates = {}
-                    if dados.get('marca'):
-                        updates['marca'] = dados['marca']
-                        logger.info(f"  ✅ MARCA: {dados['marca']}")
-                    if dados.get('email'):
-                        updates['email'] = dados['email']  
-                        logger.info(f"  ✅ EMAIL: {dados['email']}")
-                    
-                    if updates:
-                        await self.db.processos_indeferimento.update_one(
-                            {"numero_processo": numero_processo, "execucao_id": execucao_id},
-                            {"$set": updates}
-                        )
-                        total_com_dados += 1
-                        logger.info(f"  💾 Dados salvos no MongoDB")
-                    else:
-                        logger.warning(f"  ⚠️  Nenhum dado extraído para {numero_processo}")
-                        
-                except Exception as e:
-                    logger.error(f"❌ Erro ao processar {numero_processo}: {str(e)}")
-                
-                # Delay entre processos
-                await asyncio.sleep(2)
+            # 6. Opcional: marcas/titulares parecidos com processos de execuções anteriores
+            total_com_similares = None
+            if SIMILARIDADE_ATIVA:
+                publicar(execucao_id, TIPO_ETAPA, etapa='similaridade')
+                with medir('similaridade', resumo):
+                    total_com_similares = await marcar_similares(self.db, execucao_id)
+                await invalidar_cache(self.db, execucao_id, lista=False)
             
             logger.info(f"\n{'='*80}")
             logger.info(f"📊 RESUMO FINAL:")
             logger.info(f"  Total processados: {len(processos_sem_procurador)}")
-            logger.info(f"  Figurativas (puladas): {total_figurativas}")
-            logger.info(f"  Com MARCA/EMAIL extraídos: {total_com_dados}")
+            logger.info(f"  Consultas ao pePI: {estatisticas['total_consultas_pepi']}")
+            logger.info(f"  Emails reaproveitados (histórico/titular): {estatisticas['total_emails_reutilizados']}")
+            logger.info(f"  Suprimidos (descadastrados/contatados): {estatisticas['total_suprimidos']}")
+            logger.info(f"  Figurativas pelo XML: {contagem['figurativas_xml']} (sessões de navegador evitadas: {sessoes_evitadas})")
+            logger.info(f"  Figurativas no pePI (puladas): {estatisticas['total_figurativas']}")
+            if estatisticas['orcamento_esgotado']:
+                logger.info(f"  Sem consulta (orçamento de {estatisticas['orcamento_esgotado']} esgotado): {estatisticas['total_nao_consultados']}")
+            logger.info(f"  Com MARCA/EMAIL extraídos: {estatisticas['total_com_dados']}")
+            logger.info(f"  Retentativas: {estatisticas['total_retentativas']}")
+            logger.info(f"  Falhas definitivas: {estatisticas['total_falhas']}")
             logger.info(f"{'='*80}\n")
             
-            # 6. Atualizar execução como concluída
+            # 7. Atualizar execução como concluída
+            totais = {
+                "total_processos": len(processos_sem_procurador),
+                "total_com_procurador": contagem['com_procurador'],
+                "total_sem_procurador": len(processos_sem_procurador),
+                "total_retentativas": estatisticas['total_retentativas'],
+                "total_falhas_enriquecimento": estatisticas['total_falhas'],
+                "total_consultas_pepi": estatisticas['total_consultas_pepi'],
+                "total_emails_reutilizados": estatisticas['total_emails_reutilizados'],
+                "total_suprimidos": estatisticas['total_suprimidos'],
+                "total_com_similares": total_com_similares,
+                "total_nao_consultados": estatisticas['total_nao_consultados'],
+                "sessoes_evitadas": sessoes_evitadas,
+                "total_figurativas_pepi": estatisticas['total_figurativas'],
+                "orcamento_esgotado": estatisticas['orcamento_esgotado'],
+            }
             await self.db.execucoes.update_one(
                 {"id": execucao_id},
-                {"$set": {
-                    "status": "concluido",
-                    "total_processos": len(processos_sem_procurador),
-                    "total_com_procurador": len(processos_com_procurador),
-                    "total_sem_procurador": len(processos_sem_procurador)
-                }}
+                {"$set": {"status": "concluido", **totais, "metricas_etapas": resumo.como_documento()}}
             )
+            await materializado.atualizar_execucao(status="concluido", **totais)
+            await invalidar_cache(self.db, execucao_id)
+            publicar(execucao_id, TIPO_STATUS, status="concluido", **totais)
             
             logger.info(f"Scraping concluído com sucesso - {len(processos_sem_procurador)} processos SEM procurador salvos")
             
+            # 8. Descadastros de terceiro interessado, em lote e fora do enriquecimento
+            try:
+                await descadastrar_pendentes(self.db)
+            except Exception as e:
+                logger.error(f"Erro nos descadastros pendentes (nova tentativa no scheduler): {str(e)}")
+            
+            # Resumo dos leads encontrados: um único email por execução
+            async for lead in self.db.processos_indeferimento.find(
+                {"execucao_id": execucao_id, "email": {"$ne": None}, "suprimido_motivo": {"$exists": False}},
+                {"_id": 0, "numero_processo": 1, "marca": 1, "titular": 1, "email": 1}
+            ):
+                adicionar_ao_resumo(
+                    f"📬 Leads da revista {numero_revista}",
+                    f"{lead['numero_processo']} | {lead.get('marca')} | {lead.get('titular') or '-'} | {lead['email']}"
+                )
+            
+        except asyncio.CancelledError:
+            # Scheduler parado (ver scheduler.stop_scheduler): a revista fica livre para o novo líder
+            logger.warning(f"Scraping cancelado - Execução ID: {execucao_id}")
+            await self.db.execucoes.update_one(
+                {"id": execucao_id},
+                {"$set": {
+                    "status": "erro",
+                    "mensagem_erro": MENSAGEM_CANCELADA,
+                    "metricas_etapas": resumo.como_documento()
+                }}
+            )
+            await materializado.atualizar_execucao(status="erro", mensagem_erro=MENSAGEM_CANCELADA)
+            await invalidar_cache(self.db, execucao_id)
+            publicar(execucao_id, TIPO_STATUS, status="erro", mensagem_erro=MENSAGEM_CANCELADA)
+            raise
+            
         except Exception as e:
             error_msg = str(e)
             logger.error(f"Erro durante scraping: {error_msg}")
@@ -265,9 +819,13 @@ Processando dados..."""
                 {"id": execucao_id},
                 {"$set": {
                     "status": "erro",
-                    "mensagem_erro": error_msg
+                    "mensagem_erro": error_msg,
+                    "metricas_etapas": resumo.como_documento()
                 }}
             )
+            await materializado.atualizar_execucao(status="erro", mensagem_erro=error_msg)
+            await invalidar_cache(self.db, execucao_id)
+            publicar(execucao_id, TIPO_STATUS, status="erro", mensagem_erro=error_msg)
             
             # Enviar email de erro
             enviar_email_notificacao(
@@ -276,4 +834,9 @@ Processando dados..."""
                 
 Data: {now.strftime('%d/%m/%Y %H:%M:%S')}
 Erro: {error_msg}"""
-            )
\ No newline at end of file
+            )
+        
+        finally:
+            heartbeat.cancel()
+            # Entrega a caixa de saída antes de o loop da execução (ex.: scheduler) terminar
+            await enviar_emails_pendentes()
\ No newline at end of file
@@ -0,0 +1,117 @@
+"""
+Eleição de líder por lease no MongoDB para o scheduler.
+
+Várias réplicas/workers da API podem rodar ao mesmo tempo, mas só o líder roda o
+scheduler (verificação de revista e scraping de terça-feira). O lease é um
+documento em lideranca ({_id: nome, dono, expira_em}):
+  - a cada LIDERANCA_RENOVACAO_S cada instância tenta assumir/renovar: só consegue
+    se já for a dona ou se o lease expirou (upsert falha com DuplicateKeyError
+    quando outra instância é dona)
+  - se o líder morre, o lease expira em LIDERANCA_TTL_S e outra instância assume
+  - se o líder não consegue renovar até o lease expirar (ex.: MongoDB fora), ele
+    para o scheduler antes que outra instância possa assumir
+  - no desligamento normal o lease é liberado na hora (failover imediato)
+"""
+from datetime import datetime, timedelta, timezone
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+LIDERANCA_TTL_S = float(os.environ.get('LIDERANCA_TTL_S', '30'))
+LIDERANCA_RENOVACAO_S = float(os.environ.get('LIDERANCA_RENOVACAO_S', str(LIDERANCA_TTL_S / 3)))
+
+LEASE_SCHEDULER = 'scheduler'
+
+
+def identificar_instancia() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class Lideranca:
+    """Lease de liderança; ao_assumir/ao_perder são funções síncronas (rodam em thread)"""
+
+    def __init__(self, db, nome: str = LEASE_SCHEDULER, ao_assumir=None, ao_perder=None,
+                 ttl_s: float = LIDERANCA_TTL_S, renovacao_s: float = LIDERANCA_RENOVACAO_S):
+        self.db = db
+        self.nome = nome
+        self.instancia = identificar_instancia()
+        self.ao_assumir = ao_assumir
+        self.ao_perder = ao_perder
+        self.ttl_s = ttl_s
+        self.renovacao_s = renovacao_s
+        self.lider = False
+        # Prazo local (relógio monotônico) até o qual o lease renovado vale
+        self._valido_ate = 0.0
+
+    def eh_lider(self) -> bool:
+        return self.lider and time.monotonic() < self._valido_ate
+
+    async def tentar_assumir(self) -> bool:
+        agora = datetime.now(timezone.utc)
+        inicio = time.monotonic()
+        try:
+            await self.db.lideranca.find_one_and_update(
+                {"_id": self.nome, "$or": [{"dono": self.instancia}, {"expira_em": {"$lt": agora}}]},
+                {"$set": {
+                    "dono": self.instancia,
+                    "expira_em": agora + timedelta(seconds=self.ttl_s),
+                    "renovado_em": agora
+                }},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # Lease válido de outra instância
+            return False
+        self._valido_ate = inicio + self.ttl_s
+        return True
+
+    async def _mudar(self, lider: bool):
+        if lider == self.lider:
+            return
+        self.lider = lider
+        if lider:
+            logger.info(f"👑 {self.instancia} assumiu a liderança ({self.nome})")
+            callback = self.ao_assumir
+        else:
+            logger.warning(f"{self.instancia} perdeu a liderança ({self.nome})")
+            callback = self.ao_perder
+        if callback:
+            await asyncio.get_running_loop().run_in_executor(None, callback)
+
+    async def executar(self):
+        """Loop de renovação (rodar como tarefa; cancelar no desligamento)"""
+        while True:
+            try:
+                lider = await self.tentar_assumir()
+            except PyMongoError as e:
+                logger.warning(f"Falha ao renovar liderança: {str(e)}")
+                # Sem renovação, o lease continua valendo só até expirar
+                lider = self.lider and time.monotonic() < self._valido_ate
+            await self._mudar(lider)
+            await asyncio.sleep(self.renovacao_s)
+
+    async def liberar(self):
+        """Libera o lease (desligamento normal) para outra instância assumir já"""
+        if self.lider:
+            await self._mudar(False)
+        try:
+            await self.db.lideranca.delete_one({"_id": self.nome, "dono": self.instancia})
+        except PyMongoError as e:
+            logger.warning(f"Falha ao liberar liderança: {str(e)}")
+
+    async def estado(self) -> dict:
+        documento = await self.db.lideranca.find_one({"_id": self.nome}) or {}
+        return {
+            "nome": self.nome,
+            "instancia": self.instancia,
+            "lider": self.eh_lider(),
+            "dono_atual": documento.get('dono'),
+            "expira_em": documento.get('expira_em')
+        }
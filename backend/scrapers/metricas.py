@@ -0,0 +1,96 @@
+from prometheus_client import Histogram
+from contextlib import contextmanager
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Etapas do pipeline: revista, download_zip, parse_xml, insert_mongo,
+# browser_launch, login, pesquisa, detalhe, peticoes, captcha,
+# download_pdf, parse_pdf, descadastro
+DURACAO_ETAPA = Histogram(
+    'inpi_etapa_duracao_segundos',
+    'Duração de cada etapa do pipeline de scraping',
+    ['etapa'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+)
+
+BYTES_ETAPA = Histogram(
+    'inpi_etapa_bytes',
+    'Bytes transferidos pelo navegador em cada etapa do pePI',
+    ['etapa'],
+    buckets=(1e3, 1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6, 1e7)
+)
+
+
+class ResumoEtapas:
+    """Acumula as durações das etapas de uma execução (seguro entre threads)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._etapas = {}
+
+    def registrar(self, etapa: str, duracao: float, bytes_transferidos: int = None):
+        with self._lock:
+            item = self._etapas.setdefault(etapa, {'quantidade': 0, 'total_s': 0.0, 'max_s': 0.0})
+            item['quantidade'] += 1
+            item['total_s'] += duracao
+            item['max_s'] = max(item['max_s'], duracao)
+            if bytes_transferidos is not None:
+                item['bytes'] = item.get('bytes', 0) + bytes_transferidos
+
+    def como_documento(self) -> dict:
+        """Resumo por etapa para gravar no documento da execução"""
+        with self._lock:
+            documento = {}
+            for etapa, item in self._etapas.items():
+                documento[etapa] = {
+                    'quantidade': item['quantidade'],
+                    'total_s': round(item['total_s'], 3),
+                    'media_s': round(item['total_s'] / item['quantidade'], 3),
+                    'max_s': round(item['max_s'], 3)
+                }
+                if 'bytes' in item:
+                    documento[etapa]['media_bytes'] = item['bytes'] // item['quantidade']
+            return documento
+
+
+def registrar_etapa(etapa: str, duracao: float, resumo: ResumoEtapas = None, bytes_transferidos: int = None):
+    DURACAO_ETAPA.labels(etapa).observe(duracao)
+    if bytes_transferidos is not None:
+        BYTES_ETAPA.labels(etapa).observe(bytes_transferidos)
+    if resumo is not None:
+        resumo.registrar(etapa, duracao, bytes_transferidos)
+
+
+@contextmanager
+def medir(etapa: str, resumo: ResumoEtapas = None):
+    """Mede a duração do bloco (funciona em código síncrono e dentro de corrotinas)"""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar_etapa(etapa, time.perf_counter() - inicio, resumo)
+
+
+class Cronometro:
+    """Mede etapas sequenciais: cada marcar() registra o tempo desde a marca anterior
+
+    Com um medidor (scrapers.navegador.MedidorTrafego) registra também os bytes
+    transferidos na etapa.
+    """
+
+    def __init__(self, resumo: ResumoEtapas = None, medidor=None):
+        self.resumo = resumo
+        self.medidor = medidor
+        self._ultima_marca = time.perf_counter()
+
+    def reiniciar(self):
+        self._ultima_marca = time.perf_counter()
+
+    def marcar(self, etapa: str):
+        agora = time.perf_counter()
+        bytes_transferidos = self.medidor.consumir() if self.medidor else None
+        registrar_etapa(etapa, agora - self._ultima_marca, self.resumo, bytes_transferidos)
+        self._ultima_marca = agora
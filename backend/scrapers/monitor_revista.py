@@ -0,0 +1,151 @@
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+import asyncio
+import logging
+import os
+import re
+import threading
+import requests
+from .inpi_scraper import extrair_revistas
+from .backfill import TIPO_BACKFILL
+from .cache import invalidar as invalidar_cache
+from .resumo_execucao import ID_RESUMO
+
+logger = logging.getLogger(__name__)
+
+# Intervalo entre verificações da página de revistas (minutos)
+INTERVALO_MINUTOS = int(os.environ.get('INPI_POLL_MINUTOS', '5'))
+# Execução 'processando' sem heartbeat por esse tempo foi interrompida (crash, deploy)
+EXECUCAO_ABANDONADA_MINUTOS = float(os.environ.get('INPI_EXECUCAO_ABANDONADA_MINUTOS', '30'))
+
+MENSAGEM_INTERROMPIDA = 'Execução interrompida (sem heartbeat)'
+
+TAMANHO_BLOCO = 16 * 1024
+LINHA_TABELA = re.compile(r'<tr[^>]*>.*?</tr>', re.IGNORECASE | re.DOTALL)
+
+
+def _ultima_atividade(execucao: dict) -> datetime:
+    """heartbeat_em ou, em execuções sem ele, o início (data_execucao)"""
+    momento = execucao.get('heartbeat_em') or datetime.fromisoformat(execucao['data_execucao'])
+    # O MongoDB devolve datas sem fuso (UTC)
+    return momento if momento.tzinfo else momento.replace(tzinfo=timezone.utc)
+
+
+class MonitorRevista:
+    """Detecta nova edição da RPI com uma requisição barata à página de revistas
+
+    Usa GET condicional (ETag / Last-Modified) e, quando a página mudou, lê o corpo
+    em streaming só até a primeira linha da tabela com XML de marcas. O scraping só
+    é disparado quando aparece um número de revista ainda não processado.
+    """
+
+    def __init__(self, scraper):
+        self.scraper = scraper
+        self.db = scraper.db
+        self.base_url = scraper.base_url
+        self.etag = None
+        self.last_modified = None
+        self._lock = threading.Lock()
+
+    def buscar_primeira_revista(self, condicional: bool = True) -> Optional[dict]:
+        """Primeira edição da página, ou None se a página não mudou (304) / sem XML"""
+        headers = {}
+        if condicional and self.etag:
+            headers['If-None-Match'] = self.etag
+        if condicional and self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+
+        with requests.get(self.base_url, headers=headers, timeout=30, stream=True) as response:
+            if response.status_code == 304:
+                logger.debug("Página de revistas sem alterações (304)")
+                return None
+            response.raise_for_status()
+
+            self.etag = response.headers.get('ETag')
+            self.last_modified = response.headers.get('Last-Modified')
+
+            conteudo = ''
+            inicio_busca = 0
+            for bloco in response.iter_content(TAMANHO_BLOCO, decode_unicode=True):
+                if isinstance(bloco, bytes):
+                    bloco = bloco.decode(response.encoding or 'utf-8', errors='replace')
+                conteudo += bloco
+
+                for linha in LINHA_TABELA.finditer(conteudo, inicio_busca):
+                    revistas = extrair_revistas(f"<table>{linha.group(0)}</table>", self.base_url)
+                    if revistas:
+                        return revistas[0]
+                    inicio_busca = linha.end()
+
+        return None
+
+    async def revista_ja_processada(self, numero_revista: str, xml_url: str = None) -> bool:
+        """Revista com execução concluída ou em andamento
+        
+        'processando' só conta com heartbeat recente: execução sem heartbeat há
+        EXECUCAO_ABANDONADA_MINUTOS é marcada como erro e a revista volta a ser
+        processada. Execuções anteriores ao campo numero_revista casam pelo xml_url.
+        Execuções do backfill não contam: só gravam os processos, sem enriquecimento.
+        """
+        filtro = {"numero_revista": numero_revista}
+        if xml_url:
+            filtro = {"$or": [filtro, {"numero_revista": {"$exists": False}, "xml_url": xml_url}]}
+        execucoes = await self.db.execucoes.find(
+            {**filtro, "status": {"$in": ["processando", "concluido"]}, "tipo": {"$ne": TIPO_BACKFILL}},
+            {"_id": 0, "id": 1, "status": 1, "heartbeat_em": 1, "data_execucao": 1}
+        ).to_list(None)
+        limite = datetime.now(timezone.utc) - timedelta(minutes=EXECUCAO_ABANDONADA_MINUTOS)
+        processada = False
+        for execucao in execucoes:
+            if execucao['status'] == 'concluido' or _ultima_atividade(execucao) >= limite:
+                processada = True
+            else:
+                await self._marcar_interrompida(execucao['id'])
+        return processada
+
+    async def _marcar_interrompida(self, execucao_id: str):
+        resultado = await self.db.execucoes.update_one(
+            {"id": execucao_id, "status": "processando"},
+            {"$set": {"status": "erro", "mensagem_erro": MENSAGEM_INTERROMPIDA}}
+        )
+        if not resultado.modified_count:
+            return
+        logger.warning(f"Execução {execucao_id} sem heartbeat há {EXECUCAO_ABANDONADA_MINUTOS:.0f} min: marcada como erro")
+        await self.db.resumo_execucoes.update_one(
+            {"_id": ID_RESUMO, "execucao.id": execucao_id},
+            {"$set": {"execucao.status": "erro", "execucao.mensagem_erro": MENSAGEM_INTERROMPIDA},
+             "$inc": {"versao": 1}}
+        )
+        await invalidar_cache(self.db, execucao_id)
+
+    async def verificar(self, condicional: bool = True) -> bool:
+        """Verifica a página e dispara o scraping se houver revista nova. Retorna se disparou.
+        
+        condicional=False ignora ETag/Last-Modified (usado pelo job semanal de segurança,
+        que também recupera uma revista cuja execução falhou)
+        """
+        # Poll e job semanal podem coincidir: só uma verificação por vez
+        if not self._lock.acquire(blocking=False):
+            logger.info("Verificação de revista já em andamento")
+            return False
+
+        try:
+            loop = asyncio.get_event_loop()
+            revista = await loop.run_in_executor(None, self.buscar_primeira_revista, condicional)
+            if not revista:
+                return False
+
+            numero_revista = revista['numero_revista']
+            if await self.revista_ja_processada(numero_revista, revista['xml_url']):
+                logger.debug(f"Revista {numero_revista} já processada")
+                return False
+
+            logger.info(f"🆕 Nova revista detectada: {numero_revista} - iniciando scraping")
+            await self.scraper.executar_scraping((revista['xml_url'], numero_revista))
+            return True
+
+        except Exception as e:
+            logger.error(f"Erro ao verificar nova revista: {str(e)}")
+            return False
+        finally:
+            self._lock.release()
@@ -0,0 +1,119 @@
+import logging
+import os
+import threading
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Perfil enxuto: bloqueia imagens/fontes/mídia/terceiros e usa viewport pequeno
+PERFIL_ENXUTO = os.environ.get('PEPI_PERFIL_ENXUTO', '1') == '1'
+# Contabiliza bytes transferidos por etapa (custa uma chamada extra por requisição)
+MEDIR_TRAFEGO = os.environ.get('PEPI_MEDIR_TRAFEGO', '0') == '1'
+
+VIEWPORT_COMPLETO = {'width': 1920, 'height': 1080}
+VIEWPORT_ENXUTO = {'width': 1024, 'height': 768}
+
+ARGS_BASE = ['--no-sandbox', '--disable-setuid-sandbox', '--disable-dev-shm-usage']
+ARGS_ENXUTO = [
+    '--disable-extensions',
+    '--disable-background-networking',
+    '--disable-component-update',
+    '--disable-default-apps',
+    '--disable-sync',
+    '--no-first-run',
+    '--mute-audio',
+]
+
+TIPOS_BLOQUEADOS = {'image', 'font', 'media'}
+
+# Hosts de terceiros necessários: frames e scripts do reCAPTCHA
+HOSTS_PERMITIDOS = ('www.google.com', 'www.gstatic.com', 'recaptcha.net', 'www.recaptcha.net')
+
+# Imagens que os seletores usam (ícone do PDF das petições)
+IMAGENS_PERMITIDAS = ('pdf.gif',)
+
+
+def argumentos_chromium(enxuto: bool = PERFIL_ENXUTO) -> list:
+    return ARGS_BASE + (ARGS_ENXUTO if enxuto else [])
+
+
+def _host_permitido(host: str) -> bool:
+    """Host da lista ou subdomínio dele (evilwww.google.com não passa)"""
+    return any(host == permitido or host.endswith('.' + permitido) for permitido in HOSTS_PERMITIDOS)
+
+
+def _deve_bloquear(request, host_pepi: str) -> bool:
+    host = urlparse(request.url).hostname or ''
+
+    if host != host_pepi and not _host_permitido(host):
+        # Downloads e navegações do documento principal nunca são bloqueados
+        return request.resource_type != 'document'
+
+    if request.resource_type in TIPOS_BLOQUEADOS:
+        return not any(nome in request.url for nome in IMAGENS_PERMITIDAS)
+
+    return False
+
+
+def criar_contexto(browser, base_url: str, enxuto: bool = PERFIL_ENXUTO, estado_sessao: dict = None):
+    """Cria contexto novo; no perfil enxuto intercepta requisições
+
+    Sem `estado_sessao` o contexto começa sem cookies; com ele (storage_state de um
+    login anterior da mesma conta, ver contas_pepi.py) a sessão é retomada.
+    """
+    context = browser.new_context(
+        viewport=VIEWPORT_ENXUTO if enxuto else VIEWPORT_COMPLETO,
+        ignore_https_errors=True,
+        storage_state=estado_sessao
+    )
+
+    if enxuto:
+        host_pepi = urlparse(base_url).hostname
+
+        def interceptar(route):
+            if _deve_bloquear(route.request, host_pepi):
+                route.abort()
+            else:
+                route.continue_()
+
+        context.route('**/*', interceptar)
+
+    return context
+
+
+def estado_carregamento(enxuto: bool = PERFIL_ENXUTO) -> str:
+    """Estado de carregamento a aguardar nas navegações simples (login, pesquisa, detalhes)"""
+    return 'domcontentloaded' if enxuto else 'networkidle'
+
+
+class MedidorTrafego:
+    """Soma os bytes (corpo + cabeçalhos) das respostas recebidas por uma página"""
+
+    def __init__(self, page):
+        self._lock = threading.Lock()
+        self.bytes_total = 0
+        self.requisicoes = 0
+        self.bloqueadas = 0
+        page.on('requestfinished', self._ao_finalizar)
+        page.on('requestfailed', self._ao_falhar)
+
+    def _ao_finalizar(self, request):
+        try:
+            tamanhos = request.sizes()
+            recebidos = tamanhos.get('responseBodySize', 0) + tamanhos.get('responseHeadersSize', 0)
+        except Exception:
+            recebidos = 0
+        with self._lock:
+            self.bytes_total += max(recebidos, 0)
+            self.requisicoes += 1
+
+    def _ao_falhar(self, request):
+        with self._lock:
+            self.bloqueadas += 1
+
+    def consumir(self) -> int:
+        """Bytes desde a última chamada"""
+        with self._lock:
+            total = self.bytes_total
+            self.bytes_total = 0
+            return total
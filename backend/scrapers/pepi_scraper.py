@@ -5,16 +5,35 @@ import re
 from PyPDF2 import PdfReader
 import io
 import os
+import requests
 from capmonster_python import CapmonsterClient, RecaptchaV2Task
+from .resiliencia import (
+    FalhaPepi, classificar_excecao,
+    FALHA_LOGIN, FALHA_CAPTCHA, FALHA_NAO_ENCONTRADO, FALHA_DESCONHECIDA
+)
+from .metricas import Cronometro
+from .contas_pepi import obter_pool, SemContaDisponivel, REUSAR_SESSAO
+from .descadastro import DESCADASTRO_SEM_LINK, DESCADASTRO_SEM_DESATIVACAO
+from . import navegador
+from .extracao_html import extrair_dados_detalhe, eh_figurativa
 
 logger = logging.getLogger(__name__)
 
 class PepiScraper:
-    def __init__(self):
-        self.login_user = "InHandsC"
-        self.login_pass = "Marcas01"
-        self.base_url = "https://busca.inpi.gov.br/pePI/"
+    def __init__(self, resumo=None, contas=None):
+        # Contas de login emprestadas a cada consulta (scrapers.contas_pepi)
+        self.contas = contas or obter_pool()
+        self.base_url = os.environ.get('PEPI_BASE_URL', "https://busca.inpi.gov.br/pePI/")
         self.capmonster_api_key = os.environ.get('CAPMONSTER_API_KEY', 'feeda35a6d124c535a42e3b2ff997bc6')
+        # Resolvedor alternativo compatível (ex.: servidor mock do benchmark)
+        self.captcha_solver_url = os.environ.get('CAPTCHA_SOLVER_URL')
+        self.chromium_path = os.environ.get(
+            'CHROMIUM_EXECUTABLE_PATH',
+            '/pw-browsers/chromium_headless_shell-1187/chrome-linux/headless_shell'
+        )
+        # Resumo de tempos por etapa da execução corrente (scrapers.metricas.ResumoEtapas)
+        self.resumo = resumo
+        self.perfil_enxuto = navegador.PERFIL_ENXUTO
     
     def extrair_dados_de_pdf(self, pdf_content: bytes) -> dict:
         """Extrai marca (Elemento Nominativo) e email do PDF"""
@@ -113,76 +132,118 @@ class PepiScraper:
             logger.error(f"Erro ao extrair dados do PDF: {str(e)}")
             return {'marca': None, 'email': None}
     
-    def _descadastrar_processo(self, page, numero_processo):
-        """Descadastra o processo clicando em Listagem de Terceiros Interessados Habilitados"""
+    def _descadastrar_processo(self, page, numero_processo, carregamento):
+        """Descadastra o processo clicando em Listagem de Terceiros Interessados Habilitados
+        
+        A página de detalhes do processo deve estar aberta. Retorna None se
+        descadastrou ou o motivo da falha (ver scrapers.descadastro).
+        """
+        # Procurar o link "Listagem de Terceiros Interessados Habilitados"
+        link_descadastrar = page.locator('a:has-text("Listagem de Terceiros Interessados Habilitados")').first
+        
+        if link_descadastrar.count() == 0:
+            logger.warning(f"  ⚠️  {numero_processo}: link de descadastramento não encontrado")
+            return DESCADASTRO_SEM_LINK
+        
+        # O link abre um popup
+        with page.expect_popup(timeout=5000) as popup_info:
+            link_descadastrar.click()
+        
+        popup_page = popup_info.value
         try:
-            # Procurar o link "Listagem de Terceiros Interessados Habilitados"
-            link_descadastrar = page.locator('a:has-text("Listagem de Terceiros Interessados Habilitados")').first
-            
-            if link_descadastrar.count() == 0:
-                logger.warning("  ⚠️  Link de descadastramento não encontrado")
-                return
-            
-            logger.info("  🔗 Link de descadastramento encontrado - clicando...")
-            
-            # O link abre um popup
-            with page.expect_popup(timeout=5000) as popup_info:
-                link_descadastrar.click()
-            
-            popup_page = popup_info.value
-            popup_page.wait_for_load_state("networkidle", timeout=10000)
-            logger.info("  📋 Popup de terceiros aberto")
+            popup_page.wait_for_load_state(carregamento, timeout=10000)
             
             # Procurar link de desativação (coluna "Solicitar Desativação")
             # O link é: <a href="...Action=DesativarAmploAcesso..."><font color="red">[X]</font></a>
             link_desativar = popup_page.locator('a[href*="DesativarAmploAcesso"]').first
+            if link_desativar.count() == 0:
+                logger.warning(f"  ⚠️  {numero_processo}: link [X] de desativação não encontrado no popup")
+                return DESCADASTRO_SEM_DESATIVACAO
             
-            botao_descadastrar = None
-            if link_desativar.count() > 0:
-                botao_descadastrar = link_desativar
-                logger.info(f"  ✅ Link [X] de desativação encontrado")
-            
-            if botao_descadastrar:
-                botao_descadastrar.click()
-                time.sleep(1)
-                logger.info(f"  ✅ Processo {numero_processo} descadastrado com sucesso!")
-                popup_page.close()
-            else:
-                logger.warning("  ⚠️  Botão de descadastramento não encontrado no popup")
-                # Salvar HTML para debug
-                with open(f"/tmp/popup_descadastrar_{numero_processo}.html", "w") as f:
-                    f.write(popup_page.content())
-                logger.info(f"  📄 HTML do popup salvo em: /tmp/popup_descadastrar_{numero_processo}.html")
-                popup_page.close()
+            link_desativar.click()
+            time.sleep(1)
+            logger.info(f"  ✅ Processo {numero_processo} descadastrado com sucesso!")
+            return None
+        finally:
+            popup_page.close()
+    
+    def descadastrar_lote(self, usuario: str, numeros: list) -> dict:
+        """Descadastra os processos com a conta `usuario` numa única sessão do pePI
+        
+        Retorna {numero_processo: None (descadastrado) ou motivo da falha}; uma falha
+        da sessão (navegador, login) vale para os processos que faltavam.
+        """
+        try:
+            conta = self.contas.emprestar(usuario=usuario)
+        except SemContaDisponivel as e:
+            logger.error(f"Descadastro: {str(e)}")
+            return {numero: FALHA_LOGIN for numero in numeros}
+        
+        resultados = {}
+        falha_sessao = None
+        cronometro = Cronometro(self.resumo)
+        try:
+            with sync_playwright() as p:
+                browser = p.chromium.launch(
+                    headless=True,
+                    executable_path=self.chromium_path,
+                    args=navegador.argumentos_chromium(self.perfil_enxuto)
+                )
+                context = navegador.criar_contexto(browser, self.base_url, self.perfil_enxuto)
+                page = context.new_page()
+                carregamento = navegador.estado_carregamento(self.perfil_enxuto)
+                
+                self._entrar(page, conta, carregamento)
+                self.contas.registrar_login(conta, reaproveitada=False)
+                cronometro.marcar('login')
+                
+                for numero_processo in numeros:
+                    try:
+                        page.goto(f"{self.base_url}jsp/marcas/Pesquisa_num_processo.jsp", timeout=60000)
+                        page.wait_for_load_state(carregamento)
+                        page.fill('input[name="NumPedido"]', numero_processo)
+                        page.click('input[type="submit"][name="botao"]')
+                        page.wait_for_load_state(carregamento)
+                        
+                        detail_link = page.locator('a[href*="Action=detail"]').first
+                        if detail_link.count() == 0:
+                            resultados[numero_processo] = FALHA_NAO_ENCONTRADO
+                            continue
+                        detail_link.click()
+                        page.wait_for_load_state(carregamento)
+                        
+                        resultados[numero_processo] = self._descadastrar_processo(page, numero_processo, carregamento)
+                    except Exception as e:
+                        resultados[numero_processo] = classificar_excecao(e)
+                        logger.warning(f"  ⚠️  Erro ao descadastrar {numero_processo}: {str(e)}")
+                    cronometro.marcar('descadastro')
                 
+                browser.close()
         except Exception as e:
-            logger.warning(f"  ⚠️  Erro ao descadastrar processo: {str(e)}")
+            falha_sessao = classificar_excecao(e)
+            logger.error(f"Sessão de descadastro da conta {usuario} falhou ({falha_sessao}): {str(e)}")
+        finally:
+            self.contas.devolver(conta, falha_sessao)
+        
+        return {numero: resultados.get(numero, falha_sessao or FALHA_DESCONHECIDA) for numero in numeros}
     
-    def _procurar_pdf_389_394(self, page):
-        """Procura PDF com Serviço 389 ou 394 na tabela"""
+    def _procurar_pdf_389_394(self, page, dados_detalhe: dict = None):
+        """Procura PDF com Serviço 389 ou 394 na tabela de petições
+        
+        Lê a página inteira em um único page.content() e analisa as linhas em Python;
+        só o ícone escolhido volta a ser referenciado no navegador.
+        """
         try:
-            all_rows = page.locator('table tr').all()
-            logger.info(f"  📊 Total de linhas na tabela: {len(all_rows)}")
+            if dados_detalhe is None:
+                dados_detalhe = extrair_dados_detalhe(page.content())
             
-            for row in all_rows:
-                try:
-                    cells = row.locator('td').all()
-                    row_text = " ".join([c.inner_text().strip() for c in cells])
-                    
-                    if '389' in row_text or '394' in row_text:
-                        codigo_encontrado = '389' if '389' in row_text else '394'
-                        logger.info(f"  🔍 Linha com código {codigo_encontrado} encontrada")
-                        
-                        pdf_in_row = row.locator('img[src*="pdf.gif"]')
-                        
-                        if pdf_in_row.count() > 0:
-                            logger.info(f"  ✅ Encontrado ícone PDF na linha com Serviço {codigo_encontrado}!")
-                            return pdf_in_row.first
-                        else:
-                            logger.warning(f"  ⚠️  Linha tem {codigo_encontrado} mas não encontrou ícone PDF")
-                except:
-                    continue
+            pdf = dados_detalhe['pdf_servico']
+            if pdf:
+                logger.info(f"  ✅ Encontrado ícone PDF na linha com Serviço {pdf['servico']}!")
+                return page.locator('img[src*="pdf.gif"]').nth(pdf['indice_pdf'])
             
+            for codigo in dados_detalhe['servicos_encontrados']:
+                logger.warning(f"  ⚠️  Linha tem {codigo} mas não encontrou ícone PDF")
             return None
         except Exception as e:
             logger.error(f"  ❌ Erro ao procurar PDF: {str(e)}")
@@ -196,6 +257,18 @@ class PepiScraper:
         try:
             logger.info(f"Resolvendo reCAPTCHA com site_key: {site_key}")
             
+            if self.captcha_solver_url:
+                response = requests.post(
+                    self.captcha_solver_url,
+                    json={'websiteURL': page_url, 'websiteKey': site_key},
+                    timeout=120
+                )
+                response.raise_for_status()
+                token = response.json().get('gRecaptchaResponse')
+                if not token:
+                    raise Exception(f"Token não encontrado na resposta: {response.text}")
+                return token
+            
             # Criar cliente CapMonster
             capmonster = CapmonsterClient(self.capmonster_api_key)
             
@@ -227,125 +300,162 @@ class PepiScraper:
             
         except Exception as e:
             logger.error(f"Erro ao resolver reCAPTCHA: {str(e)}")
-            raise
+            raise FalhaPepi(FALHA_CAPTCHA, f"CapMonster falhou: {str(e)}")
 
     def buscar_processo_e_extrair_dados(self, numero_processo: str) -> dict:
         """
         Faz login no pePI, busca o processo, resolve CAPTCHA e extrai marca e email do PDF
         Retorna: {'marca': str, 'email': str}
+        Em caso de falha inclui 'falha' com o tipo (ver scrapers.resiliencia)
+        
+        A conta de login é emprestada do pool (espera se todas estiverem ocupadas ou
+        pausadas) e devolvida com o resultado, que alimenta as pausas da conta.
         """
+        try:
+            conta = self.contas.emprestar()
+        except SemContaDisponivel as e:
+            logger.error(f"Processo {numero_processo}: {str(e)}")
+            return {'marca': None, 'email': None, 'falha': FALHA_LOGIN}
+        dados = None
+        try:
+            dados = self._consultar(numero_processo, conta)
+            return dados
+        finally:
+            self.contas.devolver(conta, dados.get('falha') if dados is not None else FALHA_DESCONHECIDA)
+    
+    def _entrar(self, page, conta, carregamento):
+        """Login com a conta; levanta FalhaPepi(FALHA_LOGIN) se o pePI recusar"""
+        page.goto(self.base_url, timeout=30000)
+        page.wait_for_load_state(carregamento)
+        
+        page.fill('input[name="T_Login"]', conta.usuario)
+        page.fill('input[name="T_Senha"]', conta.senha)
+        page.click('input[type="submit"]')
+        page.wait_for_load_state(carregamento, timeout=60000)
+        time.sleep(2)
+        
+        # Se o formulário de login continua na página, a sessão foi recusada
+        if page.locator('input[name="T_Login"]').count() > 0:
+            raise FalhaPepi(FALHA_LOGIN, f"pePI devolveu a página de login (conta {conta.usuario})")
+        logger.info(f"Login realizado ({conta.usuario})")
+    
+    def _consultar(self, numero_processo: str, conta) -> dict:
+        cronometro = Cronometro(self.resumo)
         try:
             with sync_playwright() as p:
                 # Iniciar browser com contexto NOVO (sem cookies) para garantir que o link apareça
                 browser = p.chromium.launch(
                     headless=True,
-                    executable_path='/pw-browsers/chromium_headless_shell-1187/chrome-linux/headless_shell',
-                    args=['--no-sandbox', '--disable-setuid-sandbox', '--disable-dev-shm-usage']
-                )
-                # Criar contexto completamente novo (sem cache/cookies)
-                context = browser.new_context(
-                    viewport={'width': 1920, 'height': 1080},
-                    ignore_https_errors=True
+                    executable_path=self.chromium_path,
+                    args=navegador.argumentos_chromium(self.perfil_enxuto)
                 )
+                # Criar contexto completamente novo (sem cache/cookies), ou com os
+                # cookies do último login da conta se a reutilização estiver ligada
+                # No perfil enxuto imagens/fontes/mídia/terceiros são bloqueados
+                sessao = conta.sessao_valida() if REUSAR_SESSAO else None
+                context = navegador.criar_contexto(browser, self.base_url, self.perfil_enxuto, sessao)
                 page = context.new_page()
+                if navegador.MEDIR_TRAFEGO:
+                    cronometro.medidor = navegador.MedidorTrafego(page)
+                cronometro.marcar('browser_launch')
+                
+                # Navegações simples não precisam esperar networkidle no perfil enxuto
+                carregamento = navegador.estado_carregamento(self.perfil_enxuto)
                 
                 logger.info(f"Acessando pePI para processo {numero_processo}")
                 
-                # 1. Acessar página de login
-                page.goto(self.base_url, timeout=30000)
-                page.wait_for_load_state("networkidle")
+                url_pesquisa = f"{self.base_url}jsp/marcas/Pesquisa_num_processo.jsp"
+                if sessao:
+                    # 1. Sessão da conta reaproveitada: direto para a pesquisa
+                    page.goto(url_pesquisa, timeout=60000)
+                    page.wait_for_load_state(carregamento)
+                    if page.locator('input[name="T_Login"]').count() > 0:
+                        logger.info(f"Sessão de {conta.usuario} expirou no pePI - novo login")
+                        conta.descartar_sessao()
+                        sessao = None
                 
-                # 2. Fazer login
-                page.fill('input[name="T_Login"]', self.login_user)
-                page.fill('input[name="T_Senha"]', self.login_pass)
-                page.click('input[type="submit"]')
-                page.wait_for_load_state("networkidle", timeout=60000)
-                time.sleep(2)
-                logger.info("Login realizado")
-                
-                # 3. Ir para Pesquisa de Marcas por número de processo
-                page.goto("https://busca.inpi.gov.br/pePI/jsp/marcas/Pesquisa_num_processo.jsp", timeout=60000)
-                page.wait_for_load_state("networkidle")
+                if not sessao:
+                    # 1-2. Acessar página de login e fazer login
+                    self._entrar(page, conta, carregamento)
+                    if REUSAR_SESSAO:
+                        conta.guardar_sessao(context.storage_state())
+                    
+                    # 3. Ir para Pesquisa de Marcas por número de processo
+                    page.goto(url_pesquisa, timeout=60000)
+                    page.wait_for_load_state(carregamento)
+                self.contas.registrar_login(conta, reaproveitada=bool(sessao))
+                cronometro.marcar('login')
                 time.sleep(1)
                 logger.info("Página de pesquisa carregada")
                 
                 # 4. Preencher número do processo e pesquisar
                 page.fill('input[name="NumPedido"]', numero_processo)
                 page.click('input[type="submit"][name="botao"]')
-                page.wait_for_load_state("networkidle")
+                page.wait_for_load_state(carregamento)
                 time.sleep(2)
                 logger.info(f"Pesquisa realizada para processo {numero_processo}")
+                cronometro.marcar('pesquisa')
                 
                 # 5. Clicar no link dos detalhes do processo
                 detail_link = page.locator('a[href*="Action=detail"]').first
                 if detail_link.count() == 0:
                     logger.warning(f"Processo {numero_processo} não encontrado nos resultados")
                     browser.close()
-                    return {'marca': None, 'email': None}
+                    return {'marca': None, 'email': None, 'falha': FALHA_NAO_ENCONTRADO}
                 
                 detail_link.click()
-                page.wait_for_load_state("networkidle")
+                page.wait_for_load_state(carregamento)
                 time.sleep(2)
                 logger.info("Página de detalhes carregada")
                 
-                # 5.1 EXTRAIR A MARCA diretamente da página de detalhes
-                marca_extraida = None
-                try:
-                    # Procurar pela seção "Marca:" na página
-                    # Formato: <td>Marca:</td> seguido de <td> com o nome
-                    marca_cell = page.locator('td:has-text("Marca:")').first
-                    if marca_cell.count() > 0:
-                        # Pegar a próxima célula (que contém o nome da marca)
-                        parent_row = marca_cell.locator('xpath=..').first  # Pegar o <tr>
-                        cells = parent_row.locator('td').all()
-                        
-                        if len(cells) >= 2:
-                            marca_text = cells[1].inner_text()
-                            marca_extraida = marca_text.strip()
-                            logger.info(f"✅ MARCA extraída da página: {marca_extraida}")
-                except Exception as e:
-                    logger.warning(f"⚠️  Erro ao extrair marca da página: {str(e)}")
+                # 5.1 Snapshot único da página de detalhes: marca, apresentação e petições
+                page_content = page.content()
+                dados_detalhe = extrair_dados_detalhe(page_content)
+                
+                # EXTRAIR A MARCA diretamente da página de detalhes
+                # Formato: <td>Marca:</td> seguido de <td> com o nome
+                marca_extraida = dados_detalhe['marca']
+                if marca_extraida:
+                    logger.info(f"✅ MARCA extraída da página: {marca_extraida}")
                 
                 # 5.2 Verificar se é marca figurativa (se for, pular)
-                page_content = page.content()
-                if 'Figurativa' in page_content:
+                if eh_figurativa(dados_detalhe, page_content):
                     logger.warning(f"⚠️  Processo {numero_processo} é FIGURATIVA - pulando")
                     browser.close()
                     return {'marca': None, 'email': None, 'tipo': 'figurativa'}
                 
                 logger.info("✅ Marca não é figurativa, continuando...")
+                cronometro.marcar('detalhe')
                 
                 # 6. EXPANDIR a seção de Petições (accordion)
                 # O conteúdo está colapsado por padrão!
                 logger.info("📂 Expandindo seção Petições...")
                 try:
-                    # Verificar se já está expandido
-                    accordion_checkbox = page.locator('#accordion-1')
-                    is_checked = accordion_checkbox.is_checked()
-                    
-                    if not is_checked:
+                    # Verificar se já está expandido (estado lido do snapshot)
+                    if not dados_detalhe['peticoes_expandidas']:
                         # Clicar no accordion para abrir
                         accordion_peticoes = page.locator('label[for="accordion-1"]')
                         if accordion_peticoes.count() > 0:
                             accordion_peticoes.click()
                             logger.info("  ✅ Accordion clicado")
+                        
+                        # Aguardar o conteúdo carregar (importante!)
+                        time.sleep(3)
+                        page.wait_for_load_state("networkidle", timeout=10000)
+                        # Página mudou: o snapshot precisa ser refeito
+                        dados_detalhe = None
+                        logger.info("  ✅ Conteúdo carregado")
                     else:
                         logger.info("  ℹ️  Accordion já estava expandido")
                     
-                    # Aguardar o conteúdo carregar (importante!)
-                    time.sleep(3)
-                    page.wait_for_load_state("networkidle", timeout=10000)
-                    logger.info("  ✅ Conteúdo carregado")
-                    
                 except Exception as e:
                     logger.warning(f"  ⚠️  Erro ao expandir: {str(e)}")
                     time.sleep(2)
                 
                 # 6.1 PRIMEIRO: Procurar PDF com Serviço 389/394
-                time.sleep(1)
                 logger.info("🔍 1ª TENTATIVA: Procurando PDF com Serviço 389 ou 394...")
                 
-                pdf_icon_tentativa1 = self._procurar_pdf_389_394(page)
+                pdf_icon_tentativa1 = self._procurar_pdf_389_394(page, dados_detalhe)
                 
                 if pdf_icon_tentativa1:
                     logger.info("✅ PDF 389/394 encontrado na 1ª tentativa!")
@@ -430,6 +540,8 @@ class PepiScraper:
                         browser.close()
                         return {'marca': marca_extraida, 'email': None}
                 
+                cronometro.marcar('peticoes')
+                
                 # 7. Clicar no ícone do PDF encontrado
                 logger.info(f"🖱️  Clicando no PDF escolhido: {pdf_escolhido}")
                 pdf_icon.click()
@@ -463,15 +575,19 @@ class PepiScraper:
                 
                 logger.info("Token do CAPTCHA injetado!")
                 time.sleep(1)
+                cronometro.marcar('captcha')
                 
                 # 11. Clicar no botão de download
                 download_btn = page.locator('#captchaButton').first
                 if download_btn.count() > 0:
                     logger.info("Clicando no botão de download...")
                     
-                    # Aguardar o download
-                    with page.expect_download(timeout=30000) as download_info:
-                        download_btn.click()
+                    # Aguardar o download (sem download = token recusado pelo pePI)
+                    try:
+                        with page.expect_download(timeout=30000) as download_info:
+                            download_btn.click()
+                    except Exception as e:
+                        raise FalhaPepi(FALHA_CAPTCHA, f"Download não iniciou após CAPTCHA: {str(e)}")
                     
                     download = download_info.value
                     logger.info(f"Download iniciado: {download.suggested_filename}")
@@ -488,29 +604,33 @@ class PepiScraper:
                     logger.info(f"PDF salvo em: {debug_path}")
                     
                     logger.info("PDF baixado com sucesso!")
+                    cronometro.marcar('download_pdf')
                     
                     # 12. Extrair EMAIL do PDF (MARCA já foi extraída da página)
                     dados = self.extrair_dados_de_pdf(pdf_content)
+                    cronometro.marcar('parse_pdf')
                     
                     # Usar a marca extraída da página em vez do PDF
                     if marca_extraida:
                         dados['marca'] = marca_extraida
                         logger.info(f"✅ Usando MARCA da página: {marca_extraida}")
                     
-                    # 13. DESCADASTRAR processo antes de passar ao próximo
+                    # 13. A conta ficou habilitada como terceiro interessado: o
+                    # descadastro é feito depois, em lote (ver scrapers.descadastro)
                     if dados.get('email'):
-                        logger.info("📋 Descadastrando processo...")
-                        self._descadastrar_processo(page, numero_processo)
+                        dados['conta_habilitada'] = conta.usuario
                     
                     browser.close()
                     return dados
                 else:
                     logger.error("Botão de download não encontrado após resolver CAPTCHA")
                     browser.close()
-                    return {'marca': None, 'email': None}
+                    return {'marca': None, 'email': None, 'falha': FALHA_CAPTCHA}
                     
         except Exception as e:
-            logger.error(f"Erro ao buscar processo {numero_processo} no pePI: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            return {'marca': None, 'email': None}
+            tipo_falha = classificar_excecao(e)
+            logger.error(f"Erro ao buscar processo {numero_processo} no pePI ({tipo_falha}): {str(e)}")
+            if not isinstance(e, FalhaPepi):
+                import traceback
+                traceback.print_exc()
+            return {'marca': None, 'email': None, 'falha': tipo_falha}
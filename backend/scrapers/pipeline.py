@@ -0,0 +1,178 @@
+"""
+Etapas do scraping ligadas por filas asyncio limitadas.
+
+executar_scraping fazia download → parse → insert → pePI → finalização em sequência,
+cada etapa esperando a anterior terminar por inteiro. Agora (INPIScraper._processar_revista):
+
+  parse (thread, iterparse) ─fila─▶ filtro + histórico dos titulares em lotes
+    ─▶ priorização (barreira: escolher os N melhores exige todos os candidatos)
+    ─▶ inserção em lotes (PIPELINE_INSERCOES tarefas) ┐
+    ─▶ enriquecimento no pePI (PEPI_WORKERS workers)  ┴ em paralelo
+    ─fila─▶ gravação dos resultados em lote (bulk_write)
+
+As filas têm tamanho máximo PIPELINE_FILA_MAXIMA: a etapa rápida espera a lenta
+(contrapressão) em vez de acumular memória. O enriquecimento começa logo após a
+seleção, em paralelo com a inserção; cada gravação de resultado espera os
+processos dela estarem inseridos (ControleInsercao). A gravação tem uma única
+tarefa para manter a ordem das atualizações de um mesmo processo.
+
+Até a priorização os processos circulam como xml_parser.ProcessoXML (registro
+com __slots__, sem os campos da execução); o documento do MongoDB é montado por
+lote de inserção, só para os selecionados.
+"""
+import asyncio
+import concurrent.futures
+import logging
+import os
+import threading
+
+from pymongo import UpdateMany
+
+from .cache import invalidar as invalidar_cache
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_FILA_MAXIMA = int(os.environ.get('PIPELINE_FILA_MAXIMA', '1000'))
+PIPELINE_LOTE_HISTORICO = int(os.environ.get('PIPELINE_LOTE_HISTORICO', '500'))
+PIPELINE_LOTE_INSERCAO = int(os.environ.get('PIPELINE_LOTE_INSERCAO', '500'))
+PIPELINE_INSERCOES = int(os.environ.get('PIPELINE_INSERCOES', '2'))
+PIPELINE_LOTE_GRAVACAO = int(os.environ.get('PIPELINE_LOTE_GRAVACAO', '100'))
+PIPELINE_GRAVACAO_INTERVALO_S = float(os.environ.get('PIPELINE_GRAVACAO_INTERVALO_S', '0.5'))
+
+# Marca de fim de fila
+FIM = object()
+
+
+async def produzir_de_thread(gerar, fila: asyncio.Queue):
+    """Consome o iterador gerar() numa thread e coloca cada item na fila
+
+    Com a fila cheia a thread espera (contrapressão). No fim coloca FIM (ou o
+    erro do iterador); se a tarefa for cancelada a thread para no próximo item.
+    """
+    loop = asyncio.get_running_loop()
+    cancelado = threading.Event()
+
+    def produzir():
+        for item in gerar():
+            futuro = asyncio.run_coroutine_threadsafe(fila.put(item), loop)
+            while True:
+                try:
+                    futuro.result(timeout=1)
+                    break
+                except concurrent.futures.TimeoutError:
+                    if cancelado.is_set():
+                        futuro.cancel()
+                        return
+
+    try:
+        await loop.run_in_executor(None, produzir)
+    except Exception as e:
+        # O consumidor recebe o erro em vez de esperar pelo FIM para sempre
+        await fila.put(_ErroProdutor(e))
+        return
+    finally:
+        cancelado.set()
+    await fila.put(FIM)
+
+
+class _ErroProdutor:
+    def __init__(self, erro: Exception):
+        self.erro = erro
+
+
+async def consumir(fila: asyncio.Queue):
+    """Itens da fila até FIM (levanta o erro do produtor, se houver)"""
+    while True:
+        item = await fila.get()
+        if item is FIM:
+            return
+        if isinstance(item, _ErroProdutor):
+            raise item.erro
+        yield item
+
+
+class ControleInsercao:
+    """Processos já inseridos no MongoDB; gravações de resultado esperam por eles"""
+
+    def __init__(self):
+        self._inseridos = set()
+        self._condicao = asyncio.Condition()
+
+    async def marcar(self, numeros):
+        async with self._condicao:
+            self._inseridos.update(numeros)
+            self._condicao.notify_all()
+
+    async def aguardar(self, numeros):
+        pendentes = set(numeros)
+        async with self._condicao:
+            await self._condicao.wait_for(lambda: pendentes <= self._inseridos)
+
+
+class GravadorResultados:
+    """Etapa de gravação: atualizações de processos da execução em bulk_write
+
+    atualizar() enfileira ({numeros}, {campos}); a tarefa junta até `lote`
+    atualizações (ou o que chegar em `intervalo` segundos), grava em ordem e
+    invalida o cache da execução uma vez por lote.
+    """
+
+    def __init__(self, db, execucao_id: str, insercao: ControleInsercao = None,
+                 lote: int = PIPELINE_LOTE_GRAVACAO, intervalo: float = PIPELINE_GRAVACAO_INTERVALO_S):
+        self.db = db
+        self.execucao_id = execucao_id
+        self.insercao = insercao
+        self.lote = lote
+        self.intervalo = intervalo
+        self.total_lotes = 0
+        self.total_atualizacoes = 0
+        self._fila = asyncio.Queue(PIPELINE_FILA_MAXIMA)
+        self._tarefa = asyncio.create_task(self._executar())
+
+    async def atualizar(self, numeros: list, campos: dict):
+        if self._tarefa.done():
+            # Falha anterior da gravação: não deixa o produtor travado na fila cheia
+            self._tarefa.result()
+        await self._fila.put((list(numeros), campos))
+
+    async def _gravar(self, operacoes: list):
+        if self.insercao is not None:
+            await self.insercao.aguardar(n for numeros, _ in operacoes for n in numeros)
+        await self.db.processos_indeferimento.bulk_write([
+            UpdateMany({"numero_processo": {"$in": numeros}, "execucao_id": self.execucao_id}, {"$set": campos})
+            for numeros, campos in operacoes
+        ], ordered=True)
+        self.total_lotes += 1
+        self.total_atualizacoes += len(operacoes)
+        await invalidar_cache(self.db, self.execucao_id, lista=False)
+
+    async def _executar(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._fila.get()
+            if item is FIM:
+                return
+            operacoes = [item]
+            prazo = loop.time() + self.intervalo
+            fim = False
+            while len(operacoes) < self.lote:
+                try:
+                    item = await asyncio.wait_for(self._fila.get(), max(0, prazo - loop.time()))
+                except asyncio.TimeoutError:
+                    break
+                if item is FIM:
+                    fim = True
+                    break
+                operacoes.append(item)
+            await self._gravar(operacoes)
+            if fim:
+                return
+
+    async def fechar(self):
+        """Grava o que falta e encerra a etapa (levanta o erro da gravação, se houve)"""
+        if not self._tarefa.done():
+            await self._fila.put(FIM)
+        await self._tarefa
+
+    def cancelar(self):
+        self._tarefa.cancel()
@@ -0,0 +1,195 @@
+"""
+Priorização dos processos enviados ao pePI pelo valor esperado do lead.
+
+Cada processo sem procurador recebe uma prioridade (campo 'prioridade') calculada
+só com o XML e o histórico no MongoDB, sem gastar pePI/CAPTCHA:
+  - apresentação da marca no XML (nominativa > mista > sem informação > figurativa)
+  - tipo de titular (pessoa jurídica pelo sufixo da razão social ou pessoa física)
+  - email do titular já conhecido (lead sem custo de CAPTCHA)
+  - titular recorrente (processos em edições anteriores) e processos do mesmo
+    titular nesta edição
+  - falhas anteriores de enriquecimento do titular (penalidade)
+
+Os LIMITE_PROCESSOS mais prioritários seguem para o pePI por uma fila de prioridade;
+INPI_MAX_CAPTCHAS e INPI_MAX_MINUTOS limitam o gasto por execução. Processos de
+titulares com email conhecido também são selecionados, mas não ocupam vagas do
+limite: o email vem do histórico (supressao.planejar_enriquecimento), sem pePI.
+"""
+import heapq
+import logging
+import os
+import time
+
+from .indice_processos import normalizar_texto
+
+logger = logging.getLogger(__name__)
+
+# Orçamento por execução (0 = sem limite). Cada consulta ao pePI resolve um CAPTCHA.
+MAX_CAPTCHAS = int(os.environ.get('INPI_MAX_CAPTCHAS', '0'))
+MAX_MINUTOS = float(os.environ.get('INPI_MAX_MINUTOS', '0'))
+
+PESOS = {
+    'apresentacao': {'nominativa': 3.0, 'mista': 2.0, None: 1.0, 'figurativa': 0.0, 'tridimensional': 0.5},
+    'pessoa_juridica': 2.0,
+    'pessoa_fisica': 1.0,
+    'email_conhecido': 5.0,
+    'por_processo_anterior': 0.5,
+    'max_processos_anteriores': 4,
+    'por_processo_na_edicao': 1.0,
+    'max_processos_na_edicao': 3,
+    'por_falha_anterior': -1.0,
+}
+
+SUFIXOS_PESSOA_JURIDICA = {
+    'ltda', 'limitada', 'me', 'mei', 'epp', 'eireli', 'sa', 'slu', 'cia', 'companhia',
+    'comercio', 'industria', 'servicos', 'associacao', 'instituto', 'fundacao', 'cooperativa',
+}
+
+TIPO_PESSOA_JURIDICA = 'pj'
+TIPO_PESSOA_FISICA = 'pf'
+
+
+def tipo_titular(titular: str):
+    """'pj', 'pf' ou None a partir do nome do titular"""
+    palavras = normalizar_texto(titular).split()
+    if not palavras:
+        return None
+    if SUFIXOS_PESSOA_JURIDICA & set(palavras) or palavras[-2:] == ['s', 'a']:
+        return TIPO_PESSOA_JURIDICA
+    return TIPO_PESSOA_FISICA if len(palavras) >= 2 else None
+
+
+async def carregar_historico_titulares(db, titulares) -> dict:
+    """{titular_norm: {'processos', 'com_email', 'falhas'}} de execuções anteriores"""
+    titulares = list(set(t for t in titulares if t))
+    if not titulares:
+        return {}
+
+    historico = {}
+    cursor = db.processos_indeferimento.aggregate([
+        {"$match": {"titular_norm": {"$in": titulares}}},
+        {"$group": {
+            "_id": "$titular_norm",
+            "processos": {"$sum": 1},
+            "com_email": {"$sum": {"$cond": [{"$gt": ["$email_norm", None]}, 1, 0]}},
+            "falhas": {"$sum": {"$cond": [{"$gt": ["$falha_enriquecimento", None]}, 1, 0]}},
+        }}
+    ])
+    async for grupo in cursor:
+        historico[grupo['_id']] = grupo
+    return historico
+
+
+def email_conhecido(processo: dict, historico: dict) -> bool:
+    return bool((historico.get(processo.get('titular_norm')) or {}).get('com_email'))
+
+
+def calcular_prioridade(processo: dict, historico: dict, processos_na_edicao: int = 1) -> float:
+    apresentacao = (processo.get('apresentacao') or '').strip().lower() or None
+    pesos_apresentacao = PESOS['apresentacao']
+    prioridade = pesos_apresentacao.get(apresentacao, pesos_apresentacao[None])
+
+    tipo = tipo_titular(processo.get('titular'))
+    if tipo == TIPO_PESSOA_JURIDICA:
+        prioridade += PESOS['pessoa_juridica']
+    elif tipo == TIPO_PESSOA_FISICA:
+        prioridade += PESOS['pessoa_fisica']
+
+    anterior = historico.get(processo.get('titular_norm')) or {}
+    if email_conhecido(processo, historico):
+        prioridade += PESOS['email_conhecido']
+    prioridade += PESOS['por_processo_anterior'] * min(anterior.get('processos', 0), PESOS['max_processos_anteriores'])
+    prioridade += PESOS['por_falha_anterior'] * anterior.get('falhas', 0)
+    prioridade += PESOS['por_processo_na_edicao'] * min(processos_na_edicao - 1, PESOS['max_processos_na_edicao'])
+
+    return round(prioridade, 2)
+
+
+def contar_titulares(processos) -> dict:
+    """{titular_norm: processos do titular nesta edição}"""
+    por_titular = {}
+    for processo in processos:
+        if processo.get('titular_norm'):
+            por_titular[processo['titular_norm']] = por_titular.get(processo['titular_norm'], 0) + 1
+    return por_titular
+
+
+def selecionar_prioritarios(processos: list, historico: dict, por_titular: dict, limite: int) -> list:
+    """Calcula 'prioridade' de cada processo e retorna os `limite` mais prioritários
+    que dependem do pePI, mais os de titulares com email conhecido
+
+    Empates mantêm a ordem do XML.
+    """
+    for processo in processos:
+        processo['prioridade'] = calcular_prioridade(
+            processo, historico, por_titular.get(processo.get('titular_norm'), 1)
+        )
+
+    ordenados = sorted(processos, key=lambda p: -p['prioridade'])
+    sem_consulta = [p for p in ordenados if email_conhecido(p, historico)]
+    com_consulta = [p for p in ordenados if not email_conhecido(p, historico)][:limite]
+    selecionados = sorted(sem_consulta + com_consulta, key=lambda p: -p['prioridade'])
+    if selecionados:
+        logger.info(
+            f"🎯 {len(com_consulta)} de {len(processos) - len(sem_consulta)} processos selecionados por prioridade "
+            f"para o pePI, mais {len(sem_consulta)} com email conhecido "
+            f"({selecionados[0]['prioridade']} a {selecionados[-1]['prioridade']})"
+        )
+    return selecionados
+
+
+def contar_sessoes_evitadas(figurativas: list, selecionados: list, historico: dict, por_titular: dict,
+                            limite: int) -> int:
+    """Figurativas descartadas pelo XML que, sem o descarte, estariam entre os
+    `limite` processos consultados no pePI (cada uma custaria uma sessão de navegador)
+
+    Figurativas de titular com email conhecido não iriam ao pePI e não contam;
+    empates ficam com os candidatos, então a conta não superestima.
+    """
+    prioridades = [(-p['prioridade'], 0) for p in selecionados if not email_conhecido(p, historico)]
+    prioridades.extend(
+        (-calcular_prioridade(f, historico, por_titular.get(f.get('titular_norm'), 1)), 1)
+        for f in figurativas if not email_conhecido(f, historico)
+    )
+    return sum(figurativa for _, figurativa in heapq.nsmallest(limite, prioridades))
+
+
+async def priorizar_processos(db, processos: list, limite: int) -> list:
+    """Histórico dos titulares no MongoDB + selecionar_prioritarios"""
+    por_titular = contar_titulares(processos)
+    historico = await carregar_historico_titulares(db, por_titular.keys())
+    return selecionar_prioritarios(processos, historico, por_titular, limite)
+
+
+class OrcamentoEnriquecimento:
+    """Limite de CAPTCHAs e de minutos por execução (0 = sem limite)"""
+
+    def __init__(self, max_captchas: int = MAX_CAPTCHAS, max_minutos: float = MAX_MINUTOS, relogio=None):
+        self.max_captchas = max_captchas
+        self.max_minutos = max_minutos
+        self._relogio = relogio or time.monotonic
+        self._inicio = self._relogio()
+        self.captchas = 0
+
+    def consumir_captcha(self):
+        self.captchas += 1
+
+    def tentar_consumir(self):
+        """Confere e reserva um CAPTCHA sem await entre as duas coisas
+
+        Retorna o motivo do esgotamento (nada é reservado) ou None. Com vários
+        workers, conferir com esgotado() e só consumir depois de um await deixaria
+        todos passarem pela conferência antes do primeiro consumo.
+        """
+        motivo = self.esgotado()
+        if not motivo:
+            self.consumir_captcha()
+        return motivo
+
+    def esgotado(self):
+        """Motivo do esgotamento ('captchas' ou 'tempo') ou None"""
+        if self.max_captchas and self.captchas >= self.max_captchas:
+            return 'captchas'
+        if self.max_minutos and (self._relogio() - self._inicio) / 60 >= self.max_minutos:
+            return 'tempo'
+        return None
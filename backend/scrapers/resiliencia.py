@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Tipos de falha reportados pelo PepiScraper no campo 'falha' do resultado
+FALHA_TIMEOUT = 'timeout'
+FALHA_LOGIN = 'login'
+FALHA_CAPTCHA = 'captcha'
+FALHA_NAO_ENCONTRADO = 'nao_encontrado'
+FALHA_DESCONHECIDA = 'erro'
+
+# Falhas que valem nova tentativa (pePI instável, sessão derrubada, captcha recusado)
+FALHAS_TRANSITORIAS = {FALHA_TIMEOUT, FALHA_LOGIN, FALHA_CAPTCHA}
+# Falhas que indicam pePI com problema e contam no circuit breaker. nao_encontrado
+# é uma resposta correta do pePI (processo ainda sem detalhe) e conta como sucesso
+FALHAS_CIRCUITO = FALHAS_TRANSITORIAS | {FALHA_DESCONHECIDA}
+
+# Configurações de retentativa
+MAX_TENTATIVAS = int(os.environ.get('PEPI_MAX_TENTATIVAS', '3'))
+BACKOFF_BASE = float(os.environ.get('PEPI_BACKOFF_BASE', '5'))
+BACKOFF_MAXIMO = float(os.environ.get('PEPI_BACKOFF_MAXIMO', '300'))
+
+
+class FalhaPepi(Exception):
+    """Falha classificada durante a navegação no pePI"""
+
+    def __init__(self, tipo: str, mensagem: str = ''):
+        super().__init__(mensagem or tipo)
+        self.tipo = tipo
+
+
+def classificar_excecao(e: Exception) -> str:
+    """Classifica uma exceção em um dos tipos de falha conhecidos"""
+    if isinstance(e, FalhaPepi):
+        return e.tipo
+
+    # playwright.sync_api.TimeoutError não herda do TimeoutError nativo
+    if isinstance(e, TimeoutError) or 'Timeout' in type(e).__name__:
+        return FALHA_TIMEOUT
+
+    mensagem = str(e).lower()
+    if 'timeout' in mensagem or 'net::err' in mensagem:
+        return FALHA_TIMEOUT
+
+    return FALHA_DESCONHECIDA
+
+
+def eh_transitoria(tipo_falha: str) -> bool:
+    return tipo_falha in FALHAS_TRANSITORIAS
+
+
+def calcular_backoff(tentativa: int, base: float = BACKOFF_BASE, maximo: float = BACKOFF_MAXIMO) -> float:
+    """Backoff exponencial com jitter completo: uniforme entre 0 e base * 2^tentativa"""
+    teto = min(maximo, base * (2 ** tentativa))
+    return random.uniform(0, teto)
+
+
+class CircuitBreaker:
+    """Circuit breaker por host
+
+    Abre quando a taxa de erro na janela recente passa do limiar. Enquanto aberto,
+    todos os workers aguardam em aguardar_liberacao(). Depois do tempo de abertura,
+    uma única requisição de sonda é liberada (meio-aberto): sucesso fecha o circuito,
+    falha reabre.
+    """
+
+    FECHADO = 'fechado'
+    ABERTO = 'aberto'
+    MEIO_ABERTO = 'meio_aberto'
+
+    def __init__(self, nome: str, janela: int = 10, minimo_amostras: int = 4,
+                 limiar_erro: float = 0.5, tempo_abertura: float = 120):
+        self.nome = nome
+        self.minimo_amostras = minimo_amostras
+        self.limiar_erro = limiar_erro
+        self.tempo_abertura = tempo_abertura
+        self.resultados = deque(maxlen=janela)
+        self.estado = self.FECHADO
+        self.aberto_ate = 0.0
+        self.sonda_em_andamento = False
+        self.total_aberturas = 0
+
+    def _abrir(self):
+        self.estado = self.ABERTO
+        self.aberto_ate = time.monotonic() + self.tempo_abertura
+        self.sonda_em_andamento = False
+        self.total_aberturas += 1
+        logger.warning(f"🔌 Circuito {self.nome} ABERTO - pausando workers por {self.tempo_abertura:.0f}s")
+
+    def _fechar(self):
+        self.estado = self.FECHADO
+        self.resultados.clear()
+        self.sonda_em_andamento = False
+        logger.info(f"🔌 Circuito {self.nome} fechado - retomando ritmo normal")
+
+    def permite_requisicao(self) -> bool:
+        if self.estado == self.FECHADO:
+            return True
+
+        if self.estado == self.ABERTO and time.monotonic() >= self.aberto_ate:
+            self.estado = self.MEIO_ABERTO
+
+        if self.estado == self.MEIO_ABERTO and not self.sonda_em_andamento:
+            self.sonda_em_andamento = True
+            logger.info(f"🔌 Circuito {self.nome} meio-aberto - liberando sonda")
+            return True
+
+        return False
+
+    async def aguardar_liberacao(self):
+        """Bloqueia o worker enquanto o circuito estiver aberto"""
+        while not self.permite_requisicao():
+            espera = max(self.aberto_ate - time.monotonic(), 1.0)
+            await asyncio.sleep(espera)
+
+    def registrar_sucesso(self):
+        if self.estado == self.MEIO_ABERTO:
+            self._fechar()
+            return
+        self.resultados.append(True)
+
+    def registrar_consulta(self, falha: str = None):
+        """Registra o resultado de uma consulta pela falha devolvida (ver FALHAS_CIRCUITO)"""
+        if falha in FALHAS_CIRCUITO:
+            self.registrar_falha()
+        else:
+            self.registrar_sucesso()
+
+    def registrar_falha(self):
+        if self.estado == self.MEIO_ABERTO:
+            self._abrir()
+            return
+
+        self.resultados.append(False)
+        if len(self.resultados) >= self.minimo_amostras:
+            taxa_erro = self.resultados.count(False) / len(self.resultados)
+            if taxa_erro >= self.limiar_erro:
+                self._abrir()
+
+
+# Circuito compartilhado por todos os workers que acessam o pePI
+circuito_pepi = CircuitBreaker(
+    'busca.inpi.gov.br',
+    tempo_abertura=float(os.environ.get('PEPI_CIRCUITO_ABERTURA', '120'))
+)
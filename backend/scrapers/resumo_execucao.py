@@ -0,0 +1,156 @@
+"""
+Resumo materializado da última execução (GET /api/inpi/executions/latest).
+
+Um único documento em resumo_execucoes (_id 'ultima') com a execução e um resumo
+de cada processo ({numero_processo: {...}}), atualizado incrementalmente pelo
+scraping. Cada alteração incrementa 'versao' e grava a versão no processo alterado:
+  - o ETag da rota é "<execucao_id>:<versao>" (304 sem ler os processos)
+  - o cursor 'since' é o mesmo valor: só os processos com versão maior são devolvidos
+"""
+import asyncio
+import logging
+
+from pymongo import DESCENDING
+
+logger = logging.getLogger(__name__)
+
+ID_RESUMO = 'ultima'
+
+# Campos do processo copiados para o resumo
+CAMPOS_PROCESSO = (
+    'numero_processo', 'marca', 'titular', 'email', 'email_origem', 'prioridade',
+    'suprimido_motivo', 'falha_enriquecimento', 'orcamento_esgotado', 'resultado'
+)
+# Campos da execução que não vão para o resumo
+CAMPOS_EXECUCAO_IGNORADOS = ('_id', 'metricas_etapas', 'heartbeat_em')
+
+
+def _resumo_processo(processo: dict) -> dict:
+    return {campo: processo[campo] for campo in CAMPOS_PROCESSO if processo.get(campo) is not None}
+
+
+def montar_cursor(execucao_id: str, versao: int) -> str:
+    return f"{execucao_id}:{versao}"
+
+
+def ler_cursor(cursor: str, execucao_id: str) -> int:
+    """Versão do cursor; 0 (tudo) se ele for inválido ou de outra execução"""
+    if not cursor:
+        return 0
+    id_cursor, _, versao = cursor.strip('"').rpartition(':')
+    if id_cursor != execucao_id or not versao.isdigit():
+        return 0
+    return int(versao)
+
+
+class ResumoMaterializado:
+    """Escritor do resumo de uma execução
+
+    Todas as escritas de uma execução passam por este objeto (mesmo event loop): o
+    lock garante que as versões chegam ao MongoDB em ordem, então um leitor que
+    já viu a versão N nunca perde uma alteração com versão menor ou igual a N.
+    """
+
+    def __init__(self, db, execucao_id: str):
+        self.db = db
+        self.execucao_id = execucao_id
+        self.versao = 0
+        self._lock = asyncio.Lock()
+
+    async def iniciar(self, execucao: dict):
+        async with self._lock:
+            self.versao = 1
+            await self.db.resumo_execucoes.replace_one(
+                {"_id": ID_RESUMO},
+                {"execucao": _sem_ignorados(execucao), "processos": {}, "versao": self.versao},
+                upsert=True
+            )
+
+    async def _atualizar(self, montar):
+        """montar(versao) -> campos do $set; a versão só é conhecida dentro do lock"""
+        async with self._lock:
+            self.versao += 1
+            await self.db.resumo_execucoes.update_one(
+                {"_id": ID_RESUMO, "execucao.id": self.execucao_id},
+                {"$set": {**montar(self.versao), "versao": self.versao}}
+            )
+
+    async def atualizar_execucao(self, **campos):
+        await self._atualizar(lambda versao: {f"execucao.{campo}": valor for campo, valor in campos.items()})
+
+    async def adicionar_processos(self, processos: list):
+        await self._atualizar(lambda versao: {
+            f"processos.{p['numero_processo']}": {**_resumo_processo(p), "versao": versao}
+            for p in processos
+        })
+
+    async def atualizar_processos(self, numeros: list, **campos):
+        campos = {campo: valor for campo, valor in campos.items() if campo in CAMPOS_PROCESSO and valor is not None}
+
+        def montar(versao):
+            atualizacoes = {}
+            for numero in numeros:
+                atualizacoes.update({f"processos.{numero}.{campo}": valor for campo, valor in campos.items()})
+                atualizacoes[f"processos.{numero}.versao"] = versao
+            return atualizacoes
+        await self._atualizar(montar)
+
+
+def _sem_ignorados(execucao: dict) -> dict:
+    return {k: v for k, v in execucao.items() if k not in CAMPOS_EXECUCAO_IGNORADOS}
+
+
+async def reconstruir_resumo(db):
+    """Monta o resumo a partir da última execução (execuções anteriores a este resumo)"""
+    execucao = await db.execucoes.find_one({}, {"_id": 0}, sort=[("data_execucao", DESCENDING)])
+    if not execucao:
+        return None
+    processos = {}
+    async for processo in db.processos_indeferimento.find(
+        {"execucao_id": execucao['id']}, {"_id": 0, **{campo: 1 for campo in CAMPOS_PROCESSO}}
+    ):
+        processos[processo['numero_processo']] = {**_resumo_processo(processo), "versao": 1}
+
+    documento = {"execucao": _sem_ignorados(execucao), "processos": processos, "versao": 1}
+    await db.resumo_execucoes.replace_one({"_id": ID_RESUMO}, documento, upsert=True)
+    logger.info(f"Resumo da execução {execucao['id']} reconstruído ({len(processos)} processos)")
+    return documento
+
+
+async def versao_resumo(db):
+    """(execucao_id, versao) sem ler os processos; None sem resumo"""
+    documento = await db.resumo_execucoes.find_one(
+        {"_id": ID_RESUMO}, {"_id": 0, "execucao.id": 1, "versao": 1}
+    )
+    if not documento:
+        return None
+    return documento['execucao']['id'], documento['versao']
+
+
+async def ler_execucao_resumo(db):
+    """Só a execução do resumo (sem os processos); None sem resumo"""
+    documento = await db.resumo_execucoes.find_one({"_id": ID_RESUMO}, {"_id": 0, "execucao": 1})
+    return documento['execucao'] if documento else None
+
+
+async def ler_resumo(db, since: str = None) -> dict:
+    """Execução, processos alterados depois do cursor `since` e o novo cursor"""
+    documento = await db.resumo_execucoes.find_one({"_id": ID_RESUMO}, {"_id": 0})
+    if not documento:
+        documento = await reconstruir_resumo(db)
+        if not documento:
+            return None
+
+    execucao_id = documento['execucao']['id']
+    desde = ler_cursor(since, execucao_id)
+    processos = [
+        {k: v for k, v in processo.items() if k != 'versao'}
+        for processo in documento['processos'].values()
+        if processo.get('versao', 0) > desde
+    ]
+    return {
+        "execucao": documento['execucao'],
+        "processos": processos,
+        "completo": desde == 0,
+        "cursor": montar_cursor(execucao_id, documento['versao'])
+    }
@@ -1,46 +1,121 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 import logging
 import asyncio
+import threading
 from datetime import datetime
+from .monitor_revista import MonitorRevista, INTERVALO_MINUTOS
+from .descadastro import descadastrar_pendentes, DESCADASTRO_INTERVALO_MINUTOS
 
 logger = logging.getLogger(__name__)
 
 scheduler = None
+# Com várias réplicas, só o líder (scrapers/lideranca.py) dispara os jobs
+_eh_lider = None
 
-def executar_scraping_sync(scraper):
-    """Wrapper síncrono para executar scraping assíncrono"""
+def _pode_executar(job: str) -> bool:
+    if _eh_lider is not None and not _eh_lider():
+        logger.warning(f"Job {job} ignorado: esta instância não é mais a líder")
+        return False
+    return True
+
+# Jobs em execução (loop, tarefa): cancelados em stop_scheduler, que não espera por eles
+_em_execucao = set()
+_lock_execucao = threading.Lock()
+
+def _executar(job: str, coro):
+    """Roda a corrotina do job num loop próprio (thread do scheduler), cancelável por stop_scheduler"""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    tarefa = loop.create_task(coro)
+    item = (loop, tarefa)
+    with _lock_execucao:
+        _em_execucao.add(item)
     try:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(scraper.executar_scraping())
-        loop.close()
+        loop.run_until_complete(tarefa)
+    except asyncio.CancelledError:
+        logger.warning(f"Job {job} cancelado: scheduler parado (liderança perdida ou desligamento)")
     except Exception as e:
-        logger.error(f"Erro no job agendado: {str(e)}")
+        logger.error(f"Erro no job {job}: {str(e)}")
+    finally:
+        with _lock_execucao:
+            _em_execucao.discard(item)
+        loop.close()
 
-def start_scheduler(scraper):
-    """Inicia o scheduler com execução toda terça-feira às 08:00"""
-    global scheduler
+def executar_scraping_sync(scraper):
+    """Wrapper síncrono para executar scraping assíncrono"""
+    if not _pode_executar('scraping'):
+        return
+    _executar('scraping', scraper.executar_scraping())
+
+def verificar_revista_sync(monitor, condicional=True):
+    """Wrapper síncrono para a verificação de nova revista"""
+    if not _pode_executar('verificação de revista'):
+        return
+    _executar('verificação de revista', monitor.verificar(condicional))
+
+def descadastrar_pendentes_sync(db):
+    """Wrapper síncrono para os descadastros pendentes"""
+    if not _pode_executar('descadastros'):
+        return
+    _executar('descadastros', descadastrar_pendentes(db))
+
+def start_scheduler(scraper, eh_lider=None):
+    """Inicia o scheduler
+    
+    - a cada INPI_POLL_MINUTOS: verificação leve de nova revista (scraping só se houver número novo)
+    - toda terça-feira às 08:00: verificação completa (sem cache HTTP), como rede de segurança
+    - a cada DESCADASTRO_INTERVALO_MINUTOS: descadastros pendentes (novas tentativas)
+    
+    eh_lider: função conferida antes de cada job (lease de liderança)
+    """
+    global scheduler, _eh_lider
     
     if scheduler is not None:
         logger.warning("Scheduler já está rodando")
         return
     
+    _eh_lider = eh_lider
     scheduler = BackgroundScheduler(timezone='America/Sao_Paulo')
+    monitor = MonitorRevista(scraper)
     
     # Agendar para toda terça-feira às 08:00 (horário de Brasília)
     # day_of_week: 0=Segunda, 1=Terça, 2=Quarta...
+    # Deduplicado pelo número da revista: não repete uma edição já processada
     scheduler.add_job(
-        executar_scraping_sync,
+        verificar_revista_sync,
         trigger=CronTrigger(day_of_week=1, hour=8, minute=0),
-        args=[scraper],
+        args=[monitor, False],
         id='inpi_scraping',
         name='INPI Scraping - Terça 08:00',
         replace_existing=True
     )
     
+    scheduler.add_job(
+        verificar_revista_sync,
+        trigger=IntervalTrigger(minutes=INTERVALO_MINUTOS),
+        args=[monitor],
+        id='inpi_poll_revista',
+        name=f'INPI - verificação de nova revista a cada {INTERVALO_MINUTOS} min',
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True
+    )
+    
+    scheduler.add_job(
+        descadastrar_pendentes_sync,
+        trigger=IntervalTrigger(minutes=DESCADASTRO_INTERVALO_MINUTOS),
+        args=[scraper.db],
+        id='inpi_descadastros',
+        name=f'INPI - descadastros pendentes a cada {DESCADASTRO_INTERVALO_MINUTOS} min',
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True
+    )
+    
     scheduler.start()
-    logger.info("Scheduler iniciado - Próxima execução: Terça-feira às 08:00 (Brasília)")
+    logger.info(f"Scheduler iniciado - verificando nova revista a cada {INTERVALO_MINUTOS} min")
     
     # Log da próxima execução
     job = scheduler.get_job('inpi_scraping')
@@ -48,10 +123,24 @@ def start_scheduler(scraper):
         logger.info(f"Próxima execução agendada para: {job.next_run_time}")
 
 def stop_scheduler():
-    """Para o scheduler"""
+    """Para o scheduler sem esperar os jobs em execução: eles são cancelados
+
+    Ao perder a liderança o novo líder já pode disparar o mesmo job; esperar um
+    scraping de horas aqui faria as duas execuções se sobreporem.
+    """
     global scheduler
     
     if scheduler is not None:
-        scheduler.shutdown()
+        scheduler.shutdown(wait=False)
         scheduler = None
-        logger.info("Scheduler parado")
\ No newline at end of file
+        logger.info("Scheduler parado")
+    with _lock_execucao:
+        em_execucao = list(_em_execucao)
+    for loop, tarefa in em_execucao:
+        try:
+            loop.call_soon_threadsafe(tarefa.cancel)
+        except RuntimeError:
+            # Loop já fechado: o job terminou entre a cópia e o cancelamento
+            pass
+    if em_execucao:
+        logger.warning(f"{len(em_execucao)} jobs em execução cancelados")
@@ -0,0 +1,374 @@
+"""
+Busca de marcas e titulares parecidos ("INHANDS" x "In Hands Ltda").
+
+Comparar cada processo com todos os outros é O(n²). Por isso cada processo guarda,
+desde a escrita, chaves de bloqueio (chaves_bloqueio, índice multikey):
+  - prefixo do nome compactado e da primeira palavra
+  - código fonético do nome (e as variantes com uma letra a menos) e da primeira palavra
+  - vizinhança de remoção do prefixo: o prefixo de 5 letras sem cada uma delas,
+    cortado em 4 ('inhands' e 'inhnds' dividem 'd:inhn'); tolera um erro de
+    digitação em qualquer posição do prefixo, inclusive na primeira letra
+  - prefixo das demais palavras (w:), só do lado gravado
+Uma busca (chaves_busca) usa as mesmas chaves, mais o prefixo da sua primeira
+palavra como w: e das demais como p:, e assim encontra nomes que contêm o buscado
+('inhands' x 'grupo inhands') e vice-versa. Só os processos que compartilham alguma
+chave são pontuados (Jaro-Winkler e comparação por conjunto de palavras).
+
+Mudanças no esquema de chaves incrementam VERSAO_CHAVES; o preenchimento abaixo
+recalcula as chaves dos processos gravados com uma versão anterior.
+
+Uso (preencher processos antigos): python -m scrapers.similaridade
+"""
+from difflib import SequenceMatcher
+import asyncio
+import logging
+import os
+import re
+
+from .indice_processos import normalizar_texto
+
+logger = logging.getLogger(__name__)
+
+SIMILARIDADE_ATIVA = os.environ.get('INPI_SIMILARIDADE_ATIVA', '0') == '1'
+LIMIAR_PADRAO = float(os.environ.get('INPI_SIMILARIDADE_LIMIAR', '0.88'))
+# Teto de candidatos pontuados por busca (blocos muito comuns)
+MAX_CANDIDATOS = int(os.environ.get('INPI_SIMILARIDADE_MAX_CANDIDATOS', '5000'))
+
+CAMPOS_SIMILARIDADE = {'marca': 'marca_norm', 'titular': 'titular_norm'}
+_PREFIXO_CAMPO = {'marca': 'm', 'titular': 't'}
+
+# Formas societárias, ramos genéricos e palavras vazias ignoradas na comparação
+PALAVRAS_IGNORADAS = {
+    'ltda', 'limitada', 'me', 'mei', 'epp', 'eireli', 'sa', 's', 'a', 'cia', 'companhia',
+    'slu', 'ss', 'e', 'de', 'da', 'do', 'dos', 'das', 'the', 'and', 'of',
+    'comercio', 'industria', 'servicos', 'importacao', 'exportacao',
+}
+
+# Jaro-Winkler só vale para nomes de tamanho parecido (o bônus de prefixo
+# aproximaria 'rand' de 'randbrada')
+PROPORCAO_MINIMA_TAMANHO = 0.7
+
+TAMANHO_PREFIXO = 5
+TAMANHO_FONETICO = 5
+TAMANHO_VIZINHANCA = 4
+
+VERSAO_CHAVES = 2
+
+# Palavras de pelo menos esse tamanho com Jaro-Winkler acima do limiar contam como a
+# mesma palavra com erro de digitação ('tecnolgia' x 'tecnologia')
+TAMANHO_MINIMO_QUASE_IGUAL = 5
+LIMIAR_QUASE_IGUAL = 0.92
+
+_FONETICA = [
+    (re.compile(r'ph'), 'f'),
+    (re.compile(r'[cs]h'), 'x'),
+    (re.compile(r'lh'), 'l'),
+    (re.compile(r'nh'), 'n'),
+    (re.compile(r'qu'), 'k'),
+    (re.compile(r'g(?=[ei])'), 'j'),
+    (re.compile(r'gu(?=[ei])'), 'g'),
+    (re.compile(r'c(?=[ei])'), 's'),
+    (re.compile(r'c|q'), 'k'),
+    (re.compile(r'z'), 's'),
+    (re.compile(r'w'), 'v'),
+    (re.compile(r'y'), 'i'),
+    (re.compile(r'h'), ''),
+]
+
+
+def tokens(texto_norm: str) -> list:
+    """Palavras de um texto já normalizado, sem formas societárias"""
+    return [t for t in (texto_norm or '').split() if t not in PALAVRAS_IGNORADAS]
+
+
+def fonetico(palavra: str) -> str:
+    """Código fonético simplificado (português): 'inhands' -> 'inds'"""
+    codigo = palavra
+    for padrao, troca in _FONETICA:
+        codigo = padrao.sub(troca, codigo)
+    if not codigo:
+        return ''
+    # Mantém a primeira letra, remove vogais seguintes e letras repetidas
+    resto = re.sub(r'[aeiou]', '', codigo[1:])
+    return re.sub(r'(.)\1+', r'\1', codigo[0] + resto)
+
+
+def _vizinhanca_remocao(compacto: str) -> set:
+    """Prefixo de TAMANHO_VIZINHANCA + 1 letras sem cada uma delas, cortado em TAMANHO_VIZINHANCA"""
+    base = compacto[:TAMANHO_VIZINHANCA + 1]
+    chaves = {f"d:{compacto[:TAMANHO_VIZINHANCA]}"}
+    if len(compacto) > 3:
+        chaves.update(f"d:{(base[:i] + base[i + 1:])[:TAMANHO_VIZINHANCA]}" for i in range(len(base)))
+    return chaves
+
+
+def _chaves_nome(palavras: list) -> set:
+    compacto = ''.join(palavras)
+    if len(compacto) < 3:
+        return set()
+    codigo = fonetico(compacto)[:TAMANHO_FONETICO]
+    chaves = {f"p:{compacto[:TAMANHO_PREFIXO]}", f"f:{codigo}"}
+    if len(codigo) >= 4:
+        # Variantes com uma letra a menos (exceto a primeira): 'pnds' e 'pds' passam
+        # a dividir a chave 'f:pds'
+        chaves.update(f"f:{codigo[:i]}{codigo[i + 1:]}" for i in range(1, len(codigo)))
+    chaves.update(_vizinhanca_remocao(compacto))
+    if len(palavras) > 1 and len(palavras[0]) >= 3:
+        # Primeira palavra sozinha: 'inhands tecnologia' encontra 'inhands'
+        chaves.add(f"p:{palavras[0][:TAMANHO_PREFIXO]}")
+        codigo_palavra = fonetico(palavras[0])[:TAMANHO_FONETICO]
+        if len(codigo_palavra) >= 3:
+            chaves.add(f"f:{codigo_palavra}")
+    return chaves
+
+
+def chaves_texto(texto_norm: str) -> list:
+    """Chaves gravadas no processo"""
+    palavras = tokens(texto_norm)
+    chaves = _chaves_nome(palavras)
+    if chaves:
+        # Demais palavras: 'grupo inhands' é encontrado por uma busca de 'inhands'
+        chaves.update(f"w:{p[:TAMANHO_PREFIXO]}" for p in palavras[1:] if len(p) >= 3)
+    return sorted(chaves)
+
+
+def chaves_busca(texto_norm: str) -> list:
+    """Chaves de uma busca
+
+    As w: das palavras seguintes não entram: 'tecnologia' ou 'store' como segunda
+    palavra trariam blocos enormes. Em troca, a primeira palavra procura as w:
+    gravadas e as seguintes procuram os nomes que começam por elas (p:).
+    """
+    palavras = tokens(texto_norm)
+    chaves = _chaves_nome(palavras)
+    if chaves:
+        if len(palavras[0]) >= 3:
+            chaves.add(f"w:{palavras[0][:TAMANHO_PREFIXO]}")
+        chaves.update(f"p:{p[:TAMANHO_PREFIXO]}" for p in palavras[1:] if len(p) >= 3)
+    return sorted(chaves)
+
+
+def campos_similaridade(processo: dict) -> dict:
+    """{'chaves_bloqueio': [...], 'versao_chaves': VERSAO_CHAVES} a partir de marca_norm/titular_norm"""
+    chaves = []
+    for campo, campo_norm in CAMPOS_SIMILARIDADE.items():
+        chaves.extend(f"{_PREFIXO_CAMPO[campo]}|{c}" for c in chaves_texto(processo.get(campo_norm)))
+    return {'chaves_bloqueio': chaves, 'versao_chaves': VERSAO_CHAVES} if chaves else {}
+
+
+def jaro_winkler(a: str, b: str) -> float:
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+
+    janela = max(max(len(a), len(b)) // 2 - 1, 0)
+    casados_a = [False] * len(a)
+    casados_b = [False] * len(b)
+    coincidencias = 0
+    for i, letra in enumerate(a):
+        for j in range(max(0, i - janela), min(i + janela + 1, len(b))):
+            if not casados_b[j] and b[j] == letra:
+                casados_a[i] = casados_b[j] = True
+                coincidencias += 1
+                break
+    if not coincidencias:
+        return 0.0
+
+    transposicoes = 0
+    j = 0
+    for i, letra in enumerate(a):
+        if casados_a[i]:
+            while not casados_b[j]:
+                j += 1
+            if letra != b[j]:
+                transposicoes += 1
+            j += 1
+
+    m = coincidencias
+    jaro = (m / len(a) + m / len(b) + (m - transposicoes / 2) / m) / 3
+
+    prefixo = 0
+    for x, y in zip(a[:4], b[:4]):
+        if x != y:
+            break
+        prefixo += 1
+    return jaro + prefixo * 0.1 * (1 - jaro)
+
+
+def _juntar_partidas(palavras: list, outras: set) -> list:
+    """Junta palavras vizinhas partidas por um espaço a mais ('tec nologia' x 'tecnologia')"""
+    juntas = []
+    i = 0
+    while i < len(palavras):
+        if (i + 1 < len(palavras) and palavras[i] + palavras[i + 1] in outras
+                and palavras[i] not in outras and palavras[i + 1] not in outras):
+            juntas.append(palavras[i] + palavras[i + 1])
+            i += 2
+        else:
+            juntas.append(palavras[i])
+            i += 1
+    return juntas
+
+
+def _remover_quase_iguais(resto_a: list, resto_b: list):
+    """Tira dos dois lados as palavras que só diferem por um erro de digitação
+
+    'role brasi l' x 'melo brasil': sem isso 'brasi'/'brasil' contariam como
+    diferentes e dominariam a comparação (0.90). Só enquanto os dois lados ficam
+    com alguma palavra: nomes de uma palavra continuam pontuados abaixo.
+    """
+    for palavra_a in list(resto_a):
+        if len(resto_a) < 2 or len(resto_b) < 2:
+            return
+        if len(palavra_a) < TAMANHO_MINIMO_QUASE_IGUAL:
+            continue
+        for palavra_b in resto_b:
+            if len(palavra_b) >= TAMANHO_MINIMO_QUASE_IGUAL and jaro_winkler(palavra_a, palavra_b) >= LIMIAR_QUASE_IGUAL:
+                resto_a.remove(palavra_a)
+                resto_b.remove(palavra_b)
+                break
+
+
+def pontuar(texto_a_norm: str, texto_b_norm: str) -> float:
+    """Similaridade entre 0 e 1, ignorando ordem e palavras repetidas
+
+    Um conjunto de palavras contido no outro ('inhands' x 'inhands tecnologia') vale
+    1.0. Havendo palavras em comum, só as diferentes são comparadas, senão 'pekoc
+    tecnologia' x 'coke tecnologia' pontuaria alto só por causa de 'tecnologia'.
+    Nas palavras restantes vale o maior entre token set ratio e Jaro-Winkler do
+    texto sem espaços ('in hands' x 'inhands').
+    """
+    palavras_a, palavras_b = tokens(texto_a_norm), tokens(texto_b_norm)
+    if not palavras_a or not palavras_b:
+        return 0.0
+    palavras_a = _juntar_partidas(palavras_a, set(palavras_b))
+    palavras_b = _juntar_partidas(palavras_b, set(palavras_a))
+    conjunto_a, conjunto_b = set(palavras_a), set(palavras_b)
+    resto_a, resto_b = sorted(conjunto_a - conjunto_b), sorted(conjunto_b - conjunto_a)
+    if not resto_a or not resto_b:
+        return 1.0
+    _remover_quase_iguais(resto_a, resto_b)
+
+    # Ordem original das palavras para o texto compactado
+    compacto_a = ''.join(t for t in palavras_a if t in resto_a)
+    compacto_b = ''.join(t for t in palavras_b if t in resto_b)
+    pontuacao = SequenceMatcher(None, ' '.join(resto_a), ' '.join(resto_b)).ratio()
+    if min(len(compacto_a), len(compacto_b)) / max(len(compacto_a), len(compacto_b)) >= PROPORCAO_MINIMA_TAMANHO:
+        pontuacao = max(pontuacao, jaro_winkler(compacto_a, compacto_b))
+    return pontuacao
+
+
+async def buscar_similares(db, texto: str, campo: str = 'marca', limiar: float = LIMIAR_PADRAO,
+                           limite: int = 20, filtro_extra: dict = None) -> list:
+    """Processos cuja marca/titular é parecida com texto (maior pontuação primeiro)"""
+    if campo not in CAMPOS_SIMILARIDADE:
+        raise ValueError(f"Campo de similaridade inválido: {campo}")
+
+    texto_norm = normalizar_texto(texto)
+    chaves = [f"{_PREFIXO_CAMPO[campo]}|{c}" for c in chaves_busca(texto_norm)]
+    if not chaves:
+        return []
+
+    campo_norm = CAMPOS_SIMILARIDADE[campo]
+    filtro = {"chaves_bloqueio": {"$in": chaves}}
+    if filtro_extra:
+        filtro.update(filtro_extra)
+    cursor = db.processos_indeferimento.find(
+        filtro,
+        {"_id": 0, "numero_processo": 1, "execucao_id": 1, "marca": 1, "titular": 1, "email": 1, campo_norm: 1}
+    ).limit(MAX_CANDIDATOS)
+
+    similares = {}
+    async for candidato in cursor:
+        pontuacao = pontuar(texto_norm, candidato.get(campo_norm))
+        if pontuacao < limiar:
+            continue
+        numero = candidato['numero_processo']
+        # O mesmo processo pode aparecer em várias execuções: fica o registro mais pontuado
+        if numero not in similares or similares[numero]['pontuacao'] < pontuacao:
+            candidato.pop(campo_norm, None)
+            candidato['pontuacao'] = round(pontuacao, 4)
+            similares[numero] = candidato
+
+    return sorted(similares.values(), key=lambda c: -c['pontuacao'])[:limite]
+
+
+async def marcar_similares(db, execucao_id: str, limiar: float = LIMIAR_PADRAO) -> int:
+    """Etapa opcional da execução semanal: grava em cada processo os parecidos de
+    outras execuções (campo 'similares'). Retorna quantos processos têm algum."""
+    total = 0
+    cursor = db.processos_indeferimento.find(
+        {"execucao_id": execucao_id},
+        {"_id": 0, "numero_processo": 1, "marca_norm": 1, "titular_norm": 1}
+    )
+    async for processo in cursor:
+        encontrados = []
+        for campo, campo_norm in CAMPOS_SIMILARIDADE.items():
+            if not processo.get(campo_norm):
+                continue
+            parecidos = await buscar_similares(
+                db, processo[campo_norm], campo, limiar, limite=5,
+                filtro_extra={"execucao_id": {"$ne": execucao_id}}
+            )
+            encontrados.extend(
+                {"campo": campo, "numero_processo": p['numero_processo'], "marca": p.get('marca'),
+                 "titular": p.get('titular'), "pontuacao": p['pontuacao']}
+                for p in parecidos
+            )
+        if encontrados:
+            total += 1
+            await db.processos_indeferimento.update_one(
+                {"numero_processo": processo['numero_processo'], "execucao_id": execucao_id},
+                {"$set": {"similares": encontrados}}
+            )
+    logger.info(f"🔎 {total} processos com marca/titular parecidos em execuções anteriores")
+    return total
+
+
+async def preencher_chaves_bloqueio(db, tamanho_lote: int = 1000) -> int:
+    """Grava chaves_bloqueio em processos antigos sem chaves ou com chaves de uma versão anterior"""
+    from pymongo import UpdateOne
+
+    total = 0
+    lote = []
+    cursor = db.processos_indeferimento.find(
+        {"versao_chaves": {"$ne": VERSAO_CHAVES}},
+        {"_id": 1, "marca_norm": 1, "titular_norm": 1}
+    )
+    async for processo in cursor:
+        # Sem marca/titular grava só a versão, para não voltar a ser lido
+        campos = {'versao_chaves': VERSAO_CHAVES, **campos_similaridade(processo)}
+        lote.append(UpdateOne({"_id": processo["_id"]}, {"$set": campos}))
+        if len(lote) >= tamanho_lote:
+            await db.processos_indeferimento.bulk_write(lote, ordered=False)
+            total += len(lote)
+            lote = []
+    if lote:
+        await db.processos_indeferimento.bulk_write(lote, ordered=False)
+        total += len(lote)
+
+    logger.info(f"{total} processos atualizados com chaves de bloqueio")
+    return total
+
+
+async def _main():
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from .indice_processos import garantir_indices, preencher_campos_normalizados
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        db = client[os.environ['DB_NAME']]
+        await garantir_indices(db)
+        await preencher_campos_normalizados(db)
+        await preencher_chaves_bloqueio(db)
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    asyncio.run(_main())
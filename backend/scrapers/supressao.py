@@ -0,0 +1,133 @@
+"""
+Deduplicação por titular e lista de supressão aplicadas antes do pePI.
+
+Os processos selecionados são agrupados pelo titular (titular_norm do XML):
+  - titular ou email já suprimido (descadastrado/contatado/devolvido) → nenhum
+    acesso ao pePI
+  - titular com email encontrado em execuções anteriores → email reaproveitado
+  - demais grupos → só um processo por titular vai ao pePI; o email encontrado é
+    propagado para os outros processos do mesmo titular
+"""
+from datetime import datetime, timezone
+import logging
+
+from pymongo import ASCENDING
+
+from .indice_processos import normalizar_email, normalizar_texto
+
+logger = logging.getLogger(__name__)
+
+MOTIVO_DESCADASTRADO = 'descadastrado'
+MOTIVO_CONTATADO = 'contatado'
+MOTIVO_DEVOLVIDO = 'devolvido'
+MOTIVOS_SUPRESSAO = (MOTIVO_DESCADASTRADO, MOTIVO_CONTATADO, MOTIVO_DEVOLVIDO)
+
+# Origem do email gravado no processo
+ORIGEM_PEPI = 'pepi'
+ORIGEM_HISTORICO = 'historico'
+ORIGEM_TITULAR = 'titular'
+
+
+def chave_grupo(processo: dict) -> str:
+    """Titular normalizado; sem titular, o processo forma um grupo sozinho"""
+    return processo.get('titular_norm') or f"#{processo.get('numero_processo')}"
+
+
+async def garantir_indices_supressao(db):
+    await db.contatos_suprimidos.create_index([("email_norm", ASCENDING)], unique=True, sparse=True)
+    await db.contatos_suprimidos.create_index([("titular_norm", ASCENDING)], unique=True, sparse=True)
+
+
+async def suprimir_contato(db, email: str = None, titular: str = None, motivo: str = MOTIVO_DESCADASTRADO, origem: str = None):
+    """Adiciona (ou atualiza) um email e/ou titular na lista de supressão"""
+    if motivo not in MOTIVOS_SUPRESSAO:
+        raise ValueError(f"Motivo inválido: {motivo}")
+
+    email_norm = normalizar_email(email)
+    titular_norm = normalizar_texto(titular)
+    if not email_norm and not titular_norm:
+        raise ValueError("Informe email ou titular")
+
+    agora = datetime.now(timezone.utc).isoformat()
+    for campo, valor in (('email_norm', email_norm), ('titular_norm', titular_norm)):
+        if not valor:
+            continue
+        await db.contatos_suprimidos.update_one(
+            {campo: valor},
+            {"$set": {"motivo": motivo, "origem": origem, "atualizado_em": agora},
+             "$setOnInsert": {campo: valor, "criado_em": agora}},
+            upsert=True
+        )
+
+
+async def carregar_suprimidos(db, emails, titulares) -> dict:
+    """{'emails': {email_norm: motivo}, 'titulares': {titular_norm: motivo}}"""
+    suprimidos = {'emails': {}, 'titulares': {}}
+    emails, titulares = list(set(emails)), list(set(titulares))
+    if not emails and not titulares:
+        return suprimidos
+
+    cursor = db.contatos_suprimidos.find(
+        {"$or": [{"email_norm": {"$in": emails}}, {"titular_norm": {"$in": titulares}}]},
+        {"_id": 0}
+    )
+    async for contato in cursor:
+        if contato.get('email_norm'):
+            suprimidos['emails'][contato['email_norm']] = contato['motivo']
+        if contato.get('titular_norm'):
+            suprimidos['titulares'][contato['titular_norm']] = contato['motivo']
+    return suprimidos
+
+
+async def emails_conhecidos(db, titulares) -> dict:
+    """Último email já encontrado para cada titular: {titular_norm: email}"""
+    titulares = list(set(titulares))
+    if not titulares:
+        return {}
+
+    conhecidos = {}
+    cursor = db.processos_indeferimento.find(
+        {"titular_norm": {"$in": titulares}, "email_norm": {"$exists": True}},
+        {"_id": 0, "titular_norm": 1, "email": 1, "data_extracao": 1}
+    ).sort("data_extracao", ASCENDING)
+    async for processo in cursor:
+        # Ordenado do mais antigo ao mais recente: o último sobrescreve
+        if processo.get('email'):
+            conhecidos[processo['titular_norm']] = processo['email']
+    return conhecidos
+
+
+async def planejar_enriquecimento(db, processos: list) -> dict:
+    """Decide quais processos realmente precisam do pePI
+
+    Retorna:
+      consultar: primeiro processo de cada grupo ainda sem email (vai para a fila)
+      pendentes: {chave_grupo: [demais processos do grupo]} aguardando o representante
+      reutilizados: [(processo, email)] com email de execuções anteriores
+      suprimidos: [(processo, motivo)]
+    """
+    grupos = {}
+    for processo in processos:
+        grupos.setdefault(chave_grupo(processo), []).append(processo)
+
+    titulares = [chave for chave in grupos if not chave.startswith('#')]
+    conhecidos = await emails_conhecidos(db, titulares)
+    suprimidos = await carregar_suprimidos(
+        db, [normalizar_email(e) for e in conhecidos.values()], titulares
+    )
+
+    plano = {'consultar': [], 'pendentes': {}, 'reutilizados': [], 'suprimidos': []}
+    for chave, membros in grupos.items():
+        email = conhecidos.get(chave)
+        motivo = suprimidos['titulares'].get(chave) or suprimidos['emails'].get(normalizar_email(email))
+
+        if motivo:
+            plano['suprimidos'].extend((p, motivo) for p in membros)
+        elif email:
+            plano['reutilizados'].extend((p, email) for p in membros)
+        else:
+            plano['consultar'].append(membros[0])
+            if len(membros) > 1:
+                plano['pendentes'][chave] = membros[1:]
+
+    return plano
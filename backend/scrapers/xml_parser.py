@@ -1,74 +1,172 @@
-from bs4 import BeautifulSoup
 from datetime import datetime, timezone
+import io
 import logging
+import sys
 import uuid
+from .indice_processos import campos_normalizados, normalizar_texto
+from .similaridade import campos_similaridade
 
 logger = logging.getLogger(__name__)
 
+APRESENTACAO_FIGURATIVA = 'figurativa'
+# Despacho de indeferimento do pedido
+CODIGO_INDEFERIMENTO = 'IPAS024'
+
+
+def eh_figurativa_xml(processo: dict) -> bool:
+    """Marca figurativa pela apresentação do XML (sem o atributo, quem decide é o pePI)"""
+    return (processo.get('apresentacao') or '').strip().lower() == APRESENTACAO_FIGURATIVA
+
+
+def _texto(elemento) -> str:
+    """Texto do elemento e descendentes, cada trecho sem espaços nas pontas"""
+    return ''.join(trecho.strip() for trecho in elemento.itertext())
+
+
+class ProcessoXML:
+    """Processo lido do XML, só com os campos próprios dele
+
+    Todos os candidatos de uma revista ficam em memória até a priorização, então
+    cada um é um objeto com __slots__: sem id, data de extração e campos da
+    execução (execucao_id/semana/ano são os mesmos para todos) e sem as chaves de
+    similaridade. O documento do MongoDB só é montado por documentos(), na
+    gravação. get()/[] permitem usar o registro onde se espera o dict do processo
+    (filtro e priorização).
+    """
+    __slots__ = ('numero_processo', 'marca', 'apresentacao', 'natureza', 'titular',
+                 'titular_norm', 'tem_procurador', 'prioridade')
+
+    def __init__(self, numero_processo: str, marca: str = None, apresentacao: str = None, natureza: str = None,
+                 titular: str = None, tem_procurador: bool = False):
+        self.numero_processo = numero_processo
+        self.marca = marca
+        self.apresentacao = apresentacao
+        self.natureza = natureza
+        self.titular = titular
+        self.titular_norm = normalizar_texto(titular) or None
+        self.tem_procurador = tem_procurador
+        self.prioridade = None
+
+    def __repr__(self):
+        return f"ProcessoXML({self.numero_processo!r})"
+
+    def get(self, campo: str, padrao=None):
+        valor = getattr(self, campo, None) if campo in self.__slots__ else None
+        return padrao if valor is None else valor
+
+    def __getitem__(self, campo: str):
+        if campo not in self.__slots__:
+            raise KeyError(campo)
+        return getattr(self, campo)
+
+    def __setitem__(self, campo: str, valor):
+        if campo not in self.__slots__:
+            raise KeyError(campo)
+        setattr(self, campo, valor)
+
+    def documento(self, execucao_id: str, semana: int, ano: int, data_extracao: str) -> dict:
+        """Documento de processos_indeferimento"""
+        processo_dict = {
+            'id': str(uuid.uuid4()),
+            'execucao_id': execucao_id,
+            'numero_processo': self.numero_processo,
+            'marca': self.marca or 'Não informado',
+            'apresentacao': self.apresentacao,
+            'natureza': self.natureza,
+            'titular': self.titular,
+            # Email será extraído do PDF pelo pePI scraper
+            'email': None,
+            'tem_procurador': self.tem_procurador,
+            'data_extracao': data_extracao,
+            'semana': semana,
+            'ano': ano
+        }
+        processo_dict.update(campos_normalizados(processo_dict))
+        processo_dict.update(campos_similaridade(processo_dict))
+        if self.prioridade is not None:
+            processo_dict['prioridade'] = self.prioridade
+        return processo_dict
+
+
+def documentos(processos, execucao_id: str, semana: int, ano: int) -> list:
+    """Documentos do MongoDB de um lote de ProcessoXML (uma data de extração por lote)"""
+    data_extracao = datetime.now(timezone.utc).isoformat()
+    return [processo.documento(execucao_id, semana, ano, data_extracao) for processo in processos]
+
+
+def _atributo(elemento, nome: str):
+    # Apresentação/natureza têm poucos valores: uma única string para todos os processos
+    valor = elemento.get(nome)
+    return sys.intern(valor) if valor else None
+
+
+def _extrair_processo(processo_tag):
+    # Extrair número do processo
+    numero_processo = processo_tag.get('numero', '')
+    if not numero_processo:
+        return None
+    
+    # Extrair NOME DA MARCA (tag <nome> dentro de <marca>)
+    # Se não existir no XML, será extraído do PDF
+    marca = None
+    apresentacao = None
+    natureza = None
+    marca_tag = processo_tag.find('.//marca')
+    
+    if marca_tag is not None:
+        # <marca apresentacao="Nominativa" natureza="De Produto">
+        apresentacao = _atributo(marca_tag, 'apresentacao')
+        natureza = _atributo(marca_tag, 'natureza')
+        nome_marca_tag = marca_tag.find('.//nome')
+        if nome_marca_tag is not None:
+            marca = _texto(nome_marca_tag)
+    
+    # Titular (primeiro da lista) - usado nas buscas entre edições
+    titular = None
+    titular_tag = processo_tag.find('.//titular')
+    if titular_tag is not None:
+        titular = titular_tag.get('nome-razao-social') or _texto(titular_tag) or None
+    
+    # Verificar se tem procurador
+    procurador_tag = processo_tag.find('.//procurador')
+    tem_procurador = procurador_tag is not None and bool(_texto(procurador_tag))
+    
+    return ProcessoXML(numero_processo, marca or None, apresentacao, natureza, titular, tem_procurador)
+
+
+def iterar_processos_xml(xml_content):
+    """Gera os processos de indeferimento (despacho IPAS024, como ProcessoXML) à medida que o XML é lido
+    
+    lxml.etree.iterparse: cada <processo> é descartado depois de lido, então a
+    memória não cresce com a revista e o primeiro processo sai antes do fim do
+    parse (o BeautifulSoup montava a árvore inteira antes).
+    """
+    from lxml import etree
+    if isinstance(xml_content, str):
+        xml_content = xml_content.encode('utf-8')
+    
+    for _, processo_tag in etree.iterparse(io.BytesIO(xml_content), events=('end',), tag='processo',
+                                           recover=True, huge_tree=True):
+        try:
+            if any(d.get('codigo') == CODIGO_INDEFERIMENTO for d in processo_tag.iter('despacho')):
+                processo = _extrair_processo(processo_tag)
+                if processo:
+                    yield processo
+        except Exception as e:
+            logger.error(f"Erro ao processar despacho: {str(e)}")
+        finally:
+            # Libera o processo e os irmãos já lidos
+            processo_tag.clear()
+            while processo_tag.getprevious() is not None:
+                del processo_tag.getparent()[0]
+
+
 def parsear_xml_revista(xml_content: str, execucao_id: str, semana: int, ano: int) -> list:
     """Parse do XML da revista e extração de processos de indeferimento"""
-    processos = []
-    
     try:
-        soup = BeautifulSoup(xml_content, 'lxml-xml')
-        
-        # Buscar todos os despachos com código IPAS024 (Indeferimento do pedido)
-        despachos = soup.find_all('despacho', {'codigo': 'IPAS024'})
-        
-        logger.info(f"Encontrados {len(despachos)} despachos de indeferimento")
-        
-        for despacho in despachos:
-            try:
-                # Navegar até o processo pai
-                processo_tag = despacho.find_parent('processo')
-                if not processo_tag:
-                    continue
-                
-                # Extrair número do processo
-                numero_processo = processo_tag.get('numero', '')
-                if not numero_processo:
-                    continue
-                
-                # Extrair NOME DA MARCA (tag <nome> dentro de <marca>)
-                # Se não existir no XML, será extraído do PDF
-                marca = None
-                marca_tag = processo_tag.find('marca')
-                
-                if marca_tag:
-                    nome_marca_tag = marca_tag.find('nome')
-                    if nome_marca_tag:
-                        marca = nome_marca_tag.get_text(strip=True)
-                
-                # Email será extraído do PDF pelo pePI scraper
-                email = None
-                
-                # Verificar se tem procurador
-                tem_procurador = False
-                procurador_tag = processo_tag.find('procurador')
-                if procurador_tag and procurador_tag.get_text(strip=True):
-                    tem_procurador = True
-                
-                processo_dict = {
-                    'id': str(uuid.uuid4()),
-                    'execucao_id': execucao_id,
-                    'numero_processo': numero_processo,
-                    'marca': marca or 'Não informado',
-                    'email': email,
-                    'tem_procurador': tem_procurador,
-                    'data_extracao': datetime.now(timezone.utc).isoformat(),
-                    'semana': semana,
-                    'ano': ano
-                }
-                
-                processos.append(processo_dict)
-                
-            except Exception as e:
-                logger.error(f"Erro ao processar despacho: {str(e)}")
-                continue
-        
-        logger.info(f"Total de {len(processos)} processos extraídos com sucesso")
-        return processos
-        
+        processos = documentos(iterar_processos_xml(xml_content), execucao_id, semana, ano)
     except Exception as e:
         logger.error(f"Erro ao parsear XML: {str(e)}")
-        return []
\ No newline at end of file
+        return []
+    logger.info(f"Total de {len(processos)} processos extraídos com sucesso")
+    return processos
@@ -1,45 +1,94 @@
-from fastapi import FastAPI, APIRouter, HTTPException, BackgroundTasks
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, APIRouter, HTTPException, BackgroundTasks, Header
+from fastapi.responses import StreamingResponse, Response, ORJSONResponse
+from fastapi.encoders import jsonable_encoder
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+import asyncio
 import os
 import logging
+import time
+import orjson
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict, TypeAdapter
 from typing import List, Optional
 import uuid
 from datetime import datetime, timezone
 from contextlib import asynccontextmanager
-
-from scrapers.inpi_scraper import INPIScraper
-from scrapers.scheduler import start_scheduler, stop_scheduler
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 
 ROOT_DIR = Path(__file__).parent
+# Antes dos imports de scrapers: os módulos leem a configuração na importação
 load_dotenv(ROOT_DIR / '.env')
 
+from scrapers.indice_processos import garantir_indices, buscar_processos, CAMPOS_BUSCA, MODOS_BUSCA
+from scrapers.similaridade import buscar_similares, CAMPOS_SIMILARIDADE, LIMIAR_PADRAO
+from scrapers.supressao import garantir_indices_supressao, suprimir_contato, MOTIVO_DESCADASTRADO
+from scrapers.campanha import (
+    garantir_indices_campanha, criar_campanha, resumo_campanha, registrar_devolucao, EnviadorCampanha
+)
+from scrapers.eventos import barramento, transmitir, AssinaturaMongo, TIPO_STATUS, STATUS_FINAIS
+from scrapers.resumo_execucao import ler_resumo, versao_resumo, montar_cursor
+from scrapers.cache import (
+    resposta_em_cache, registrar_consulta, cache_respostas, etiqueta_execucao,
+    TAG_EXECUCOES, RESULTADO_NAO_MODIFICADO
+)
+from scrapers.esquema import eh_confiavel, formatar_data_utc, projecao_resposta
+from scrapers.lideranca import Lideranca
+from scrapers.fila_enriquecimento import garantir_indices_fila, estado_fila
+from scrapers.contas_pepi import obter_pool, estado_contas
+from scrapers.descadastro import garantir_indices_descadastro, estado_descadastros
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
+# INPI_MODO=api: réplica só de leitura/API, sem scheduler nem scraper (os módulos
+# de scraping e suas dependências pesadas nem são importados)
+MODO_COMPLETO = 'completo'
+MODO_API = 'api'
+MODO = os.environ.get('INPI_MODO', MODO_COMPLETO)
+
 # Global scraper instance
 scraper = None
+lideranca = None
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global scraper
+    global scraper, lideranca
+    await garantir_indices(db)
+    await garantir_indices_supressao(db)
+    await garantir_indices_campanha(db)
+    await garantir_indices_fila(db)
+    await garantir_indices_descadastro(db)
+    if MODO == MODO_API:
+        logging.info("Modo API: scheduler e scraper desativados")
+        yield
+        client.close()
+        return
+    
+    from scrapers.inpi_scraper import INPIScraper
+    from scrapers.scheduler import start_scheduler, stop_scheduler
     scraper = INPIScraper(db)
-    # Start scheduler on startup
-    start_scheduler(scraper)
-    logging.info("Scheduler iniciado - Execução toda terça-feira às 08:00")
+    # Só a instância líder roda o scheduler (várias réplicas/workers podem servir a API)
+    lideranca = Lideranca(
+        db,
+        ao_assumir=lambda: start_scheduler(scraper, eh_lider=lideranca.eh_lider),
+        ao_perder=stop_scheduler
+    )
+    tarefa_lideranca = asyncio.create_task(lideranca.executar())
+    logging.info("Aguardando liderança para iniciar o scheduler (verificação de nova revista contínua e terça-feira às 08:00)")
     yield
     # Cleanup on shutdown
+    tarefa_lideranca.cancel()
+    await asyncio.gather(tarefa_lideranca, return_exceptions=True)
+    await lideranca.liberar()
     stop_scheduler()
     client.close()
 
 # Create the main app
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -55,6 +104,7 @@ class Execucao(BaseModel):
     semana: int
     ano: int
     mensagem_erro: Optional[str] = None
+    metricas_etapas: Optional[dict] = None
 
 class ProcessoIndeferimento(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -66,11 +116,50 @@ class ProcessoIndeferimento(BaseModel):
     data_extracao: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     semana: int
     ano: int
+    titular: Optional[str] = None
+
+class SupressaoRequest(BaseModel):
+    email: Optional[str] = None
+    titular: Optional[str] = None
+    motivo: str = MOTIVO_DESCADASTRADO  # 'descadastrado' ou 'contatado'
+
+class CampanhaRequest(BaseModel):
+    assunto: str  # templates com $marca, $numero_processo, $titular, $email
+    corpo: str
+    enviar: bool = True
+
+class DevolucaoRequest(BaseModel):
+    email: str
+    motivo: Optional[str] = None
 
 class ExecucaoResponse(BaseModel):
     execucao: Execucao
     processos: List[ProcessoIndeferimento]
 
+LISTA_EXECUCOES = TypeAdapter(List[Execucao])
+
+def serializar_processo(processo: dict) -> dict:
+    """Processo validado na escrita (scrapers/esquema.py) vai direto; os demais passam pelo modelo"""
+    if eh_confiavel(processo):
+        del processo['versao_esquema']
+        processo.setdefault('email', None)
+        processo.setdefault('titular', None)
+        processo['data_extracao'] = formatar_data_utc(processo['data_extracao'])
+        return processo
+    return ProcessoIndeferimento.model_validate(processo).model_dump(mode='json')
+
+async def responder_com_cache(rota: str, chave: str, tags: list, carregar, if_none_match: Optional[str]):
+    """Resposta JSON do cache (ver scrapers/cache.py) com ETag e 304 para If-None-Match"""
+    inicio = time.perf_counter()
+    corpo, etag, resultado = await resposta_em_cache(db, rota, chave, tags, carregar)
+    if if_none_match and etag in {valor.strip() for valor in if_none_match.split(',')}:
+        resultado = RESULTADO_NAO_MODIFICADO
+        resposta = Response(status_code=304, headers={"ETag": etag})
+    else:
+        resposta = Response(corpo, media_type="application/json", headers={"ETag": etag})
+    registrar_consulta(rota, resultado, time.perf_counter() - inicio)
+    return resposta
+
 # Routes
 @api_router.get("/")
 async def root():
@@ -79,6 +168,8 @@ async def root():
 @api_router.post("/inpi/scrape")
 async def trigger_scraping_manual(background_tasks: BackgroundTasks):
     """Trigger manual do scraping"""
+    if MODO == MODO_API:
+        raise HTTPException(status_code=503, detail="Réplica em modo API: o scraping roda na instância completa")
     if scraper is None:
         raise HTTPException(status_code=500, detail="Scraper não inicializado")
     
@@ -91,39 +182,57 @@ async def trigger_scraping_manual(background_tasks: BackgroundTasks):
     }
 
 @api_router.get("/inpi/executions", response_model=List[Execucao])
-async def listar_execucoes():
+async def listar_execucoes(if_none_match: Optional[str] = Header(None)):
     """Lista todas as execuções ordenadas por data (mais recente primeiro)"""
-    execucoes = await db.execucoes.find({}, {"_id": 0}).sort("data_execucao", -1).to_list(1000)
-    
-    for exec in execucoes:
-        if isinstance(exec.get('data_execucao'), str):
-            exec['data_execucao'] = datetime.fromisoformat(exec['data_execucao'])
+    async def carregar():
+        execucoes = await db.execucoes.find({}, {"_id": 0}).sort("data_execucao", -1).to_list(1000)
+        
+        for exec in execucoes:
+            if isinstance(exec.get('data_execucao'), str):
+                exec['data_execucao'] = datetime.fromisoformat(exec['data_execucao'])
+        
+        return LISTA_EXECUCOES.dump_json(LISTA_EXECUCOES.validate_python(execucoes))
     
-    return execucoes
+    return await responder_com_cache("executions", "executions", [TAG_EXECUCOES], carregar, if_none_match)
+
+@api_router.get("/inpi/executions/latest")
+async def obter_ultima_execucao(since: Optional[str] = None, if_none_match: Optional[str] = Header(None)):
+    """Última execução e seus processos a partir do resumo materializado
+
+    since: cursor devolvido na resposta anterior; só os processos alterados depois
+    dele são retornados ("completo": false). O ETag é o próprio cursor: com
+    If-None-Match igual à versão atual a resposta é 304 sem ler os processos.
+    """
+    versao = await versao_resumo(db)
+    if versao and if_none_match and if_none_match.strip('"') == montar_cursor(*versao):
+        return Response(status_code=304, headers={"ETag": f'"{montar_cursor(*versao)}"'})
+
+    resumo = await ler_resumo(db, since)
+    if not resumo:
+        raise HTTPException(status_code=404, detail="Nenhuma execução encontrada")
+    return ORJSONResponse(resumo, headers={"ETag": f'"{resumo["cursor"]}"'})
 
 @api_router.get("/inpi/executions/{execucao_id}", response_model=ExecucaoResponse)
-async def obter_detalhes_execucao(execucao_id: str):
+async def obter_detalhes_execucao(execucao_id: str, if_none_match: Optional[str] = Header(None)):
     """Obtém detalhes de uma execução específica com seus processos"""
-    execucao = await db.execucoes.find_one({"id": execucao_id}, {"_id": 0})
-    if not execucao:
-        raise HTTPException(status_code=404, detail="Execução não encontrada")
-    
-    if isinstance(execucao.get('data_execucao'), str):
-        execucao['data_execucao'] = datetime.fromisoformat(execucao['data_execucao'])
+    async def carregar():
+        execucao = await db.execucoes.find_one({"id": execucao_id}, {"_id": 0})
+        if not execucao:
+            raise HTTPException(status_code=404, detail="Execução não encontrada")
+        
+        processos = await db.processos_indeferimento.find(
+            {"execucao_id": execucao_id}, 
+            projecao_resposta()
+        ).to_list(10000)
+        
+        return orjson.dumps({
+            "execucao": Execucao.model_validate(execucao).model_dump(mode='json'),
+            "processos": [serializar_processo(proc) for proc in processos]
+        })
     
-    processos = await db.processos_indeferimento.find(
-        {"execucao_id": execucao_id}, 
-        {"_id": 0}
-    ).to_list(10000)
-    
-    for proc in processos:
-        if isinstance(proc.get('data_extracao'), str):
-            proc['data_extracao'] = datetime.fromisoformat(proc['data_extracao'])
-    
-    return {
-        "execucao": execucao,
-        "processos": processos
-    }
+    return await responder_com_cache(
+        "execution", f"execution:{execucao_id}", [etiqueta_execucao(execucao_id)], carregar, if_none_match
+    )
 
 @api_router.get("/inpi/executions/{execucao_id}/xlsx")
 async def download_xlsx(execucao_id: str):
@@ -154,28 +263,204 @@ async def download_xlsx(execucao_id: str):
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
-@api_router.get("/inpi/status")
-async def obter_status():
-    """Obtém status atual do sistema"""
-    # Busca última execução
-    ultima_execucao = await db.execucoes.find_one(
-        {}, 
-        {"_id": 0},
-        sort=[("data_execucao", -1)]
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+@api_router.get("/inpi/executions/{execucao_id}/eventos")
+async def eventos_execucao(execucao_id: str):
+    """Progresso da execução por Server-Sent Events (etapas e cada processo concluído)
+
+    O primeiro evento é o estado atual; o stream termina com o status final.
+    """
+    # Assina antes de ler o estado para não perder eventos entre os dois
+    assinatura = barramento.assinar(execucao_id)
+    estado = barramento.estado(execucao_id)
+    if estado is None:
+        # Execução que não rodou neste processo: estado a partir do MongoDB (uma consulta)
+        execucao = await db.execucoes.find_one({"id": execucao_id}, {"_id": 0, "metricas_etapas": 0})
+        if not execucao:
+            barramento.cancelar(assinatura)
+            raise HTTPException(status_code=404, detail="Execução não encontrada")
+        estado = {**execucao, "id": 0, "tipo": TIPO_STATUS, "execucao_id": execucao_id}
+        if execucao.get('status') not in STATUS_FINAIS:
+            # Em andamento em outra réplica: o progresso vem do resumo no MongoDB
+            barramento.cancelar(assinatura)
+            assinatura = AssinaturaMongo(db, execucao_id, status=execucao.get('status'))
+
+    return StreamingResponse(
+        transmitir(assinatura, [estado]),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
     )
+
+@api_router.get("/inpi/eventos")
+async def eventos_execucoes():
+    """Início, etapas e status de todas as execuções por Server-Sent Events
+
+    Execuções deste processo vêm do barramento; as de outras réplicas, do MongoDB.
+    """
+    return StreamingResponse(
+        transmitir(AssinaturaMongo(db, local=barramento.assinar()), ate_finalizar=False),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+@api_router.get("/inpi/processos/busca")
+async def buscar_processos_indice(q: str, campo: str = "numero", modo: str = "exato", limite: int = 50):
+    """Busca processos de todas as execuções por número, email, titular ou marca
     
-    total_processos = await db.processos_indeferimento.count_documents({})
+    Ex.: /api/inpi/processos/busca?campo=email&q=contato@empresa.com.br
+         /api/inpi/processos/busca?campo=titular&q=inhands&modo=prefixo
+    """
+    if campo not in CAMPOS_BUSCA:
+        raise HTTPException(status_code=400, detail=f"Campo inválido. Use: {', '.join(CAMPOS_BUSCA)}")
+    if modo not in MODOS_BUSCA:
+        raise HTTPException(status_code=400, detail=f"Modo inválido. Use: {', '.join(MODOS_BUSCA)}")
     
+    processos = await buscar_processos(db, campo, q, modo, min(max(limite, 1), 500))
     return {
-        "sistema_online": True,
-        "ultima_execucao": ultima_execucao,
-        "total_processos_banco": total_processos,
-        "proxima_execucao": "Terça-feira às 08:00 (horário Brasil)"
+        "campo": campo,
+        "modo": modo,
+        "total": len(processos),
+        "processos": processos
+    }
+
+@api_router.get("/inpi/similares")
+async def buscar_similares_endpoint(q: str, campo: str = "marca", limiar: float = LIMIAR_PADRAO, limite: int = 20):
+    """Processos com marca ou titular parecido com q (ex.: q=INHANDS encontra "In Hands Ltda")"""
+    if campo not in CAMPOS_SIMILARIDADE:
+        raise HTTPException(status_code=400, detail=f"Campo inválido. Use: {', '.join(CAMPOS_SIMILARIDADE)}")
+    
+    similares = await buscar_similares(db, q, campo, min(max(limiar, 0.5), 1.0), min(max(limite, 1), 200))
+    return {
+        "campo": campo,
+        "limiar": limiar,
+        "total": len(similares),
+        "processos": similares
     }
 
+@api_router.post("/inpi/supressoes")
+async def adicionar_supressao(supressao: SupressaoRequest):
+    """Adiciona email e/ou titular à lista de supressão (não serão consultados no pePI)"""
+    try:
+        await suprimir_contato(db, supressao.email, supressao.titular, supressao.motivo, origem='api')
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": "Contato suprimido", "motivo": supressao.motivo}
+
+@api_router.get("/inpi/supressoes")
+async def listar_supressoes(limite: int = 100):
+    """Lista os contatos suprimidos mais recentes"""
+    limite = min(max(limite, 1), 1000)
+    contatos = await db.contatos_suprimidos.find({}, {"_id": 0}).sort("atualizado_em", -1).limit(limite).to_list(limite)
+    return {"total": len(contatos), "contatos": contatos}
+
+@api_router.post("/inpi/executions/{execucao_id}/campanhas")
+async def criar_campanha_execucao(execucao_id: str, pedido: CampanhaRequest, background_tasks: BackgroundTasks):
+    """Cria campanha de email para os leads da execução (e inicia o envio em background)"""
+    execucao = await db.execucoes.find_one({"id": execucao_id}, {"_id": 0, "status": 1})
+    if not execucao:
+        raise HTTPException(status_code=404, detail="Execução não encontrada")
+    if execucao.get('status') != 'concluido':
+        raise HTTPException(status_code=409, detail="Execução ainda não concluída")
+    
+    try:
+        campanha = await criar_campanha(db, execucao_id, pedido.assunto, pedido.corpo)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if pedido.enviar and campanha['total_envios']:
+        background_tasks.add_task(EnviadorCampanha(db, campanha['id']).executar)
+    return campanha
+
+@api_router.get("/inpi/campanhas/{campanha_id}")
+async def obter_campanha(campanha_id: str):
+    """Status da campanha com a contagem de envios por estado"""
+    campanha = await resumo_campanha(db, campanha_id)
+    if not campanha:
+        raise HTTPException(status_code=404, detail="Campanha não encontrada")
+    return campanha
+
+@api_router.post("/inpi/campanhas/{campanha_id}/enviar")
+async def retomar_campanha(campanha_id: str, background_tasks: BackgroundTasks):
+    """Envia (ou retoma) os envios pendentes da campanha"""
+    if not await db.campanhas.find_one({"id": campanha_id}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Campanha não encontrada")
+    background_tasks.add_task(EnviadorCampanha(db, campanha_id).executar)
+    return {"message": "Envio da campanha iniciado em background"}
+
+@api_router.post("/inpi/campanhas/{campanha_id}/devolucoes")
+async def registrar_devolucao_campanha(campanha_id: str, devolucao: DevolucaoRequest):
+    """Registra bounce recebido depois do envio (o email passa a ser suprimido)"""
+    encontrado = await registrar_devolucao(db, campanha_id, devolucao.email, devolucao.motivo)
+    if not encontrado:
+        raise HTTPException(status_code=404, detail="Envio não encontrado na campanha")
+    return {"message": "Devolução registrada"}
+
+@api_router.get("/inpi/status")
+async def obter_status(if_none_match: Optional[str] = Header(None)):
+    """Obtém status atual do sistema"""
+    async def carregar():
+        # Busca última execução
+        ultima_execucao = await db.execucoes.find_one(
+            {}, 
+            {"_id": 0},
+            sort=[("data_execucao", -1)]
+        )
+        
+        total_processos = await db.processos_indeferimento.count_documents({})
+        
+        return orjson.dumps(jsonable_encoder({
+            "sistema_online": True,
+            "ultima_execucao": ultima_execucao,
+            "total_processos_banco": total_processos,
+            "proxima_execucao": "Assim que uma nova revista for publicada (verificação contínua; terça-feira às 08:00 como garantia)"
+        }))
+    
+    return await responder_com_cache("status", "status", [TAG_EXECUCOES], carregar, if_none_match)
+
+@api_router.get("/inpi/lideranca")
+async def obter_lideranca():
+    """Instância que roda o scheduler (lease no MongoDB)"""
+    if lideranca is None:
+        return {"lider": False, "modo": MODO}
+    return {**await lideranca.estado(), "modo": MODO}
+
+@api_router.get("/inpi/fila")
+async def obter_fila():
+    """Unidades em aberto da fila de enriquecimento e workers ativos"""
+    return await estado_fila(db)
+
+@api_router.get("/inpi/contas")
+async def obter_contas():
+    """Uso e pausas das contas do pePI em todas as instâncias (sem as senhas)"""
+    if MODO == MODO_API:
+        # Sem o pool: a réplica só de API não precisa das credenciais do pePI
+        return await estado_contas(db)
+    try:
+        pool = obter_pool()
+    except ValueError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    # Driver síncrono do pymongo (ver contas_pepi.py): fora do event loop
+    return await asyncio.get_running_loop().run_in_executor(None, pool.estado)
+
+@api_router.get("/inpi/descadastros")
+async def obter_descadastros():
+    """Descadastros de terceiro interessado por status e as falhas definitivas"""
+    return await estado_descadastros(db)
+
+@api_router.get("/inpi/cache")
+async def obter_estatisticas_cache():
+    """Taxa de acerto e tamanho do cache das rotas de leitura"""
+    return cache_respostas.estatisticas()
+
 # Include the router in the main app
 app.include_router(api_router)
 
+@app.get("/metrics")
+async def metrics():
+    """Métricas Prometheus (histogramas de duração por etapa do pipeline)"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -33,8 +33,7 @@ const Dashboard = () => {
     try {
       setScraping(true);
       await axios.post(`${API}/inpi/scrape`);
-      toast.success('Scraping iniciado! Atualize a página em alguns instantes.');
-      setTimeout(carregarExecucoes, 3000);
+      toast.success('Scraping iniciado! A lista é atualizada automaticamente.');
     } catch (error) {
       console.error('Erro ao iniciar scraping:', error);
       toast.error('Erro ao iniciar scraping');
@@ -45,9 +44,11 @@ const Dashboard = () => {
 
   useEffect(() => {
     carregarExecucoes();
-    // Atualizar a cada 30 segundos
-    const interval = setInterval(carregarExecucoes, 30000);
-    return () => clearInterval(interval);
+    // Recarrega só quando uma execução começa ou termina (Server-Sent Events, sem polling)
+    const eventos = new EventSource(`${API}/inpi/eventos`);
+    eventos.addEventListener('inicio', carregarExecucoes);
+    eventos.addEventListener('status', carregarExecucoes);
+    return () => eventos.close();
   }, []);
 
   const getStatusBadge = (status) => {
@@ -5,19 +5,21 @@ import './ProcessosLive.css';
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+const STATUS_FINAIS = ['concluido', 'erro'];
+
 const ProcessosLive = () => {
   const [processos, setProcessos] = useState([]);
   const [loading, setLoading] = useState(false);
+  const [execucaoId, setExecucaoId] = useState(null);
 
   const carregarProcessos = async () => {
     try {
-      const response = await axios.get(`${API}/inpi/executions`);
-      if (response.data && response.data.length > 0) {
-        const ultimaExecucao = response.data[0];
-        const detalhes = await axios.get(`${API}/inpi/executions/${ultimaExecucao.id}`);
-        setProcessos(detalhes.data.processos || []);
-      }
+      // Resumo materializado da última execução (uma única leitura)
+      const response = await axios.get(`${API}/inpi/executions/latest`);
+      setProcessos(response.data.processos || []);
+      setExecucaoId(response.data.execucao.id);
     } catch (error) {
+      if (error.response && error.response.status === 404) return;
       console.error('Erro ao carregar processos:', error);
     }
   };
@@ -25,13 +27,8 @@ const ProcessosLive = () => {
   const iniciarScraping = async () => {
     setLoading(true);
     try {
+      // O progresso chega pelos eventos (nova execução em /inpi/eventos)
       await axios.post(`${API}/inpi/scrape`);
-      // Atualizar a cada 5 segundos
-      const interval = setInterval(carregarProcessos, 5000);
-      setTimeout(() => {
-        clearInterval(interval);
-        setLoading(false);
-      }, 180000); // 3 minutos
     } catch (error) {
       console.error('Erro:', error);
       setLoading(false);
@@ -40,11 +37,9 @@ const ProcessosLive = () => {
 
   const extrairPlanilha = async () => {
     try {
-      const response = await axios.get(`${API}/inpi/executions`);
-      if (response.data && response.data.length > 0) {
-        const ultimaExecucao = response.data[0];
+      if (execucaoId) {
         // Download do XLSX (rota correta é /xlsx não /download_xlsx)
-        window.open(`${API}/inpi/executions/${ultimaExecucao.id}/xlsx`, '_blank');
+        window.open(`${API}/inpi/executions/${execucaoId}/xlsx`, '_blank');
       } else {
         alert('Nenhuma execução encontrada para exportar.');
       }
@@ -56,10 +51,47 @@ const ProcessosLive = () => {
 
   useEffect(() => {
     carregarProcessos();
-    const interval = setInterval(carregarProcessos, 10000);
-    return () => clearInterval(interval);
+    // Novas execuções (manual ou scheduler) sem polling
+    const eventos = new EventSource(`${API}/inpi/eventos`);
+    eventos.addEventListener('inicio', (e) => {
+      const evento = JSON.parse(e.data);
+      setProcessos([]);
+      setExecucaoId(evento.execucao_id);
+    });
+    return () => eventos.close();
   }, []);
 
+  useEffect(() => {
+    if (!execucaoId) return undefined;
+    // Progresso da execução: o primeiro evento é o estado atual e o último é o status final
+    const eventos = new EventSource(`${API}/inpi/executions/${execucaoId}/eventos`);
+    const atualizarStatus = (evento) => {
+      const finalizada = STATUS_FINAIS.includes(evento.status);
+      setLoading(!finalizada);
+      if (finalizada) eventos.close();
+    };
+    eventos.addEventListener('inicio', () => setLoading(true));
+    eventos.addEventListener('etapa', () => setLoading(true));
+    eventos.addEventListener('status', (e) => atualizarStatus(JSON.parse(e.data)));
+    eventos.addEventListener('processos', (e) => {
+      setProcessos(JSON.parse(e.data).processos);
+    });
+    eventos.addEventListener('processo', (e) => {
+      const evento = JSON.parse(e.data);
+      setProcessos((atuais) => atuais.map((processo) => (
+        processo.numero_processo === evento.numero_processo
+          ? {
+              ...processo,
+              marca: evento.marca || processo.marca,
+              email: evento.email || processo.email,
+              resultado: evento.resultado
+            }
+          : processo
+      )));
+    });
+    return () => eventos.close();
+  }, [execucaoId]);
+
   return (
     <div className="processos-live-container">
       {/* Header */}
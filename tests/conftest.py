@@ -0,0 +1,67 @@
+import os
+import socket
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'backend'))
+
+# Módulos do backend leem a configuração na importação; nenhum teste usa MongoDB
+# real, e o SMTP é um servidor local (servidor_smtp)
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'inpi_testes')
+os.environ.setdefault('PEPI_CONTAS', 'teste:senha')
+os.environ.setdefault('NOTIFICACOES_EMAIL_ATIVAS', '0')
+
+
+class CaixaDeEntrada:
+    """Handler do aiosmtpd: guarda as mensagens e responde com os erros programados
+
+    recusados: {destinatário: resposta do RCPT}; falhas_data: respostas dos
+    próximos DATA, em ordem.
+    """
+
+    def __init__(self):
+        self.mensagens = []
+        self.sessoes = []
+        self.recusados = {}
+        self.falhas_data = []
+
+    async def handle_MAIL(self, server, session, envelope, address, mail_options):
+        if not any(s is session for s in self.sessoes):
+            self.sessoes.append(session)
+        envelope.mail_from = address
+        return '250 OK'
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address in self.recusados:
+            return self.recusados[address]
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.falhas_data:
+            return self.falhas_data.pop(0)
+        self.mensagens.append(envelope)
+        return '250 Message accepted for delivery'
+
+
+def _porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def servidor_smtp():
+    """(host, porta, CaixaDeEntrada) de um servidor SMTP local, sem TLS nem autenticação"""
+    from aiosmtpd.controller import Controller
+
+    caixa = CaixaDeEntrada()
+    controller = Controller(caixa, hostname='127.0.0.1', port=_porta_livre())
+    controller.start()
+    try:
+        yield controller.hostname, controller.port, caixa
+    finally:
+        controller.stop()
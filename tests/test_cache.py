@@ -0,0 +1,64 @@
+from scrapers.cache import TAG_EXECUCOES, CacheRespostas, calcular_etag, etiqueta_execucao
+
+
+class Relogio:
+    def __init__(self):
+        self.agora = 0.0
+
+    def __call__(self):
+        return self.agora
+
+
+def test_acerto_devolve_corpo_e_etag():
+    cache = CacheRespostas(max_itens=10, ttl_s=30)
+    etag = cache.gravar('execucoes', [TAG_EXECUCOES], b'[]')
+    assert etag == calcular_etag(b'[]')
+    assert cache.obter('execucoes') == (b'[]', etag)
+    assert cache.obter('outra') is None
+    assert (cache.acertos, cache.falhas) == (1, 1)
+
+
+def test_item_expira_depois_do_ttl():
+    relogio = Relogio()
+    cache = CacheRespostas(max_itens=10, ttl_s=30, relogio=relogio)
+    cache.gravar('execucoes', [TAG_EXECUCOES], b'[]')
+    relogio.agora = 29.9
+    assert cache.obter('execucoes') is not None
+    relogio.agora = 30
+    assert cache.obter('execucoes') is None
+    assert cache.estatisticas()['itens'] == 0
+
+
+def test_lru_descarta_o_menos_usado():
+    cache = CacheRespostas(max_itens=2, ttl_s=30)
+    cache.gravar('a', [], b'a')
+    cache.gravar('b', [], b'b')
+    cache.obter('a')
+    cache.gravar('c', [], b'c')
+    assert cache.obter('b') is None
+    assert cache.obter('a') is not None
+    assert cache.obter('c') is not None
+
+
+def test_invalidar_remove_so_as_entradas_da_etiqueta():
+    cache = CacheRespostas(max_itens=10, ttl_s=30)
+    cache.gravar('lista', [TAG_EXECUCOES], b'[]')
+    cache.gravar('detalhes:1', [etiqueta_execucao('1')], b'{}')
+    cache.gravar('detalhes:2', [etiqueta_execucao('2')], b'{}')
+    cache.invalidar(etiqueta_execucao('1'))
+    assert cache.obter('detalhes:1') is None
+    assert cache.obter('detalhes:2') is not None
+    assert cache.obter('lista') is not None
+
+
+def test_carga_anterior_a_invalidacao_nao_e_gravada():
+    cache = CacheRespostas(max_itens=10, ttl_s=30)
+    tags = [etiqueta_execucao('1')]
+    geracao = cache.geracao(tags)
+    # Scraping grava (e invalida) enquanto a rota ainda monta a resposta
+    cache.invalidar(*tags)
+    cache.gravar('detalhes:1', tags, b'{"antigo": true}', geracao)
+    assert cache.obter('detalhes:1') is None
+
+    cache.gravar('detalhes:1', tags, b'{}', cache.geracao(tags))
+    assert cache.obter('detalhes:1') is not None
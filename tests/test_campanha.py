@@ -0,0 +1,61 @@
+import asyncio
+from functools import partial
+from unittest import mock
+
+import mongomock
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from scrapers import email_notifier
+from scrapers.campanha import (
+    ENVIO_DEVOLVIDO, ENVIO_ENVIADO, ENVIO_FALHA, MAX_TENTATIVAS, EnviadorCampanha, criar_campanha
+)
+from scrapers.email_notifier import NotificadorEmail
+
+_sleep = asyncio.sleep
+_find_and_modify = mongomock.collection.Collection._find_and_modify
+
+
+@pytest.fixture(autouse=True)
+def reserva_com_id():
+    """Com ReturnDocument.AFTER e projeção sem _id, o mongomock relê pelo filtro
+    depois do update e devolve outro envio pendente (o MongoDB devolve o atualizado)"""
+    def find_and_modify(colecao, query, projection=None, *args, **kwargs):
+        documento = _find_and_modify(colecao, query, None, *args, **kwargs)
+        if documento and projection == {'_id': 0}:
+            documento.pop('_id')
+        return documento
+
+    with mock.patch.object(mongomock.collection.Collection, '_find_and_modify', find_and_modify):
+        yield
+
+
+def test_so_recusa_5xx_vira_devolucao(servidor_smtp):
+    host, porta, caixa = servidor_smtp
+    caixa.recusados['inexistente@exemplo.com'] = '550 Mailbox unavailable'
+    caixa.recusados['cheia@exemplo.com'] = '452 Mailbox full'
+
+    async def cenario():
+        db = AsyncMongoMockClient()['teste_campanha']
+        await db.processos_indeferimento.insert_many([
+            {'execucao_id': 'e', 'numero_processo': str(i), 'marca': f'M{i}', 'email': email}
+            for i, email in enumerate(['ok@exemplo.com', 'inexistente@exemplo.com', 'cheia@exemplo.com'])
+        ])
+        campanha = await criar_campanha(db, 'e', 'Sua marca $marca', 'Olá, $titular')
+        conexao = partial(NotificadorEmail, host=host, port=porta, usuario='', senha='', starttls=False)
+        enviador = EnviadorCampanha(db, campanha['id'], conexoes=1, limite_por_minuto=60000,
+                                    limite_dominio_por_minuto=60000, criar_conexao=conexao)
+        with mock.patch.object(email_notifier.asyncio, 'sleep', lambda segundos: _sleep(0)):
+            await enviador.executar()
+        envios = {e['email']: e async for e in db.campanha_envios.find({}, {'_id': 0})}
+        suprimidos = {c['email_norm'] async for c in db.contatos_suprimidos.find({'email_norm': {'$exists': True}})}
+        return enviador.estatisticas, envios, suprimidos
+
+    estatisticas, envios, suprimidos = asyncio.run(cenario())
+    assert estatisticas == {'enviados': 1, 'falhas': 1, 'devolvidos': 1}
+    assert envios['ok@exemplo.com']['status'] == ENVIO_ENVIADO
+    assert envios['inexistente@exemplo.com']['status'] == ENVIO_DEVOLVIDO
+    assert envios['cheia@exemplo.com']['status'] == ENVIO_FALHA
+    assert envios['cheia@exemplo.com']['tentativas'] == MAX_TENTATIVAS
+    assert 'inexistente@exemplo.com' in suprimidos
+    assert 'cheia@exemplo.com' not in suprimidos
@@ -0,0 +1,135 @@
+import asyncio
+import threading
+from datetime import datetime, timedelta, timezone
+
+import mongomock
+import pytest
+
+from scrapers.contas_pepi import Conta, PoolContas, SemContaDisponivel, carregar_contas
+from scrapers.resiliencia import FALHA_LOGIN, FALHA_NAO_ENCONTRADO, FALHA_TIMEOUT
+
+
+def criar_pool(contas, **opcoes):
+    return PoolContas(contas, mongomock.MongoClient().inpi_testes.contas_pepi, intervalo_s=0.01, **opcoes)
+
+
+def pausada_por(pool, usuario):
+    return {estado['usuario']: estado['pausada_por_s'] for estado in pool.estado()}[usuario]
+
+
+def test_carregar_contas_de_pepi_contas(monkeypatch):
+    monkeypatch.delenv('PEPI_CONTAS_ARQUIVO', raising=False)
+    monkeypatch.setenv('PEPI_CONTAS', 'a:1, b:2:3')
+    contas = carregar_contas()
+    assert [(c.usuario, c.senha, c.concorrencia) for c in contas] == [('a', '1', 1), ('b', '2', 3)]
+
+
+def test_conta_mal_formada(monkeypatch):
+    monkeypatch.delenv('PEPI_CONTAS_ARQUIVO', raising=False)
+    monkeypatch.setenv('PEPI_CONTAS', 'sem_senha')
+    with pytest.raises(ValueError, match='sem_senha'):
+        carregar_contas()
+
+
+def test_sem_contas_configuradas_falha(monkeypatch):
+    monkeypatch.delenv('PEPI_CONTAS_ARQUIVO', raising=False)
+    monkeypatch.delenv('PEPI_CONTAS', raising=False)
+    assert carregar_contas() == []
+    with pytest.raises(ValueError, match='PEPI_CONTAS'):
+        PoolContas(carregar_contas())
+
+
+def test_emprestar_escolhe_a_menos_ocupada_e_respeita_a_concorrencia():
+    pool = criar_pool([Conta('a', 's', 2), Conta('b', 's', 1)])
+    emprestadas = [pool.emprestar(espera_s=0).usuario for _ in range(3)]
+    assert sorted(emprestadas) == ['a', 'a', 'b']
+    with pytest.raises(SemContaDisponivel):
+        pool.emprestar(espera_s=0)
+
+
+def test_vagas_sao_compartilhadas_entre_processos():
+    colecao = mongomock.MongoClient().inpi_testes.contas_pepi
+    primeiro = PoolContas([Conta('a', 's')], colecao, intervalo_s=0.01)
+    segundo = PoolContas([Conta('a', 's')], colecao, intervalo_s=0.01)
+    conta = primeiro.emprestar(espera_s=0)
+    with pytest.raises(SemContaDisponivel):
+        segundo.emprestar(espera_s=0)
+    primeiro.devolver(conta)
+    assert segundo.emprestar(espera_s=0).usuario == 'a'
+    assert 'senha' not in str(colecao.find_one({'_id': 'a'}))
+
+
+def test_emprestimo_vencido_libera_a_vaga():
+    colecao = mongomock.MongoClient().inpi_testes.contas_pepi
+    morto = PoolContas([Conta('a', 's')], colecao)
+    morto.emprestar(espera_s=0)
+    colecao.update_one({'_id': 'a'}, {'$set': {'emprestimos.0.expira_em': datetime.now(timezone.utc) - timedelta(seconds=1)}})
+    assert PoolContas([Conta('a', 's')], colecao).emprestar(espera_s=0).usuario == 'a'
+
+
+def test_devolucao_acorda_quem_espera():
+    pool = criar_pool([Conta('a', 's')])
+    conta = pool.emprestar(espera_s=0)
+    threading.Timer(0.05, pool.devolver, args=(conta,)).start()
+    assert pool.emprestar(espera_s=5) is conta
+
+
+def test_login_recusado_pausa_a_conta_com_pausa_dobrada():
+    pool = criar_pool([Conta('a', 's')], pausa_s=100, pausa_maxima_s=150)
+    conta = pool.emprestar(espera_s=0)
+    pool.devolver(conta, FALHA_LOGIN)
+    assert 99 <= pausada_por(pool, 'a') <= 100
+    with pytest.raises(SemContaDisponivel):
+        pool.emprestar(espera_s=0)
+
+    pool.colecao.update_one({'_id': 'a'}, {'$set': {'pausada_ate': datetime(1970, 1, 1)}})
+    pool.devolver(pool.emprestar(espera_s=0), FALHA_LOGIN)
+    assert 149 <= pausada_por(pool, 'a') <= 150
+
+
+def test_falhas_transitorias_seguidas_pausam_e_sucesso_zera():
+    pool = criar_pool([Conta('a', 's')], falhas_pausa=2)
+    pool.devolver(pool.emprestar(espera_s=0), FALHA_TIMEOUT)
+    pool.devolver(pool.emprestar(espera_s=0), FALHA_NAO_ENCONTRADO)
+    pool.devolver(pool.emprestar(espera_s=0), FALHA_TIMEOUT)
+    assert pausada_por(pool, 'a') == 0
+    pool.devolver(pool.emprestar(espera_s=0), FALHA_TIMEOUT)
+    assert pausada_por(pool, 'a') > 0
+    assert pool.estado()[0]['consultas'] == 4
+
+
+def test_conta_especifica():
+    pool = criar_pool([Conta('a', 's'), Conta('b', 's')])
+    assert pool.emprestar(espera_s=0, usuario='b').usuario == 'b'
+    with pytest.raises(SemContaDisponivel):
+        pool.emprestar(espera_s=0, usuario='c')
+
+
+def test_modo_api_sem_contas_le_o_estado_da_colecao(monkeypatch):
+    import server
+    from mongomock_motor import AsyncMongoMockClient
+    from scrapers import contas_pepi
+
+    async def executar():
+        db = AsyncMongoMockClient()['inpi_testes']
+        agora = datetime.now(timezone.utc)
+        await db.contas_pepi.insert_one({
+            '_id': 'a', 'concorrencia': 2, 'pausada_ate': agora + timedelta(seconds=60),
+            'emprestimos': [{'id': '1', 'expira_em': agora + timedelta(seconds=60)},
+                            {'id': '2', 'expira_em': agora - timedelta(seconds=1)}],
+            'estatisticas': {'consultas': 3}
+        })
+        monkeypatch.setattr(server, 'db', db)
+        monkeypatch.setattr(server, 'client', AsyncMongoMockClient())
+        monkeypatch.setattr(server, 'MODO', server.MODO_API)
+        async with server.lifespan(server.app):
+            return await server.obter_contas()
+
+    monkeypatch.delenv('PEPI_CONTAS_ARQUIVO', raising=False)
+    monkeypatch.delenv('PEPI_CONTAS', raising=False)
+    monkeypatch.setattr(contas_pepi, '_pool', None)
+    [estado] = asyncio.run(executar())
+    assert contas_pepi._pool is None
+    assert estado['usuario'] == 'a' and estado['concorrencia'] == 2
+    assert estado['em_uso'] == 1 and estado['consultas'] == 3
+    assert 55 <= estado['pausada_por_s'] <= 60
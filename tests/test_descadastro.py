@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import time
+from datetime import timedelta, timezone
+from unittest import mock
+
+from mongomock_motor import AsyncMongoMockClient
+
+from scrapers import descadastro
+from scrapers.descadastro import (
+    DESCADASTRO_MAX_TENTATIVAS, DESCADASTRO_RESERVA_VENCIDA, STATUS_CONCLUIDO, STATUS_EM_ANDAMENTO,
+    STATUS_FALHA, STATUS_PENDENTE,
+    descadastrar_pendentes, registrar_pendente
+)
+
+
+class PepiContador:
+    """PepiScraper falso: conta os descadastros de cada processo"""
+
+    def __init__(self):
+        self.descadastrados = []
+        self._lock = threading.Lock()
+
+    def descadastrar_lote(self, usuario, numeros):
+        time.sleep(0.05)
+        with self._lock:
+            self.descadastrados += numeros
+        return {numero: None for numero in numeros}
+
+
+def test_execucoes_simultaneas_nao_repetem_descadastro():
+    async def executar():
+        db = AsyncMongoMockClient()['inpi_testes']
+        for numero in range(6):
+            await registrar_pendente(db, str(numero), 'a' if numero % 2 else 'b', 'e')
+        pepi = PepiContador()
+        totais = await asyncio.gather(
+            descadastrar_pendentes(db, lote=2, pepi_scraper=pepi),
+            descadastrar_pendentes(db, lote=2, pepi_scraper=pepi),
+        )
+        assert sorted(pepi.descadastrados) == [str(numero) for numero in range(6)]
+        assert sum(t[STATUS_CONCLUIDO] for t in totais) == 6
+        documentos = await db.descadastros.find({}).to_list(None)
+        assert all(d['status'] == STATUS_CONCLUIDO and 'reserva' not in d for d in documentos)
+
+    asyncio.run(executar())
+
+
+async def reservar(db, numero, reserva, validade):
+    await db.descadastros.update_one({"numero_processo": numero}, {"$set": {
+        "status": STATUS_EM_ANDAMENTO,
+        "reserva": reserva,
+        "reservado_ate": descadastro._agora() + validade
+    }})
+
+
+def test_reserva_vencida_conta_tentativa_e_falha_no_limite():
+    async def executar():
+        db = AsyncMongoMockClient()['inpi_testes']
+        await registrar_pendente(db, '1', 'a', 'e')
+        await registrar_pendente(db, '2', 'a', 'e')
+        await db.descadastros.update_one({"numero_processo": '2'}, {"$set": {"tentativas": DESCADASTRO_MAX_TENTATIVAS - 1}})
+        for numero in ('1', '2'):
+            await reservar(db, numero, 'morta', timedelta(seconds=-1))
+
+        pepi = PepiContador()
+        with mock.patch.object(descadastro, 'calcular_backoff', lambda tentativa, **_: 3600):
+            totais = await descadastrar_pendentes(db, pepi_scraper=pepi)
+        assert pepi.descadastrados == []
+        assert totais[STATUS_CONCLUIDO] == 0
+
+        documentos = {d['numero_processo']: d for d in await db.descadastros.find({}).to_list(None)}
+        assert documentos['1']['status'] == STATUS_PENDENTE
+        assert documentos['1']['tentativas'] == 1
+        assert documentos['1']['ultimo_erro'] == DESCADASTRO_RESERVA_VENCIDA
+        assert documentos['1']['proxima_tentativa_em'].replace(tzinfo=timezone.utc) > descadastro._agora()
+        assert documentos['2']['status'] == STATUS_FALHA
+        assert documentos['2']['tentativas'] == DESCADASTRO_MAX_TENTATIVAS
+        assert 'reserva' not in documentos['1'] and 'reserva' not in documentos['2']
+
+    asyncio.run(executar())
+
+
+def test_reserva_valida_nao_e_tocada_nem_reaberta():
+    async def executar():
+        db = AsyncMongoMockClient()['inpi_testes']
+        await registrar_pendente(db, '1', 'a', 'e')
+        await reservar(db, '1', 'viva', timedelta(minutes=5))
+
+        # Novo registro do mesmo processo durante o lote: a reserva continua
+        await registrar_pendente(db, '1', 'a', 'outra')
+        documento = await db.descadastros.find_one({})
+        assert documento['status'] == STATUS_EM_ANDAMENTO
+        assert documento['reserva'] == 'viva'
+        assert documento['execucao_id'] == 'e'
+
+        pepi = PepiContador()
+        assert (await descadastrar_pendentes(db, pepi_scraper=pepi))[STATUS_CONCLUIDO] == 0
+        assert pepi.descadastrados == []
+
+    asyncio.run(executar())
@@ -0,0 +1,150 @@
+import asyncio
+from email import message_from_bytes
+from unittest import mock
+
+from scrapers import email_notifier
+from scrapers.email_notifier import NotificadorEmail
+
+_sleep = asyncio.sleep
+
+
+def notificador(servidor_smtp, **kwargs):
+    host, porta, _ = servidor_smtp
+    return NotificadorEmail(host=host, port=porta, usuario='', senha='', starttls=False, **kwargs)
+
+
+def sem_espera():
+    """Backoff entre tentativas sem esperar de verdade"""
+    return mock.patch.object(email_notifier.asyncio, 'sleep', lambda segundos: _sleep(0))
+
+
+def test_conexao_reaproveitada_entre_envios(servidor_smtp):
+    _, _, caixa = servidor_smtp
+
+    async def cenario():
+        smtp = notificador(servidor_smtp)
+        for i in range(3):
+            smtp.enfileirar(f'destino{i}@exemplo.com', f'Assunto {i}', 'corpo')
+        await smtp.fechar()
+        return smtp
+
+    smtp = asyncio.run(cenario())
+    assert smtp.enviados == 3
+    assert smtp.conexoes_abertas == 1
+    assert len(caixa.sessoes) == 1
+    assert [m.rcpt_tos for m in caixa.mensagens] == [[f'destino{i}@exemplo.com'] for i in range(3)]
+
+
+def test_enfileirar_nao_espera_o_smtp(servidor_smtp):
+    _, _, caixa = servidor_smtp
+
+    async def cenario():
+        smtp = notificador(servidor_smtp)
+        smtp.enfileirar('destino@exemplo.com', 'Assunto', 'corpo')
+        na_fila = len(caixa.mensagens)
+        await smtp.esvaziar(timeout=10)
+        entregues = len(caixa.mensagens)
+        await smtp.fechar()
+        return na_fila, entregues
+
+    assert asyncio.run(cenario()) == (0, 1)
+
+
+def test_conexao_ociosa_e_encerrada(servidor_smtp):
+    async def cenario():
+        smtp = notificador(servidor_smtp, ocioso_s=0.05)
+        smtp.enfileirar('destino@exemplo.com', 'Primeiro', 'corpo')
+        await smtp.esvaziar(timeout=10)
+        await asyncio.sleep(0.3)
+        smtp.enfileirar('destino@exemplo.com', 'Segundo', 'corpo')
+        await smtp.fechar()
+        return smtp
+
+    smtp = asyncio.run(cenario())
+    assert smtp.enviados == 2
+    assert smtp.conexoes_abertas == 2
+
+
+def test_falha_temporaria_e_repetida_com_nova_conexao(servidor_smtp):
+    _, _, caixa = servidor_smtp
+    caixa.falhas_data = ['451 Tente novamente mais tarde']
+
+    async def cenario():
+        smtp = notificador(servidor_smtp)
+        with sem_espera():
+            smtp.enfileirar('destino@exemplo.com', 'Assunto', 'corpo')
+            await smtp.fechar()
+        return smtp
+
+    smtp = asyncio.run(cenario())
+    assert (smtp.enviados, smtp.falhas) == (1, 0)
+    assert smtp.conexoes_abertas == 2
+    assert len(caixa.mensagens) == 1
+
+
+def test_falha_persistente_esgota_as_tentativas(servidor_smtp):
+    _, _, caixa = servidor_smtp
+    caixa.falhas_data = ['451 Tente novamente mais tarde'] * email_notifier.SMTP_TENTATIVAS
+
+    async def cenario():
+        smtp = notificador(servidor_smtp)
+        with sem_espera():
+            smtp.enfileirar('destino@exemplo.com', 'Assunto', 'corpo')
+            await smtp.fechar()
+        return smtp
+
+    smtp = asyncio.run(cenario())
+    assert (smtp.enviados, smtp.falhas) == (0, 1)
+    assert smtp.conexoes_abertas == email_notifier.SMTP_TENTATIVAS
+    assert caixa.mensagens == []
+
+
+def test_resumo_agrupa_as_linhas_por_assunto(servidor_smtp):
+    _, _, caixa = servidor_smtp
+
+    async def cenario():
+        smtp = notificador(servidor_smtp)
+        smtp.adicionar_ao_resumo('Revista processada', 'RPI 2800', destinatario='equipe@exemplo.com')
+        smtp.adicionar_ao_resumo('Revista processada', 'RPI 2801', destinatario='equipe@exemplo.com')
+        smtp.adicionar_ao_resumo('Falha', 'RPI 2802', destinatario='equipe@exemplo.com')
+        await smtp.fechar()
+        return smtp
+
+    smtp = asyncio.run(cenario())
+    assert smtp.enviados == 2
+    mensagens = {m['Subject']: m for m in (message_from_bytes(e.content) for e in caixa.mensagens)}
+    assert set(mensagens) == {'Revista processada (2)', 'Falha (1)'}
+    corpo = mensagens['Revista processada (2)'].get_payload(decode=True).decode()
+    assert corpo.splitlines()[:2] == ['RPI 2800', 'RPI 2801']
+
+
+def test_destinatario_recusado_com_5xx_nao_e_repetido(servidor_smtp):
+    _, _, caixa = servidor_smtp
+    caixa.recusados['inexistente@exemplo.com'] = '550 Mailbox unavailable'
+
+    async def cenario():
+        smtp = notificador(servidor_smtp)
+        with sem_espera():
+            smtp.enfileirar('inexistente@exemplo.com', 'Assunto', 'corpo')
+            await smtp.fechar()
+        return smtp
+
+    smtp = asyncio.run(cenario())
+    assert (smtp.enviados, smtp.falhas) == (0, 1)
+    assert smtp.conexoes_abertas == 1
+
+
+def test_destinatario_recusado_com_4xx_e_repetido(servidor_smtp):
+    _, _, caixa = servidor_smtp
+    caixa.recusados['cheia@exemplo.com'] = '452 Mailbox full'
+
+    async def cenario():
+        smtp = notificador(servidor_smtp)
+        with sem_espera():
+            smtp.enfileirar('cheia@exemplo.com', 'Assunto', 'corpo')
+            await smtp.fechar()
+        return smtp
+
+    smtp = asyncio.run(cenario())
+    assert (smtp.enviados, smtp.falhas) == (0, 1)
+    assert smtp.conexoes_abertas == email_notifier.SMTP_TENTATIVAS
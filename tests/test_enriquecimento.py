@@ -0,0 +1,98 @@
+import asyncio
+from unittest import mock
+
+from mongomock_motor import AsyncMongoMockClient
+
+from scrapers import inpi_scraper, pepi_scraper
+from scrapers.inpi_scraper import INPIScraper
+from scrapers.priorizacao import OrcamentoEnriquecimento
+from scrapers.resiliencia import CircuitBreaker, FALHA_DESCONHECIDA, FALHA_NAO_ENCONTRADO, FALHA_TIMEOUT
+
+
+class PepiRoteirizado:
+    """PepiScraper falso: devolve, por processo, os resultados do roteiro em ordem"""
+
+    roteiro = {}
+
+    def __init__(self, resumo=None):
+        pass
+
+    def buscar_processo_e_extrair_dados(self, numero_processo):
+        return PepiRoteirizado.roteiro[numero_processo].pop(0)
+
+
+class CircuitoComEspera(CircuitBreaker):
+    """Circuito fechado que cede o event loop na liberação (como um await qualquer)"""
+
+    async def aguardar_liberacao(self):
+        await asyncio.sleep(0)
+
+
+def enriquecer(processos, roteiro, circuito, orcamento=None):
+    async def executar():
+        db = AsyncMongoMockClient()['inpi_testes']
+        await db.processos_indeferimento.insert_many([{**p, 'execucao_id': 'e'} for p in processos])
+        scraper = INPIScraper(db)
+        scraper.pepi_workers = 2
+        scraper.pepi_intervalo = 0
+        PepiRoteirizado.roteiro = roteiro
+        with mock.patch.object(pepi_scraper, 'PepiScraper', PepiRoteirizado), \
+                mock.patch.object(inpi_scraper, 'circuito_pepi', circuito), \
+                mock.patch.object(inpi_scraper, 'calcular_backoff', lambda tentativa: 0), \
+                mock.patch.object(inpi_scraper, 'OrcamentoEnriquecimento', orcamento or OrcamentoEnriquecimento):
+            estatisticas = await asyncio.wait_for(scraper._enriquecer_processos(processos, 'e'), 10)
+        documentos = await db.processos_indeferimento.find({}, {'_id': 0}).to_list(None)
+        return estatisticas, {d['numero_processo']: d for d in documentos}
+
+    return asyncio.run(executar())
+
+
+def test_falha_permanente_conta_no_circuito():
+    circuito = CircuitBreaker('teste', minimo_amostras=1, limiar_erro=0.5)
+    estatisticas, documentos = enriquecer(
+        [{'numero_processo': '1', 'titular': 'A', 'titular_norm': 'a'}],
+        {'1': [{'falha': FALHA_DESCONHECIDA}]},
+        circuito
+    )
+    assert estatisticas['total_falhas'] == 1
+    assert documentos['1']['falha_enriquecimento'] == FALHA_DESCONHECIDA
+    assert circuito.estado == CircuitBreaker.ABERTO
+
+
+def test_falha_transitoria_e_reagendada_ate_concluir():
+    circuito = CircuitBreaker('teste', minimo_amostras=100)
+    estatisticas, documentos = enriquecer(
+        [{'numero_processo': '1', 'titular': 'A', 'titular_norm': 'a'},
+         {'numero_processo': '2', 'titular': 'B', 'titular_norm': 'b'}],
+        {'1': [{'falha': FALHA_TIMEOUT}, {'marca': 'MARCA', 'email': 'a@x.com'}],
+         '2': [{'marca': 'OUTRA', 'email': 'b@x.com'}]},
+        circuito
+    )
+    assert estatisticas['total_retentativas'] == 1
+    assert estatisticas['total_com_dados'] == 2
+    assert documentos['1']['email'] == 'a@x.com'
+
+
+def test_orcamento_nao_estoura_com_varios_workers():
+    estatisticas, documentos = enriquecer(
+        [{'numero_processo': '1', 'titular': 'A', 'titular_norm': 'a'},
+         {'numero_processo': '2', 'titular': 'B', 'titular_norm': 'b'}],
+        {'1': [{'marca': 'MARCA', 'email': 'a@x.com'}],
+         '2': [{'marca': 'OUTRA', 'email': 'b@x.com'}]},
+        CircuitoComEspera('teste'),
+        orcamento=lambda: OrcamentoEnriquecimento(max_captchas=1, max_minutos=0)
+    )
+    assert estatisticas['total_consultas_pepi'] == 1
+    assert estatisticas['total_nao_consultados'] == 1
+    assert estatisticas['orcamento_esgotado'] == 'captchas'
+
+
+def test_nao_encontrado_nao_abre_o_circuito():
+    circuito = CircuitBreaker('teste', minimo_amostras=1, limiar_erro=0.5)
+    estatisticas, documentos = enriquecer(
+        [{'numero_processo': str(n), 'titular': str(n), 'titular_norm': str(n)} for n in range(5)],
+        {str(n): [{'falha': FALHA_NAO_ENCONTRADO}] for n in range(5)},
+        circuito
+    )
+    assert estatisticas['total_falhas'] == 5
+    assert circuito.estado == CircuitBreaker.FECHADO
@@ -0,0 +1,39 @@
+import pytest
+
+from scrapers.esquema import VERSAO_ESQUEMA, validar_processo
+
+
+def processo(**campos):
+    return {
+        'id': 'p1', 'execucao_id': 'e1', 'numero_processo': '912345678', 'marca': 'INHANDS',
+        'data_extracao': '2026-10-19T12:00:00+00:00', 'semana': 42, 'ano': 2026, **campos
+    }
+
+
+def test_processo_valido_recebe_versao():
+    assert validar_processo(processo(email=None, titular='Inhands Ltda'))['versao_esquema'] == VERSAO_ESQUEMA
+
+
+@pytest.mark.parametrize('campos, campo_invalido', [
+    ({'semana': '42'}, 'semana'),
+    ({'marca': None}, 'marca'),
+    ({'email': 123}, 'email'),
+])
+def test_campo_com_tipo_errado(campos, campo_invalido):
+    with pytest.raises(ValueError, match=f"'{campo_invalido}'"):
+        validar_processo(processo(**campos))
+
+
+def test_data_de_extracao_invalida():
+    with pytest.raises(ValueError):
+        validar_processo(processo(data_extracao='19/10/2026'))
+
+
+@pytest.mark.parametrize('data_extracao', ['2026-10-19T12:00:00+00:00', '2026-10-19T12:00:00.123456+00:00'])
+def test_caminho_direto_serializa_como_o_modelo(data_extracao):
+    from server import serializar_processo
+
+    validado = validar_processo(processo(data_extracao=data_extracao, email=None, titular='Inhands Ltda'))
+    legado = {campo: valor for campo, valor in validado.items() if campo != 'versao_esquema'}
+    assert serializar_processo(dict(validado)) == serializar_processo(legado)
+    assert serializar_processo(dict(validado))['data_extracao'].endswith('Z')
@@ -0,0 +1,83 @@
+import asyncio
+
+from mongomock_motor import AsyncMongoMockClient
+
+from scrapers.eventos import (
+    AssinaturaMongo, TIPO_INICIO, TIPO_PROCESSO, TIPO_PROCESSOS, TIPO_STATUS, barramento
+)
+from scrapers.resumo_execucao import ResumoMaterializado
+
+
+def execucao(execucao_id, status='processando'):
+    return {'id': execucao_id, 'status': status, 'data_execucao': '2026-10-19T08:00:00+00:00', 'semana': 42, 'ano': 2026}
+
+
+def test_execucao_de_outra_replica_pelo_resumo():
+    async def cenario():
+        db = AsyncMongoMockClient()['teste_eventos']
+        resumo = ResumoMaterializado(db, 'remota')
+        await resumo.iniciar(execucao('remota'))
+        await resumo.adicionar_processos([{'numero_processo': '1', 'marca': 'A'}, {'numero_processo': '2', 'marca': 'B'}])
+
+        assinatura = AssinaturaMongo(db, 'remota', status='processando', intervalo_s=0.01)
+        eventos = [await assinatura.proximo(1)]
+        await resumo.atualizar_processos(['1'], resultado='enriquecido', email='a@x.com')
+        eventos.append(await assinatura.proximo(1))
+        await resumo.atualizar_execucao(status='concluido', total_processos=2)
+        eventos.append(await assinatura.proximo(1))
+        eventos.append(await assinatura.proximo(0.05))
+        return eventos
+
+    processos, processo, status, nada = asyncio.run(cenario())
+    assert processos['tipo'] == TIPO_PROCESSOS
+    assert [p['numero_processo'] for p in processos['processos']] == ['1', '2']
+    assert (processo['tipo'], processo['numero_processo'], processo['email']) == (TIPO_PROCESSO, '1', 'a@x.com')
+    assert (status['tipo'], status['status'], status['total_processos']) == (TIPO_STATUS, 'concluido', 2)
+    assert status['execucao_id'] == 'remota'
+    assert nada is None
+
+
+def test_execucao_fora_do_resumo_acompanha_so_o_status():
+    async def cenario():
+        db = AsyncMongoMockClient()['teste_eventos']
+        await ResumoMaterializado(db, 'nova').iniciar(execucao('nova'))
+        await db.execucoes.insert_one(execucao('antiga'))
+        assinatura = AssinaturaMongo(db, 'antiga', status='processando', intervalo_s=0.01)
+        antes = await assinatura.proximo(0.05)
+        await db.execucoes.update_one({'id': 'antiga'}, {'$set': {'status': 'erro', 'mensagem_erro': 'interrompida'}})
+        return antes, await assinatura.proximo(1)
+
+    antes, status = asyncio.run(cenario())
+    assert antes is None
+    assert (status['tipo'], status['status'], status['mensagem_erro']) == (TIPO_STATUS, 'erro', 'interrompida')
+
+
+def test_global_junta_barramento_e_outras_replicas():
+    async def cenario():
+        db = AsyncMongoMockClient()['teste_eventos']
+        await ResumoMaterializado(db, 'anterior').iniciar(execucao('anterior', 'concluido'))
+        assinatura = AssinaturaMongo(db, local=barramento.assinar(), intervalo_s=0.01)
+        try:
+            # Estado de partida não gera evento
+            eventos = [await assinatura.proximo(0.05)]
+            remota = ResumoMaterializado(db, 'remota')
+            await remota.iniciar(execucao('remota'))
+            eventos.append(await assinatura.proximo(1))
+            await remota.atualizar_execucao(status='concluido')
+            eventos.append(await assinatura.proximo(1))
+
+            # Execução deste processo: só os eventos do barramento, sem repetir pelo MongoDB
+            barramento.publicar('local', TIPO_INICIO)
+            await ResumoMaterializado(db, 'local').iniciar(execucao('local'))
+            eventos.append(await assinatura.proximo(1))
+            eventos.append(await assinatura.proximo(0.05))
+        finally:
+            assinatura.encerrar()
+        return eventos
+
+    partida, inicio, status, local, nada = asyncio.run(cenario())
+    assert partida is None
+    assert (inicio['tipo'], inicio['execucao_id']) == (TIPO_INICIO, 'remota')
+    assert (status['tipo'], status['execucao_id'], status['status']) == (TIPO_STATUS, 'remota', 'concluido')
+    assert (local['tipo'], local['execucao_id']) == (TIPO_INICIO, 'local')
+    assert nada is None
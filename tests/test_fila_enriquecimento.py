@@ -0,0 +1,65 @@
+import asyncio
+from datetime import timedelta
+from unittest import mock
+
+from mongomock_motor import AsyncMongoMockClient
+
+from scrapers import fila_enriquecimento, inpi_scraper
+from scrapers.fila_enriquecimento import (
+    FALHA_FILA_SEM_WORKERS, FALHA_WORKER_PERDIDO, STATUS_CANCELADO, STATUS_CONCLUIDO, STATUS_PENDENTE,
+    publicar_unidades, reivindicar
+)
+from scrapers.inpi_scraper import INPIScraper
+from scrapers.resiliencia import MAX_TENTATIVAS
+
+
+async def vencer_visibilidade(db):
+    await db.fila_enriquecimento.update_many(
+        {}, {"$set": {"visivel_ate": fila_enriquecimento._agora() - timedelta(seconds=1)}}
+    )
+
+
+def test_reivindicacao_de_unidade_vencida_conta_tentativa():
+    async def executar():
+        db = AsyncMongoMockClient()['inpi_testes']
+        await publicar_unidades(db, 'e', [{'numero_processo': '1'}])
+
+        for tentativa in range(MAX_TENTATIVAS):
+            unidade = await reivindicar(db, f'worker-{tentativa}')
+            assert unidade['tentativas'] == tentativa
+            await vencer_visibilidade(db)
+
+        # A última reivindicação também venceu: a unidade falha em vez de voltar
+        assert await reivindicar(db, 'vivo') is None
+        unidade = await db.fila_enriquecimento.find_one({})
+        assert unidade['status'] == STATUS_CONCLUIDO
+        assert unidade['tentativas'] == MAX_TENTATIVAS
+        assert unidade['resultado'] == {'falha': FALHA_WORKER_PERDIDO}
+
+    asyncio.run(executar())
+
+
+def test_coordenadora_desiste_sem_workers():
+    async def executar():
+        db = AsyncMongoMockClient()['inpi_testes']
+        processos = [
+            {'numero_processo': '1', 'titular': 'A', 'titular_norm': 'a'},
+            {'numero_processo': '2', 'titular': 'A', 'titular_norm': 'a'},
+            {'numero_processo': '3', 'titular': 'B', 'titular_norm': 'b'},
+        ]
+        await db.processos_indeferimento.insert_many([{**p, 'execucao_id': 'e'} for p in processos])
+        with mock.patch.object(inpi_scraper, 'FILA_DISTRIBUIDA', True), \
+                mock.patch.object(inpi_scraper, 'FILA_INTERVALO_S', 0.01), \
+                mock.patch.object(inpi_scraper, 'FILA_SEM_WORKERS_S', 0.05):
+            estatisticas = await asyncio.wait_for(INPIScraper(db)._enriquecer_processos(processos, 'e'), 10)
+
+        documentos = await db.processos_indeferimento.find({}, {'_id': 0}).to_list(None)
+        assert {d['numero_processo']: d.get('falha_enriquecimento') for d in documentos} == {
+            '1': FALHA_FILA_SEM_WORKERS, '2': FALHA_FILA_SEM_WORKERS, '3': FALHA_FILA_SEM_WORKERS
+        }
+        assert estatisticas['total_falhas'] == 3
+        unidades = await db.fila_enriquecimento.find({}).to_list(None)
+        assert unidades and all(u['status'] == STATUS_CANCELADO for u in unidades)
+        assert not await db.fila_enriquecimento.count_documents({'status': STATUS_PENDENTE})
+
+    asyncio.run(executar())
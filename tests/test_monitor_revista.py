@@ -0,0 +1,71 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from mongomock_motor import AsyncMongoMockClient
+
+from scrapers.monitor_revista import MonitorRevista, EXECUCAO_ABANDONADA_MINUTOS, MENSAGEM_INTERROMPIDA
+
+XML_URL = 'https://revistas.inpi.gov.br/txt/RM2850.zip'
+
+
+def verificar(execucoes, numero_revista='2850', xml_url=XML_URL):
+    async def executar():
+        db = AsyncMongoMockClient()['inpi_testes']
+        if execucoes:
+            await db.execucoes.insert_many([dict(e) for e in execucoes])
+        monitor = MonitorRevista(SimpleNamespace(db=db, base_url='https://revistas.inpi.gov.br/rpi/'))
+        processada = await monitor.revista_ja_processada(numero_revista, xml_url)
+        return processada, await db.execucoes.find({}, {'_id': 0}).to_list(None)
+
+    return asyncio.run(executar())
+
+
+def execucao(status, minutos_atras, **campos):
+    momento = datetime.now(timezone.utc) - timedelta(minutes=minutos_atras)
+    return {'id': 'e1', 'status': status, 'data_execucao': momento.isoformat(), 'heartbeat_em': momento,
+            'numero_revista': '2850', 'xml_url': XML_URL, **campos}
+
+
+def test_revista_nova():
+    assert verificar([])[0] is False
+
+
+def test_concluida():
+    assert verificar([execucao('concluido', 60 * 24 * 7)])[0] is True
+
+
+def test_em_andamento_com_heartbeat_recente():
+    processada, execucoes = verificar([execucao('processando', 1)])
+    assert processada is True
+    assert execucoes[0]['status'] == 'processando'
+
+
+def test_processando_sem_heartbeat_e_liberada():
+    processada, execucoes = verificar([execucao('processando', EXECUCAO_ABANDONADA_MINUTOS + 5)])
+    assert processada is False
+    assert execucoes[0]['status'] == 'erro'
+    assert execucoes[0]['mensagem_erro'] == MENSAGEM_INTERROMPIDA
+
+
+def test_execucao_antiga_sem_heartbeat_usa_data_execucao():
+    antiga = execucao('processando', 1)
+    del antiga['heartbeat_em']
+    assert verificar([antiga])[0] is True
+
+
+def test_execucao_anterior_ao_numero_revista_casa_pelo_xml_url():
+    antiga = execucao('concluido', 60)
+    del antiga['numero_revista']
+    assert verificar([antiga])[0] is True
+    assert verificar([antiga], xml_url='https://revistas.inpi.gov.br/txt/RM2849.zip')[0] is False
+
+
+def test_execucao_do_backfill_nao_conta_como_processada():
+    processada, execucoes = verificar([
+        execucao('concluido', 60, tipo='backfill'),
+        execucao('processando', EXECUCAO_ABANDONADA_MINUTOS + 5, id='e2', tipo='backfill'),
+    ])
+    assert processada is False
+    # Backfill longo (sem heartbeat) não é marcado como interrompido
+    assert [e['status'] for e in execucoes] == ['concluido', 'processando']
@@ -0,0 +1,41 @@
+from types import SimpleNamespace
+
+import pytest
+
+from scrapers.navegador import _deve_bloquear
+
+HOST_PEPI = 'busca.inpi.gov.br'
+
+
+def requisicao(url, tipo='script'):
+    return SimpleNamespace(url=url, resource_type=tipo)
+
+
+@pytest.mark.parametrize('url', [
+    'https://www.google.com/recaptcha/api.js',
+    'https://www.gstatic.com/recaptcha/releases/x/recaptcha__pt_br.js',
+    'https://recaptcha.net/recaptcha/api.js',
+    'https://www.recaptcha.net/recaptcha/api.js',
+    'https://busca.inpi.gov.br/pePI/jsp/marcas/Pesquisa_num_processo.jsp',
+])
+def test_hosts_permitidos(url):
+    assert not _deve_bloquear(requisicao(url), HOST_PEPI)
+
+
+@pytest.mark.parametrize('url', [
+    'https://evilwww.google.com/x.js',
+    'https://notrecaptcha.net/x.js',
+    'https://www.google.com.evil.example/x.js',
+    'https://analytics.example.com/x.js',
+])
+def test_hosts_de_terceiros_bloqueados(url):
+    assert _deve_bloquear(requisicao(url), HOST_PEPI)
+
+
+def test_documento_principal_nunca_bloqueado():
+    assert not _deve_bloquear(requisicao('https://outro.example/arquivo.pdf', 'document'), HOST_PEPI)
+
+
+def test_imagens_bloqueadas_exceto_as_dos_seletores():
+    assert _deve_bloquear(requisicao(f'https://{HOST_PEPI}/img/logo.png', 'image'), HOST_PEPI)
+    assert not _deve_bloquear(requisicao(f'https://{HOST_PEPI}/img/pdf.gif', 'image'), HOST_PEPI)
@@ -0,0 +1,81 @@
+import asyncio
+
+from mongomock_motor import AsyncMongoMockClient
+
+from scrapers.priorizacao import (
+    OrcamentoEnriquecimento, calcular_prioridade, contar_sessoes_evitadas, priorizar_processos,
+    selecionar_prioritarios, tipo_titular
+)
+
+
+def processo(numero, titular, apresentacao='nominativa'):
+    return {'numero_processo': numero, 'titular': titular, 'titular_norm': titular.lower(), 'apresentacao': apresentacao}
+
+
+def test_tipo_titular():
+    assert tipo_titular('Inhands Tecnologia Ltda') == 'pj'
+    assert tipo_titular('Maria Souza') == 'pf'
+    assert tipo_titular('Inhands') is None
+
+
+def test_apresentacao_e_historico_na_prioridade():
+    nominativa = calcular_prioridade(processo('1', 'Maria Souza'), {})
+    figurativa = calcular_prioridade(processo('2', 'Maria Souza', 'figurativa'), {})
+    com_falhas = calcular_prioridade(processo('3', 'Maria Souza'), {'maria souza': {'processos': 1, 'falhas': 2}})
+    assert nominativa > figurativa
+    assert com_falhas < nominativa
+
+
+def test_email_conhecido_nao_ocupa_vaga_do_limite():
+    historico = {'a ltda': {'processos': 3, 'com_email': 2}, 'b ltda': {'processos': 3, 'com_email': 1}}
+    processos = [processo('1', 'A Ltda'), processo('2', 'B Ltda'), processo('3', 'C Ltda'), processo('4', 'Maria Souza')]
+
+    selecionados = selecionar_prioritarios(processos, historico, {}, limite=1)
+
+    assert [p['numero_processo'] for p in selecionados] == ['1', '2', '3']
+
+
+def test_priorizar_processos_le_historico_do_mongo():
+    async def cenario():
+        db = AsyncMongoMockClient()['teste_priorizacao']
+        await db.processos_indeferimento.insert_many([
+            {'titular_norm': 'c ltda', 'email_norm': 'contato@c.com.br'},
+            {'titular_norm': 'd ltda', 'falha_enriquecimento': 'sem_pdf'},
+        ])
+        processos = [processo('1', 'D Ltda'), processo('2', 'E Ltda'), processo('3', 'C Ltda')]
+        return await priorizar_processos(db, processos, limite=1)
+
+    selecionados = asyncio.run(cenario())
+    assert [p['numero_processo'] for p in selecionados] == ['3', '2']
+
+
+def test_orcamento_tentar_consumir_reserva_ate_o_limite():
+    orcamento = OrcamentoEnriquecimento(max_captchas=2, max_minutos=0)
+    assert [orcamento.tentar_consumir() for _ in range(3)] == [None, None, 'captchas']
+    assert orcamento.captchas == 2
+
+
+def test_orcamento_de_tempo():
+    agora = [0.0]
+    orcamento = OrcamentoEnriquecimento(max_captchas=0, max_minutos=1, relogio=lambda: agora[0])
+    assert orcamento.tentar_consumir() is None
+    agora[0] = 61
+    assert orcamento.tentar_consumir() == 'tempo'
+    assert orcamento.captchas == 1
+
+
+def test_sessoes_evitadas_conta_so_figurativas_que_seriam_selecionadas():
+    historico = {'c ltda': {'processos': 1, 'com_email': 1}}
+    candidatos = [processo('1', 'A Ltda'), processo('2', 'Maria Souza', 'mista')]
+    figurativas = [
+        # Titular recorrente: passaria à frente da mista
+        processo('3', 'D Ltda', 'figurativa'),
+        processo('4', 'Jose Lima', 'figurativa'),
+        # Email conhecido: não iria ao pePI
+        processo('5', 'C Ltda', 'figurativa'),
+    ]
+    historico['d ltda'] = {'processos': 4}
+    selecionados = selecionar_prioritarios(candidatos, historico, {}, limite=2)
+
+    assert contar_sessoes_evitadas(figurativas, selecionados, historico, {}, limite=2) == 1
+    assert contar_sessoes_evitadas(figurativas, selecionados, historico, {}, limite=10) == 2
@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from scrapers.resiliencia import (
+    CircuitBreaker, calcular_backoff, classificar_excecao, eh_transitoria, FalhaPepi,
+    FALHA_CAPTCHA, FALHA_DESCONHECIDA, FALHA_NAO_ENCONTRADO, FALHA_TIMEOUT
+)
+
+
+def test_backoff_limitado_pelo_teto():
+    for tentativa in range(10):
+        espera = calcular_backoff(tentativa, base=5, maximo=60)
+        assert 0 <= espera <= min(60, 5 * 2 ** tentativa)
+
+
+def test_classificacao_de_excecoes():
+    assert classificar_excecao(FalhaPepi(FALHA_CAPTCHA)) == FALHA_CAPTCHA
+    assert classificar_excecao(TimeoutError()) == FALHA_TIMEOUT
+    assert classificar_excecao(RuntimeError('net::ERR_CONNECTION_RESET')) == FALHA_TIMEOUT
+    assert classificar_excecao(ValueError('outra coisa')) == FALHA_DESCONHECIDA
+    assert eh_transitoria(FALHA_TIMEOUT)
+    assert not eh_transitoria(FALHA_NAO_ENCONTRADO)
+
+
+def test_abre_com_taxa_de_erro():
+    circuito = CircuitBreaker('teste', janela=4, minimo_amostras=4, limiar_erro=0.5)
+    circuito.registrar_sucesso()
+    circuito.registrar_sucesso()
+    circuito.registrar_falha()
+    assert circuito.estado == CircuitBreaker.FECHADO
+    circuito.registrar_falha()
+    assert circuito.estado == CircuitBreaker.ABERTO
+    assert not circuito.permite_requisicao()
+
+
+@pytest.mark.parametrize('sonda_ok, estado_final', [
+    (True, CircuitBreaker.FECHADO),
+    (False, CircuitBreaker.ABERTO),
+])
+def test_meio_aberto_libera_uma_sonda(sonda_ok, estado_final):
+    circuito = CircuitBreaker('teste', minimo_amostras=1, tempo_abertura=0)
+    circuito.registrar_falha()
+    assert circuito.estado == CircuitBreaker.ABERTO
+    assert circuito.permite_requisicao()
+    assert circuito.estado == CircuitBreaker.MEIO_ABERTO
+    # Só uma sonda enquanto a primeira não termina
+    assert not circuito.permite_requisicao()
+    if sonda_ok:
+        circuito.registrar_sucesso()
+    else:
+        circuito.registrar_falha()
+    assert circuito.estado == estado_final
+
+
+def test_aguardar_liberacao_com_circuito_fechado():
+    circuito = CircuitBreaker('teste')
+    asyncio.run(asyncio.wait_for(circuito.aguardar_liberacao(), 1))
+
+
+def test_nao_encontrado_nao_abre_o_circuito():
+    circuito = CircuitBreaker('teste', janela=10, minimo_amostras=4, limiar_erro=0.5)
+    for _ in range(10):
+        circuito.registrar_consulta(FALHA_NAO_ENCONTRADO)
+    assert circuito.estado == CircuitBreaker.FECHADO
+    for falha in (FALHA_TIMEOUT, FALHA_DESCONHECIDA, FALHA_TIMEOUT, FALHA_DESCONHECIDA):
+        circuito.registrar_consulta(falha)
+    assert circuito.estado == CircuitBreaker.FECHADO
+    circuito.registrar_consulta(FALHA_TIMEOUT)
+    assert circuito.estado == CircuitBreaker.ABERTO
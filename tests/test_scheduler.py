@@ -0,0 +1,30 @@
+import asyncio
+import threading
+import time
+
+from scrapers import scheduler
+
+
+def test_stop_scheduler_cancela_o_job_sem_esperar():
+    iniciado = threading.Event()
+    cancelado = threading.Event()
+
+    async def job_longo():
+        iniciado.set()
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            cancelado.set()
+            raise
+
+    thread = threading.Thread(target=scheduler._executar, args=('teste', job_longo()))
+    thread.start()
+    assert iniciado.wait(5)
+
+    inicio = time.monotonic()
+    scheduler.stop_scheduler()
+    assert time.monotonic() - inicio < 1
+    thread.join(5)
+    assert not thread.is_alive()
+    assert cancelado.is_set()
+    assert not scheduler._em_execucao
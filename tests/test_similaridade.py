@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from scrapers.similaridade import (
+    VERSAO_CHAVES, chaves_busca, chaves_texto, pontuar, preencher_chaves_bloqueio
+)
+
+
+@pytest.mark.parametrize('a, b, minimo', [
+    ('in hands', 'inhands', 1.0),
+    ('inhands', 'inhands tecnologia', 1.0),
+    ('inhands tecnologia', 'inhandz tecnologia', 0.9),
+    ('inhands tec nologia', 'inhands tecnologia', 1.0),
+])
+def test_pontuar_parecidos(a, b, minimo):
+    assert pontuar(a, b) >= minimo
+
+
+@pytest.mark.parametrize('a, b', [
+    ('pekoc tecnologia', 'coke tecnologia'),
+    # Erro de digitação na palavra genérica não aproxima as marcas
+    ('role brasi l', 'melo brasil'),
+    ('inka tec nologia', 'pani tecnologia'),
+    ('rand', 'randbrada'),
+])
+def test_pontuar_diferentes(a, b):
+    assert pontuar(a, b) < 0.88
+
+
+@pytest.mark.parametrize('gravado, buscado', [
+    ('inhands', 'inhnds'),
+    # Erro na primeira letra
+    ('kabese', 'gabese'),
+    ('grupo inhands', 'inhands'),
+    ('inhands', 'grupo inhands'),
+])
+def test_chaves_de_busca_encontram_o_gravado(gravado, buscado):
+    assert set(chaves_texto(gravado)) & set(chaves_busca(buscado))
+
+
+def test_busca_nao_usa_palavras_seguintes_como_w():
+    assert 'w:tecno' in chaves_texto('inhands tecnologia')
+    assert 'w:tecno' not in chaves_busca('inhands tecnologia')
+
+
+def test_preencher_recalcula_chaves_de_versao_anterior():
+    async def cenario():
+        db = AsyncMongoMockClient()['teste_similaridade']
+        await db.processos_indeferimento.insert_many([
+            {'numero_processo': '1', 'marca_norm': 'inhands', 'chaves_bloqueio': ['m|p:inhan']},
+            {'numero_processo': '2', 'marca_norm': 'coke', 'chaves_bloqueio': ['m|p:coke'],
+             'versao_chaves': VERSAO_CHAVES},
+            {'numero_processo': '3'},
+        ])
+        assert await preencher_chaves_bloqueio(db) == 2
+        assert await preencher_chaves_bloqueio(db) == 0
+        return {p['numero_processo']: p async for p in db.processos_indeferimento.find()}
+
+    processos = asyncio.run(cenario())
+    assert 'm|d:inhn' in processos['1']['chaves_bloqueio']
+    assert processos['2']['chaves_bloqueio'] == ['m|p:coke']
+    assert processos['3']['versao_chaves'] == VERSAO_CHAVES